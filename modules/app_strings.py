@@ -98,6 +98,9 @@ class Msg:
     EXC_FILE_FILTERED_COPIED = 'Gefilterter Auszug: {} Arbeitsmappe an {} Arbeitsmappe angefügt.'
     EXC_FILE_LOAD = 'Lade Arbeitsmappe {}'
     EXC_FILE_LOADED = 'Erfolgreich geladen.'
+    EXC_FILE_SHEET_READ = 'Arbeitsblatt {} mit {} Zeilen in {:.2f}s gelesen.'
+    EXC_FILE_CACHED = 'Arbeitsmappe aus dem Zwischenspeicher geladen.'
+    EXC_FILE_INCREMENTAL = '{} unveränderte Modelle übernommen. Neu: {} Geändert: {} Entfernt: {}'
 
     EXC_THREAD_ERROR = 'Eine Instanz des Konvertierungs Threads läuft bereits.<br><br>'
     EXC_THREAD_ERROR += 'Möglicherweise liegt ein Fehler vor. Speichern Sie und starten das Programm neu.'
@@ -193,6 +196,10 @@ class Msg:
     DG_NO_CHECK_VARIANTS = 'Menü > DeltaGen > Varianten State Check deaktiviert. Das Schaltergebnis wird ' \
                            'höchstwahrscheinlich nicht korrekt dargestellt werden!<br><br>' \
                            'Mit dem Senden forfahren?'
+    DG_PREFLIGHT_INVALID = '<b>{}</b> Varianten existieren nicht in der zuletzt verbundenen Szene <i>{}</i>. ' \
+                           'Ungültige Varianten sind markiert.<br><br>Mit dem Senden forfahren?'
+    DG_PREFLIGHT_SCENE_CHANGED = 'Geladene Szene <i>{}</i> entspricht nicht der geprüften Szene <i>{}</i>. ' \
+                                 'Schaltungen wurden ohne Varianten State Check gesendet!'
     DG_THREAD_RUNNING = '<h3>DeltaGen Verbindung in Verwendung</h3>' \
                         'Es wird bereits eine aktive Verbindung zu DeltaGen benutzt. ' \
                         'Senden von Varianten oder Rendervorgang abbrechen um fortzufahren.'
@@ -224,7 +231,9 @@ class Msg:
 
     XML_FILE_MSG = 'XML Datei ausgewählt. Daten werden gelesen.'
     XML_FILE_LOADED = 'RenderKnecht XML erfolgreich geladen: '
+    XML_FILE_UPDATED = '{} Modelle neu erstellt und {} Modelle entfernt: {}'
     XML_ERROR_MSG = 'Fehler beim Lesen der Xml Datei.<br><br>Die vorherige Datei wurde wiederhergestellt.'
+    XML_MODEL_HEADER = ['Order', 'Name', 'Wert', 'Typ', 'Referenz', 'Id', 'Beschreibung']
 
     INFO_TITLE = 'Information'
 
@@ -266,6 +275,20 @@ class Msg:
                             '{name_list}' \
                             'Ausgabepfad oder Preset Namen müssen gekürzt werden.'
     RENDER_LOG = ['RenderKnecht Render Log erstellt am ', 'Erzeuge Bild mit Namen: ', 'Varianten: ']
+    RENDER_LOG_DELTA = '{} von {} Varianten gesendet, übrige Varianten bereits geschaltet.'
+    RENDER_LOG_ORDER = 'Optimierte Render Reihenfolge: {}'
+    RENDER_FARM_HOST_FAILED = 'Render Host <b>{}</b> antwortet nicht. Verbleibende Bilder werden von den übrigen ' \
+                              'Hosts erzeugt.'
+    RENDER_FARM_NOT_RENDERED = 'Nicht erzeugte Bilder: {}'
+    RENDER_CONNECTION_LOST = '<b>DeltaGen Verbindung verloren.</b> Rendering abgebrochen, {} Bilder wurden nicht ' \
+                             'erzeugt. Das Rendering kann über das Render Journal fortgesetzt werden.'
+    RENDER_CACHE_HIT = 'Aus Render Cache übernommen: {}'
+    RENDER_LOG_CACHE = 'Render Cache: {} Bilder übernommen, {} Bilder gerendert.'
+    RENDER_LOG_OVERHEAD = 'Overhead pro Bild: Ø {:.1f}s, Heartbeat Ø {:.2f}s, Wartezeit gesamt {:.1f}s ({} Bilder)'
+    RENDER_LOG_RESUME = 'Rendering fortgesetzt am {}, {} Bilder bereits erzeugt.'
+    RENDER_RESUME_TITLE = 'Ausgabe Verzeichnis des fortzusetzenden Renderings auswählen'
+    RENDER_RESUME_NO_JOURNAL = 'Kein Render Journal gefunden in:<br><i>{}</i>'
+    RENDER_RESUME_COMPLETE = 'Rendering bereits abgeschlossen. Alle {} Bilder wurden erzeugt.'
     RENDER_TOGGLE_TIMEOUT_ON = 'Feedbackloop je gesendeter Variante und Varianten State Check aktiviert.'
     RENDER_TOGGLE_TIMEOUT_OFF = 'Feedbackloop deaktiviert. Für korrekte Schaltungen, stelle sicher das '
     RENDER_TOGGLE_TIMEOUT_OFF += 'DeltaGen>Varianten State Check aktiviert ist.'
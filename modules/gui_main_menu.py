@@ -36,6 +36,7 @@ from modules.gui_preset_wizard import PresetWizard
 from modules.knecht_img_viewer import KnechtImageViewer
 from modules.knecht_settings import knechtSettings
 from modules.knecht_deltagen import SendToDeltaGen
+from modules.knecht_parse_excel import LoadVplus
 from modules.knecht_threads import PngConvertThread
 from modules.tree_context_menus import TreeContextMenu
 from modules.tree_load_save import OpenPresetFile, SavePreset
@@ -483,13 +484,19 @@ class MenuBar(QtCore.QObject):
         self.ui.checkBox_createPresetDir.setChecked(knechtSettings.dg['create_render_preset_dir'])
         self.render_dir()
 
+        # No menu entry, only configurable via settings file
+        SendToDeltaGen.load_settings(knechtSettings.dg)
+        LoadVplus.load_settings(knechtSettings.app)
+
         log_msg += '\n\n' \
                    'Send Reset:     {:<5} Freeze Viewer:      {:^5} Variant State Check:      {:>1}\n' \
                    'Convert to PNG: {:<5} Long Feedback Loop: {:^5} Create Render Preset Dir: {:>1}\n' \
-                   'Set Viewer bgr: {:<5}'.format(knechtSettings.dg['send_reset'], knechtSettings.dg['viewer_freeze'],
-            knechtSettings.dg['check_variant'], knechtSettings.dg['convert_to_png'],
+                   'Set Viewer bgr: {:<5} Pipeline Variants:  {:^5} Render Hosts:             {:>1}'.format(
+            knechtSettings.dg['send_reset'],
+            knechtSettings.dg['viewer_freeze'], knechtSettings.dg['check_variant'], knechtSettings.dg['convert_to_png'],
             knechtSettings.dg['render_timeout'], knechtSettings.dg['create_render_preset_dir'],
-            knechtSettings.dg['viewer_apply_bgr'])
+            knechtSettings.dg['viewer_apply_bgr'], knechtSettings.dg['pipeline_variants'],
+            knechtSettings.dg['render_hosts'] or '-')
 
         LOGGER.debug(log_msg)
 
@@ -28,6 +28,7 @@ from modules.knecht_log import init_logging
 from modules.app_globals import WIZARD_PAGE_SOURCE, PACKAGE_FILTER
 from modules.app_strings import QobMsg
 from modules.gui_widgets import FakomWindow, load_ui_file
+from modules.knecht_preset_model import PresetTreeModel
 from modules.knecht_threads import ExcelConversionThread
 from modules.tree_load_save import OpenPresetFile
 from modules.tree_methods import tree_setup_header_format
@@ -87,6 +88,7 @@ class SourceWizardPage(QtWidgets.QWizardPage):
             self.vplusCheckbox.setChecked(True)
             self.parent.source_changed.emit()
 
+            self.update_source_view()
             self.treeWidget_Src.info_overlay.display(
                 QobMsg.loaded_message.format(__display_file), 3000, immediate=True)
 
@@ -145,9 +147,15 @@ class SourceWizardPage(QtWidgets.QWizardPage):
         # Load page template
         load_ui_file(self, WIZARD_PAGE_SOURCE)
 
-        # Setup tree widget overlay
-        self.treeWidget_Src.info_overlay = InfoOverlay(self.treeWidget_Src)
-        self.treeWidget_Src.overlay = Overlay(self.treeWidget_Src)
+        # Read only view of the loaded source documents, treeWidget_Src only buffers the FaKom reader items
+        self.source_model = PresetTreeModel(self)
+        self.treeView_Src = self.create_source_view()
+        self.layout().replaceWidget(self.treeWidget_Src, self.treeView_Src)
+        self.treeWidget_Src.hide()
+
+        # Setup tree widget overlay, displayed above the source view
+        self.treeWidget_Src.info_overlay = InfoOverlay(self.treeView_Src)
+        self.treeWidget_Src.overlay = Overlay(self.treeView_Src)
         self.treeWidget_Src.missing_ids = set()  # Dummy Attribute
 
         self.open_file_dialog = OpenPresetFile(self.app,
@@ -171,8 +179,29 @@ class SourceWizardPage(QtWidgets.QWizardPage):
 
         self.plainTextEditFilter.setPlainText(__filter_string)
 
+    def create_source_view(self):
+        """ Tree view of the source model with the look of the treeWidget_Src template """
+        view = QtWidgets.QTreeView(self)
+        view.setModel(self.source_model)
+
+        for prop in ('sizePolicy', 'minimumSize', 'palette', 'statusTip', 'frameShape', 'frameShadow',
+                     'lineWidth', 'alternatingRowColors', 'selectionMode', 'selectionBehavior',
+                     'uniformRowHeights', 'animated', 'wordWrap', 'headerHidden'):
+            view.setProperty(prop, self.treeWidget_Src.property(prop))
+
+        view.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        view.setSortingEnabled(True)
+
+        return view
+
+    def update_source_view(self):
+        """ Show the presets of the loaded FaKom and V Plus documents """
+        xml_roots = [xml.root for xml in (self.parent.fakom_xml, self.parent.vplus_xml) if xml.root is not None]
+        self.source_model.load_elements(xml_roots)
+        self.src_tree_setup_header()
+
     def src_tree_setup_header(self):
-        tree_setup_header_format([self.parent.src_widget])
+        tree_setup_header_format([self.treeView_Src])
 
     def load_session_file(self):
         __result = self.open_file_dialog.open_file_menu(None, file_type='WizardSession')
@@ -247,15 +276,15 @@ class SourceWizardPage(QtWidgets.QWizardPage):
 
     def parse_xml(self, xml_file):
         """ Receives xml file from V Plus excel conversion thread """
-        self.parent.src_widget.clear()
+        # Read the document into a model instead of one tree widget item per preset and variant
+        vplus_model = PresetTreeModel()
 
-        valid_xml_file = self.parent.vplus_xml.parse_file(xml_file)
-
-        if not valid_xml_file:
-            self.vplus_result(valid_xml_file)
+        if not vplus_model.load_file(xml_file):
+            self.vplus_result(False)
             return
 
-        has_data = self.parent.vplus_xml.update_xml_tree_from_widget()
+        self.parent.vplus_xml.variants_xml_path = xml_file
+        has_data = self.parent.vplus_xml.update_xml_tree_from_model(vplus_model)
 
         if not has_data:
             self.vplusLabel.show()
@@ -263,8 +292,8 @@ class SourceWizardPage(QtWidgets.QWizardPage):
             return
 
         self.parent.source_changed.emit()
+        self.update_source_view()
         self.vplus_result(True)
-        self.parent.src_widget.clear()
 
     def abort_vplus(self):
         """ Receives abort signal from excel thread """
@@ -282,10 +311,13 @@ class SourceWizardPage(QtWidgets.QWizardPage):
         # self.parent.overlay.load_finished()
 
         if fakom_read_success:
-            # Save FaKom Result to Xml
+            # Save FaKom Result to Xml, ordered by the order column
+            self.parent.src_widget.sortByColumn(0, QtCore.Qt.AscendingOrder)
             has_data = self.parent.fakom_xml.update_xml_tree_from_widget()
+            self.parent.src_widget.clear()
 
             if has_data:
+                self.update_source_view()
                 self.setup_vplus(vplus_path)
             else:
                 self.fakomLabel.show()
@@ -328,6 +328,9 @@ class RenderKnechtGui(QtWidgets.QApplication):
         # Start Rendering with DeltaGen
         self.ui.pushButton_startRender.pressed.connect(self.dg_render)
 
+        # Continue an interrupted rendering from its render journal
+        self.ui.actionResumeRender.triggered.connect(self.dg_resume_render)
+
         # Update estimated render time with a delay
         self.ui.treeWidget_render.itemChanged.connect(self.render_list_changed_delay.start)
         self.render_list_changed_delay.timeout.connect(self.dg_estimate_render_time)
@@ -719,6 +722,12 @@ class RenderKnechtGui(QtWidgets.QApplication):
     def dg_render(self):
         self.deltagen_render_instance.create_thread()
 
+    def dg_resume_render(self):
+        out_dir = self.menu.get_directory_file_dialog(self.ui.lineEdit_currentRenderPath.text(),
+                                                      Msg.RENDER_RESUME_TITLE)
+        if out_dir:
+            self.deltagen_render_instance.resume_render(out_dir)
+
     def end_dg_threads(self):
         self.deltagen_send_instance.end_thread()
         self.deltagen_render_instance.end_thread()
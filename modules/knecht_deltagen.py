@@ -20,6 +20,7 @@ Copyright (C) 2017 Stefan Tapper, All rights reserved.
     along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
 
 """
+import threading
 import time
 from math import log as math_log
 from pathlib import Path
@@ -27,17 +28,30 @@ from pathlib import Path
 from PyQt5 import QtWidgets
 from PyQt5.QtCore import QObject, QThread, QUrl, Qt, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QBrush, QColor, QDesktopServices
-from imageio import imread
 
-from modules.knecht_image import create_png_images
-from modules.app_globals import HELPER_DIR, INVALID_CHR, ItemColumn, Itemstyle, Msg, RENDER_MACHINE_FACTOR, \
+from modules.knecht_file_watcher import RenderFileWatcher
+from modules.knecht_image import PngConversionPipeline, validate_image_file
+from modules.app_globals import HELPER_DIR, ItemColumn, Itemstyle, Msg, RENDER_MACHINE_FACTOR, \
     RENDER_RES_FACTOR, TCP_IP, TCP_PORT
 from modules.knecht_log import init_logging
+from modules.knecht_render_farm import RenderFarm, parse_render_hosts
+from modules.knecht_render_cache import RenderCache
+from modules.knecht_render_history import RenderHistory, RenderTimeEstimator
+from modules.knecht_render_journal import RenderJournal
+from modules.knecht_render_pacing import RenderPacer
+from modules.knecht_render_plan import count_variant_switches, create_image_list, get_viewset_name, \
+    optimize_render_order, sampling_exponent, split_variant, to_valid_chrs
 from modules.knecht_socket import Ncat
+from modules.knecht_variant_catalog import VARIANT_INVALID_SET, VARIANT_INVALID_VALUE, VARIANT_VALID, \
+    VariantCatalog, event_scene_name
 
 # Initialize logging for this module
 LOGGER = init_logging(__name__)
 
+# Pipelined send will wait this long for all variant_state events + a small allowance per variant
+_PIPELINE_DEADLINE = 2.0
+_PIPELINE_DEADLINE_PER_VARIANT = 0.02
+
 
 def time_string(time_f):
     """ Converts time in float seconds to h:mm:ss """
@@ -50,24 +64,44 @@ def time_string(time_f):
         return '{:=01.0f}h:{:=02.0f}min:{:=02.0f}sec'.format(h, m, s)
 
 
-def get_viewset_name(viewset):
-    """
-        'Variant Viewset View;' will return '_View' or ''
-    """
-    # Viewset name if supplied as "Variant Viewset View;"
-    viewset_name = viewset.split(' ', 2)
-    if len(viewset_name) >= 2:
-        # VARIANT #_Shot Shot;
-        return '_' + viewset_name[2].replace(';', '')
-    else:
-        return ''
+class VariantStateModel:
+    """ Client side model of the current DeltaGen variant state, fed by variant_state events """
+    def __init__(self):
+        self.state = dict()
+
+    def __len__(self):
+        return len(self.state)
+
+    def clear(self):
+        self.state = dict()
+
+    def update(self, variant_set, variant_value):
+        self.state[variant_set] = variant_value
+
+    def delta(self, variant_list):
+        """
+            Return the variant commands of variant_list that change the known state.
+            Only the last command per variant set is kept as it determines the resulting state.
+        """
+        last_idx = dict()
+        for idx, variant in enumerate(variant_list):
+            variant_split = split_variant(variant)
+            if variant_split:
+                last_idx[variant_split[0]] = idx
 
+        delta_list = list()
+        for idx, variant in enumerate(variant_list):
+            variant_split = split_variant(variant)
+            if not variant_split:
+                continue
+
+            variant_set, variant_value = variant_split
+            if last_idx[variant_set] != idx or self.state.get(variant_set) == variant_value:
+                continue
+
+            delta_list.append(variant)
 
-def to_valid_chrs(string):
-    """ Replace invalid characters in provided string """
-    for k, v in INVALID_CHR.items():
-        string = string.replace(k, v)
-    return string
+        return delta_list
 
 
 class SendToDeltaGen(QObject):
@@ -84,8 +118,61 @@ class SendToDeltaGen(QObject):
     convert_to_png = True
     create_render_preset_dir = False
     long_render_timeout = False
+    # Send all variants back to back and match variant_state events afterwards
+    pipeline_variants = False
+    # Check variants against the recorded variant catalog of the scene before sending, send without
+    # variant state check if every variant is known to exist
+    preflight_variants = True
+    # Render: only send variants that differ from the last reported DeltaGen variant state
+    delta_variants = True
+    # Render: send all variants every n images regardless of the known state, 0 always sends all
+    full_resend_interval = 10
+    # Render: reorder images inside render presets to minimize variant switches
+    optimize_render_order = False
+    # Render: additionally decode the whole image after the header validation
+    verify_full_decode = False
+    # Render: png conversion processes and number of images queued for conversion while rendering
+    png_workers = 1
+    png_queue_size = 2
+    # Render: re-use verified images of identical configurations, the scene fingerprint identifies the scene
+    render_cache = False
+    render_cache_scene = ''
+    render_cache_size_gb = 20.0
+    # Render: longest pause in seconds while DeltaGen answers heartbeats slowly
+    pacing_max_backoff = 5.0
+    # Render: list of (ip, port), more than one host distributes rendering across all hosts
+    render_hosts = list()
     last_preset_added = None
 
+    @classmethod
+    def load_settings(cls, dg):
+        """ Apply the DeltaGen settings that have no menu entry, dg: knechtSettings.dg """
+        cls.pipeline_variants = dg['pipeline_variants']
+        cls.preflight_variants = dg['preflight_variants']
+        cls.delta_variants = dg['delta_variants']
+        cls.optimize_render_order = dg['optimize_render_order']
+        cls.verify_full_decode = dg['verify_full_decode']
+        try:
+            cls.full_resend_interval = int(dg['full_resend_interval'])
+        except ValueError:
+            LOGGER.error('Invalid full_resend_interval setting: %s', dg['full_resend_interval'])
+        try:
+            cls.png_workers = max(1, int(dg['png_workers']))
+            cls.png_queue_size = max(1, int(dg['png_queue_size']))
+        except ValueError:
+            LOGGER.error('Invalid png conversion settings: %s %s', dg['png_workers'], dg['png_queue_size'])
+        cls.render_hosts = parse_render_hosts(dg['render_hosts'])
+        cls.render_cache = dg['render_cache']
+        cls.render_cache_scene = dg['render_cache_scene']
+        try:
+            cls.render_cache_size_gb = float(dg['render_cache_size_gb'])
+        except ValueError:
+            LOGGER.error('Invalid render_cache_size_gb setting: %s', dg['render_cache_size_gb'])
+        try:
+            cls.pacing_max_backoff = float(dg['pacing_max_backoff'])
+        except ValueError:
+            LOGGER.error('Invalid pacing_max_backoff setting: %s', dg['pacing_max_backoff'])
+
     def __init__(self, app, btn, abort_btn, widget, perform_rendering=False):
         super().__init__()
         self.obj = None
@@ -104,6 +191,8 @@ class SendToDeltaGen(QObject):
 
         # Indicate running thread
         self.thread = False
+        # RenderFarm if rendering is distributed across several hosts
+        self.farm = None
 
         # No reset conf and user choosed to abort
         self.abort_variant_send = False
@@ -112,12 +201,20 @@ class SendToDeltaGen(QObject):
         self.asked_about_reset = False
         self.asked_about_check_variants = False
 
+        # Variants the preflight check found missing in the scene and the checked scene
+        self.preflight_invalid = 0
+        self.preflight_scene = ''
+
         # Reset progress bar
         self.update_progress_bar(0)
 
         self.btn.setStyleSheet(Itemstyle.DG_BTN_READY)
 
     def end_thread(self):
+        if self.farm:
+            LOGGER.info('Shutting down render farm threads.')
+            self.farm.end_threads()
+
         if self.thread:
             if self.thread_running():
                 LOGGER.info('Shutting down DeltaGen communication thread.')
@@ -156,29 +253,60 @@ class SendToDeltaGen(QObject):
             nc.close()
 
     def thread_running(self):
+        if self.farm and self.farm.is_running():
+            return True
         if self.thread:
             return self.thread.isRunning()
         return False
 
-    def create_thread(self):
+    def resume_render(self, out_dir):
+        """ Continue the render job of out_dir with the next image not yet rendered """
+        journal = RenderJournal(out_dir)
+
+        if not journal.job():
+            self.display_message(Msg.RENDER_RESUME_NO_JOURNAL.format(out_dir), duration=8000)
+            return
+
+        done, remaining = journal.remaining_images()
+        if not remaining:
+            self.display_message(Msg.RENDER_RESUME_COMPLETE.format(len(done)), duration=8000)
+            return
+
+        LOGGER.info('Resuming render job %s, %s of %s images remaining.', out_dir, len(remaining),
+                    len(done) + len(remaining))
+        self.create_thread(resume_journal=journal)
+
+    def create_thread(self, resume_journal=None):
         if self.thread_running():
             self.widget.info_overlay.display_confirm(Msg.DG_THREAD_RUNNING, ('Okay', None), immediate=True)
             return
 
         self.abort_variant_send = False
         variant_str_list = []
+        create_render_preset_dir = self.create_render_preset_dir
+        check_variants = self.check_variants
+        self.preflight_invalid = 0
+        self.preflight_scene = ''
 
         # Reset item backgrounds
         for context in self.app.ui.context_menus:
             context.reset_variants()
 
-        if self.perform_rendering:
+        if resume_journal:
+            # Continue a previous render job with the render settings of its journal
+            job = resume_journal.job()
+            self.render_presets = job['render_dict']
+            create_render_preset_dir = job['create_render_preset_dir']
+        elif self.perform_rendering:
             # Collect render settings and variants
             self.render_presets = self.collect_render_settings()
             if not self.validate_render_settings(self.render_presets):
                 self.display_message(Msg.RENDER_NO_PRESETS, duration=8000)
                 return
             LOGGER.info('Render Presets collected \n%s', self.render_presets)
+
+            if self.ask_preflight_invalid():
+                return
         else:
             # Collect variants from tree widgets
             self.collect_variants()
@@ -186,6 +314,14 @@ class SendToDeltaGen(QObject):
             if self.abort_variant_send:
                 return
 
+            # Every variant is known to exist in the scene, skip the variant state check
+            if self.preflight_check_items(self.variants_list, self.load_preflight_catalog()):
+                LOGGER.info('All %s variants verified by the variant catalog of scene %s, sending without '
+                            'variant state check.', len(self.variants_list), self.preflight_scene)
+                check_variants = False
+            elif self.ask_preflight_invalid():
+                return
+
             # Create variant string list
             for variant in self.variants_list:
                 variant_str_list.append('VARIANT ' + variant.text(1) + ' ' + variant.text(2) + ';')
@@ -200,9 +336,18 @@ class SendToDeltaGen(QObject):
         self.btn.setStyleSheet(Itemstyle.DG_BTN_BUSY)
         self.btn.setIcon(self.app.ui.icon['coffee'])
 
-        self.obj = send_to_dg_worker(variant_str_list, self.viewer, self.check_variants, self.render_presets,
+        if self.perform_rendering and len(self.render_hosts) > 1:
+            self.create_render_farm(create_render_preset_dir, resume_journal)
+            return
+
+        self.farm = None
+        self.obj = send_to_dg_worker(variant_str_list, self.viewer, check_variants, self.render_presets,
                                      self.render_user_path, self.convert_to_png, self.long_render_timeout,
-                                     self.create_render_preset_dir)
+                                     create_render_preset_dir, self.pipeline_variants)
+        if not check_variants and self.check_variants:
+            self.obj.preflight_scene = self.preflight_scene
+        if resume_journal:
+            self.obj.resume_dir = resume_journal.out_dir
         self.thread = QThread()
 
         # 2 - Connect Worker`s Signals to Form method slots to post data.
@@ -222,7 +367,7 @@ class SendToDeltaGen(QObject):
 
         # Abort button
         self.abort_btn.setEnabled(True)
-        self.abort_btn.pressed.connect(self.obj.abort_signal)
+        self.abort_btn.pressed.connect(self.obj.abort_signal, Qt.DirectConnection)
 
         # 4 - Connect Worker Signals to the Thread slots
         self.obj.finished.connect(self.thread.quit)
@@ -241,6 +386,44 @@ class SendToDeltaGen(QObject):
         # 6 - Start the thread
         self.thread.start()
 
+    def create_render_farm(self, create_render_preset_dir, resume_journal=None):
+        """ Distribute rendering of the collected render presets across all render hosts """
+        def create_worker(tcp_ip, tcp_port):
+            return send_to_dg_worker([], self.viewer, self.check_variants, self.render_presets,
+                                     self.render_user_path, self.convert_to_png, self.long_render_timeout,
+                                     create_render_preset_dir, self.pipeline_variants, tcp_ip, tcp_port)
+
+        self.farm = RenderFarm(self.render_hosts, self.render_presets, create_worker, self.render_user_path,
+                               create_render_preset_dir, self.optimize_render_order, resume_journal)
+        self.obj = self.farm
+        LOGGER.info('Rendering %s images on render hosts %s', len(self.farm.image_list), self.render_hosts)
+
+        self.farm.strReady.connect(self.on_variant_sent)
+        self.farm.status.connect(self.status_changed)
+        self.farm.display_msg.connect(self.display_message)
+        self.farm.render_progress.connect(self.update_progress_bar)
+        self.farm.task_progress.connect(self.update_task_progress)
+
+        # LED's show activity of any host
+        for worker in self.farm.workers:
+            worker.green_on.connect(self.green_on)
+            worker.green_off.connect(self.green_off)
+            worker.yellow_on.connect(self.yellow_on)
+            worker.yellow_off.connect(self.yellow_off)
+
+        # Abort button
+        self.abort_btn.setEnabled(True)
+        self.abort_btn.pressed.connect(self.farm.abort_signal)
+
+        self.farm.finished.connect(self.on_send_complete)
+
+        # Clear widget info overlay and prepare info messages
+        self.widget.info_overlay.display_exit()
+        self.start_time = time.time()
+        self.num_variants_sent = 0
+
+        self.farm.start()
+
     def collect_variants(self, render_variants=False):
         """ Collects variants from Variants Widget """
         # Variants collector list
@@ -338,6 +521,11 @@ class SendToDeltaGen(QObject):
         render_presets_list = []
         render_preset_dict = dict()
 
+        # Variant catalog for the preflight check of every referenced preset
+        catalog = None
+        if not skip_variants:
+            catalog = self.load_preflight_catalog()
+
         # Collect Render Preset's
         for idx, item in enumerate(self.widget.findItems('*', Qt.MatchWildcard)):
             if item.UserType == 1003:
@@ -346,14 +534,14 @@ class SendToDeltaGen(QObject):
                 render_preset_dict[idx] = dict(render_preset_name=name)
 
         # Render time calculation
-        # List of tuples (num_views, num_presets, samples, res_x), list lenght = num_render_presets
+        # List of tuples (num_views, num_presets, samples, res_x, res_y), list lenght = num_render_presets
         render_time_calc = []
 
         # Collect Render Preset's contents
         for idx, render_preset in enumerate(render_presets_list):
             render_preset_dict[idx]['viewsets'] = []
             render_preset_dict[idx]['preset'] = dict()
-            num_views, preset_count, samples, res_x = 0, 0, 1, 1280
+            num_views, preset_count, samples, res_x, res_y = 0, 0, 1, 1280, 720
 
             for c in range(0, render_preset.childCount()):
                 item = render_preset.child(c)
@@ -374,6 +562,7 @@ class SendToDeltaGen(QObject):
                     if not skip_variants:
                         self.collect_variants([item])
                         if self.abort_variant_send: return
+                        self.preflight_check_items(self.variants_list, catalog)
 
                         variant_str_list = []
                         for variant in self.variants_list:
@@ -388,10 +577,7 @@ class SendToDeltaGen(QObject):
                     # Anti Aliasing
                     if item.text(ItemColumn.TYPE) == 'sampling':
                         # Reverse power of two
-                        sample_pow = math_log(max(1, int(item.text(2)))) / math_log(2)
-                        # Clamp 0 - 12
-                        sampling = max(1, min(12, sample_pow))
-                        render_preset_dict[idx]['sampling'] = str(int(sampling))
+                        render_preset_dict[idx]['sampling'] = sampling_exponent(item.text(2))
                         """
                             # 2 ** Setting Exponent
                             sampling = 2**item.text(2)
@@ -408,13 +594,88 @@ class SendToDeltaGen(QObject):
                             if res[0].isdigit() and res[1].isdigit():
                                 render_preset_dict[idx]['resolution'] = res[0] + ' ' + res[1]
                                 # Render time calc
-                                res_x = int(res[0])
+                                res_x, res_y = int(res[0]), int(res[1])
+
+            render_time_calc.append((num_views, preset_count, samples, res_x, res_y))
 
-            render_time_calc.append((num_views, preset_count, samples, res_x))
+        # Estimated variant switches of the planned render order
+        switch_count = None
+        if not skip_variants:
+            image_list = create_image_list(render_preset_dict)
+            switch_count = count_variant_switches(image_list)
 
-        self.estimate_render_time(render_time_calc)
+            if self.optimize_render_order:
+                switch_count = (count_variant_switches(optimize_render_order(image_list)), switch_count)
+
+        self.estimate_render_time(render_time_calc, switch_count)
         return render_preset_dict
 
+    def load_preflight_catalog(self):
+        """ Variant catalog of the last connected scene, None if empty or the preflight check is disabled """
+        if not self.preflight_variants:
+            return None
+
+        catalog = VariantCatalog.load_last_scene()
+        if catalog is None or not len(catalog):
+            return None
+
+        return catalog
+
+    def preflight_check_items(self, variant_items, catalog):
+        """
+            Check variant items against the variant catalog of the last connected scene and
+            highlight them like variant_state feedback. Variants the catalog does not know
+            are left for the variant state check.
+            Returns True if every variant is known to exist in the scene.
+        """
+        if catalog is None or not variant_items:
+            return False
+
+        self.preflight_scene = catalog.scene
+        green = QBrush(QColor(*Itemstyle.COLOR['GREEN']), Qt.SolidPattern)
+        orange = QBrush(QColor(*Itemstyle.COLOR['ORANGE']), Qt.SolidPattern)
+        all_valid = True
+
+        for item in variant_items:
+            result = catalog.check(item.text(ItemColumn.NAME), item.text(ItemColumn.VALUE))
+
+            if result == VARIANT_VALID:
+                item.setBackground(ItemColumn.NAME, green)
+                item.setBackground(ItemColumn.VALUE, green)
+                continue
+
+            all_valid = False
+
+            if result == VARIANT_INVALID_SET:
+                item.setBackground(ItemColumn.NAME, orange)
+                item.setBackground(ItemColumn.VALUE, orange)
+            elif result == VARIANT_INVALID_VALUE:
+                item.setBackground(ItemColumn.NAME, green)
+                item.setBackground(ItemColumn.VALUE, orange)
+            else:
+                continue
+
+            self.preflight_invalid += 1
+            if item.parent() and self.app.ui.actionTreeStateCheck.isChecked():
+                item.parent().setExpanded(True)
+
+        return all_valid
+
+    def ask_preflight_invalid(self):
+        """ Ask to continue if the preflight check found invalid variants, returns True on abort """
+        if not self.preflight_invalid:
+            return False
+
+        LOGGER.info('Preflight check found %s variants not existing in scene %s', self.preflight_invalid,
+                    self.preflight_scene)
+
+        if self.app.ui.question_box(Msg.DG_NO_CONN_TITLE,
+                                    Msg.DG_PREFLIGHT_INVALID.format(self.preflight_invalid, self.preflight_scene)):
+            self.abort_variant_send = True
+            return True
+
+        return False
+
     def validate_render_settings(self, render_preset_dict):
         # Check render path
         if not self.render_user_path or self.render_user_path == Path('.'):
@@ -476,22 +737,27 @@ class SendToDeltaGen(QObject):
 
         return True
 
-    def estimate_render_time(self, render_time_calc):
+    def estimate_render_time(self, render_time_calc, switch_count=None):
+        """
+            Display estimated render time and number of images
+            switch_count: estimated variant switches or tuple(planned switches, switches in original order)
+        """
         render_time = 0
         images = 0
         images_sum = 0
 
+        # Fitted on the render history, falls back to the machine and resolution factors
+        estimator = RenderTimeEstimator(host=TCP_IP)
+
         for render_preset in render_time_calc:
-            num_views, preset_count, samples, res_x = render_preset
+            num_views, preset_count, samples, res_x, res_y = render_preset
             if num_views == 0: num_views = 1
             images = num_views * preset_count
             images_sum += images
 
             # Calculate render_preset render time
-            sampling_factor = res_x * samples
-            resolution_factor = res_x * RENDER_RES_FACTOR
-            render_preset_time = sampling_factor * RENDER_MACHINE_FACTOR * resolution_factor
-            render_preset_time = render_preset_time * images
+            sampling = int(round(math_log(max(1, samples)) / math_log(2)))
+            render_preset_time = estimator.estimate_image(res_x, res_y, sampling) * images
             render_time += render_preset_time
 
         # h:mm:ss
@@ -499,6 +765,11 @@ class SendToDeltaGen(QObject):
         LOGGER.debug('Estimated render time: %s', display_time_str)
         render_display_string = '{time} ({img_num} Bilder)'.format(time=display_time_str, img_num=images_sum)
 
+        if type(switch_count) is tuple:
+            render_display_string += ' {} Schaltungen (statt {})'.format(*switch_count)
+        elif switch_count is not None:
+            render_display_string += ' {} Schaltungen'.format(switch_count)
+
         """
         render_display = divmod(int(render_time), 60)
         render_display_string = str(render_display[0]).rjust(2, '0') + 'min : '
@@ -673,20 +944,64 @@ class send_to_dg_worker(QObject):
     yellow_off = pyqtSignal()
 
     def __init__(self, variants_list, viewer, check_variants, render_dict=dict(), render_user_path=False,
-                 convert_to_png=True, long_render_timeout=False, create_render_preset_dir=False):
+                 convert_to_png=True, long_render_timeout=False, create_render_preset_dir=False,
+                 pipeline_variants=False, tcp_ip=TCP_IP, tcp_port=TCP_PORT):
         super(QObject, self).__init__()
         self.variants_list = variants_list
         self.render_dict = render_dict
         # Freeze viewer during send *bool
         self.viewer = viewer
         self.viewer_size = SendToDeltaGen.viewer_size
+        self.delta_variants = SendToDeltaGen.delta_variants
+        self.full_resend_interval = SendToDeltaGen.full_resend_interval
+        self.optimize_render_order = SendToDeltaGen.optimize_render_order
+        self.verify_full_decode = SendToDeltaGen.verify_full_decode
+        self.png_workers = SendToDeltaGen.png_workers
+        self.png_queue_size = SendToDeltaGen.png_queue_size
+        self.png_pipeline = None
         self.check_variants = check_variants
         self.convert_to_png = convert_to_png
-        self.abort_connection = False
+        # Set from the GUI thread, checked by the worker thread
+        self.abort_event = threading.Event()
         self.render_user_path = render_user_path
         self.long_render_timeout = long_render_timeout
         self.create_render_preset_dir = create_render_preset_dir
-        self.nc = Ncat(TCP_IP, TCP_PORT)
+        # Extra feedback loop per variant can not be pipelined
+        self.pipeline_variants = pipeline_variants and not long_render_timeout
+        self.nc = Ncat(tcp_ip, tcp_port)
+        # Variant state events arriving during heartbeats update the known variant state
+        self.pacer = RenderPacer(self.nc, self.abort_event, SendToDeltaGen.pacing_max_backoff,
+                                 on_event=self.record_event)
+
+        # Verified images of identical render configurations are re-used
+        self.render_cache = None
+        if SendToDeltaGen.render_cache and SendToDeltaGen.render_cache_scene:
+            self.render_cache = RenderCache(SendToDeltaGen.render_cache_scene, SendToDeltaGen.render_cache_size_gb)
+
+        # Image timings and render time estimate from previous renders
+        self.render_history = RenderHistory()
+        self.render_time_estimator = None
+
+        # Render journal of the current job, output directory of a job to resume
+        self.journal = None
+        self.resume_dir = None
+        self.resume_convert = list()
+        self.render_preset_name = ''
+        self.img_render_presets = dict()
+        # Callable receiving every journal record, eg. progress output of the command line renderer
+        self.journal_listener = None
+
+        # RenderFarm instance if this worker renders images of a multi host render farm
+        self.farm = None
+
+        # Known DeltaGen variant state for delta switching while rendering
+        self.variant_state = VariantStateModel()
+        self.images_since_full_send = 0
+
+        # Variant sets and values of the connected scene for preflight checks
+        self.variant_catalog = None
+        # Scene the variants were checked against if they are sent without variant state check
+        self.preflight_scene = ''
 
         # Connect NC signals to LED's
         self.nc.signals.send_start.connect(self.green_on)
@@ -696,15 +1011,29 @@ class send_to_dg_worker(QObject):
         self.nc.signals.connect_start.connect(self.yellow_on)
         self.nc.signals.connect_end.connect(self.yellow_off)
 
+    @property
+    def abort_connection(self):
+        return self.abort_event.is_set()
+
+    @abort_connection.setter
+    def abort_connection(self, abort):
+        if abort:
+            self.abort_event.set()
+        else:
+            self.abort_event.clear()
+
     @pyqtSlot()
     def abort_signal(self):
-        self.abort_connection = True
+        """ Thread safe, connect with Qt.DirectConnection to abort a busy worker """
+        self.abort_event.set()
         LOGGER.info('Abort Signal triggered. Telling send thread to abort.')
 
     def exit_thread(self):
         if self.viewer:
             self.restore_viewer()
 
+        self.save_variant_catalog()
+
         self.abort_connection = True
         self.nc.close()
         self.finished.emit()
@@ -729,16 +1058,13 @@ class send_to_dg_worker(QObject):
                 break
 
             for d in range(6, 0, -1):
-                # Check abort signal
-                QtWidgets.QApplication.processEvents()
-                if self.abort_connection:
-                    return False
-
                 self.display_msg.emit(
                     'DeltaGen Verbindungsversuch ({!s}/{!s}) in <b>{!s}</b> Sekunden...'.format(c + 1, num_tries - 1,
                                                                                                 d - 1), ())
 
-                time.sleep(1)
+                # Wait for the next try or the abort signal
+                if self.abort_event.wait(1):
+                    return False
 
         # No DeltaGen connection, abort
         self.display_msg.emit('Konnt keine Verbindung zu einer DeltaGen Instanz mit geladener Szene herstellen.',
@@ -781,27 +1107,33 @@ class send_to_dg_worker(QObject):
             self.render_loop()
 
             # Abort signal
-            QtWidgets.QApplication.processEvents()
             if self.abort_connection:
                 self.exit_thread()
                 return
         else:
             # Abort signal
-            QtWidgets.QApplication.processEvents()
             if self.abort_connection:
                 self.exit_thread()
                 return
 
             # Send variants
-            for idx, variant in enumerate(self.variants_list):
-                time.sleep(0.001)
-                self.send_and_check_variant(variant, idx)
+            if self.pipeline_variants:
+                self.send_variants_pipelined(self.variants_list)
 
-                # Abort signal
-                QtWidgets.QApplication.processEvents()
                 if self.abort_connection:
                     self.exit_thread()
                     return
+            else:
+                for idx, variant in enumerate(self.variants_list):
+                    self.send_and_check_variant(variant, idx)
+
+                    # Abort signal
+                    if self.abort_connection:
+                        self.exit_thread()
+                        return
+
+            if self.preflight_scene:
+                self.confirm_preflight_scene()
 
         self.exit_thread()
 
@@ -826,10 +1158,9 @@ class send_to_dg_worker(QObject):
         self.task_progress.emit(__p)
 
         # Extract variant set and value
-        var_split = variant.split(' ', 2)
-        if len(var_split) == 3:
-            variant_set = var_split[1]
-            variant_value = var_split[2]
+        var_split = split_variant(variant)
+        if var_split:
+            variant_set, variant_value = var_split
         else:
             LOGGER.error('Invalid variant will be skipped: %s Index: %s', variant, idx)
             return
@@ -838,53 +1169,181 @@ class send_to_dg_worker(QObject):
         var_idx = idx
 
         # Extra feedbackloop
-        if self.long_render_timeout:
-            self.nc.deltagen_is_alive(20)
+        if self.long_render_timeout and not self.nc.deltagen_is_alive(20, self.record_event):
+            # Variant state events may be missed while DeltaGen is not answering
+            self.variant_state.clear()
 
         # Send variant command
         self.nc.send(variant)
 
-        # Check variant state y/n
+        # Set column 1 if DeltaGen reported this variant set, value column 2 if it reported this value
+        set_reported, value_reported = False, False
+
         if self.check_variants:
+            # Receive Variant State Feedback until this variant set reported the sent value,
+            # other events eg. Headlight, cascaded or earlier variant states are recorded and skipped
+            timeout = 0.45
             if self.long_render_timeout:
-                recv_str = self.nc.receive(2)
-            else:
-                # Receive Variant State Feedback
-                recv_str = self.nc.receive()
-        else:
-            recv_str = None
-
-        if recv_str is None:
-            recv_str = ''
-
-        # Feedback should be: 'EVENT variant_state loaded_scene_name variant_idx'
-        if recv_str:
-            # Split into: ['EVENT variant_state scene2 ', 'variant_set', ' ', 'variant_state', '']
-            recv_str = recv_str.split('"', 4)
-            if len(recv_str) >= 4:
-                variant_recv_set = recv_str[1]
-                variant_recv_val = recv_str[3]
-            else:
-                variant_recv_set = ''
-                variant_recv_val = ''
+                timeout = 3.0
 
-            # Compare if Feedback matches desired variant state
-            if variant_recv_set in variant_set:
-                # Set column to set to green
-                variant_set = 1
-            else:
-                variant_set = False
+            # Feedback: 'EVENT variant_state loaded_scene_name "variant_set" "variant_state"'
+            for event in self.nc.receive_events(timeout):
+                if event.name != 'variant_state' or len(event.args) < 2:
+                    continue
 
-            if variant_recv_val in variant_value:
-                # Set column to set to green
-                variant_value = 2
-            else:
-                variant_value = False
-        else:
-            variant_set, variant_value = False, False
+                self.record_variant_state(event)
+
+                if event.args[0] != variant_set:
+                    continue
+
+                set_reported = 1
+                if event.args[1] == variant_value:
+                    value_reported = 2
+                    break
+
+            if not value_reported:
+                self.record_variant_failed(variant, set_reported=bool(set_reported))
 
         # Signal results: -index in list-, set column, value column
-        self.strReady.emit(var_idx, variant_set, variant_value)
+        self.strReady.emit(var_idx, set_reported, value_reported)
+
+    def send_variants_pipelined(self, variant_list, deadline=None):
+        """
+            Send all variant switch commands back to back and match the variant_state EVENT's
+            to the outstanding commands by variant set and value afterwards.
+            variant_list: list of 'VARIANT SET STATE;' strings, list index identifies the item
+            deadline: overall seconds to wait for feedback, unmatched commands will be reported as failed
+        """
+        self.status.emit('Schaltung wird gesendet...')
+        variants_num = max(1, len(variant_list))
+
+        if deadline is None:
+            deadline = _PIPELINE_DEADLINE + _PIPELINE_DEADLINE_PER_VARIANT * variants_num
+
+        # Outstanding commands in send order, (variant_set, variant_value) per list index
+        outstanding = dict()
+        commands = list()
+
+        for idx, variant in enumerate(variant_list):
+            variant_split = split_variant(variant)
+
+            if not variant_split:
+                LOGGER.error('Invalid variant will be skipped: %s Index: %s', variant, idx)
+                continue
+
+            outstanding[idx] = variant_split
+            commands.append(variant)
+
+        # Send variant commands in one go
+        self.nc.send(''.join(commands))
+
+        if not self.check_variants:
+            for idx in outstanding.keys():
+                self.strReady.emit(idx, False, False)
+            self.task_progress.emit(100)
+            return
+
+        # Indices whose variant set was reported but with a different value
+        set_only_matches = set()
+        matched = 0
+        begin = time.time()
+
+        while outstanding and time.time() - begin < deadline:
+            # Feedback: 'EVENT variant_state loaded_scene_name "variant_set" "variant_state"'
+            for event in self.nc.receive_events(min(0.2, deadline - (time.time() - begin))):
+                if event.name != 'variant_state' or len(event.args) < 2:
+                    continue
+
+                variant_recv_set, variant_recv_val = event.args[0], event.args[1]
+                self.record_variant_state(event)
+                set_match_idx = None
+
+                for idx, (variant_set, variant_value) in outstanding.items():
+                    if variant_set != variant_recv_set:
+                        continue
+
+                    if variant_value == variant_recv_val:
+                        # Exact match, report set and value column as switched
+                        del outstanding[idx]
+                        set_only_matches.discard(idx)
+                        matched += 1
+                        self.strReady.emit(idx, 1, 2)
+                        self.task_progress.emit(round(100 / variants_num * matched))
+                        break
+
+                    if set_match_idx is None:
+                        set_match_idx = idx
+                else:
+                    # No exact match, remember oldest command of this variant set
+                    if set_match_idx is not None:
+                        set_only_matches.add(set_match_idx)
+
+                if not outstanding:
+                    break
+
+            # Abort signal
+            if self.abort_connection:
+                return
+
+        if outstanding:
+            LOGGER.info('%s of %s variants unmatched after %.2fs deadline.', len(outstanding), len(variant_list),
+                        time.time() - begin)
+
+        # Report unmatched commands after deadline
+        for idx in outstanding.keys():
+            self.record_variant_failed(variant_list[idx], set_reported=idx in set_only_matches)
+
+            if idx in set_only_matches:
+                self.strReady.emit(idx, 1, False)
+            else:
+                self.strReady.emit(idx, False, False)
+
+        self.task_progress.emit(100)
+
+    def confirm_preflight_scene(self, timeout=0.5):
+        """ Variants were sent unchecked, make sure the loaded scene is the scene they were checked against """
+        for event in self.nc.receive_events(timeout):
+            if event.name != 'variant_state':
+                continue
+
+            self.record_variant_state(event)
+            scene = event_scene_name(event)
+
+            if scene and scene != self.preflight_scene:
+                LOGGER.warning('Variants checked against scene %s but scene %s is loaded.', self.preflight_scene, scene)
+                self.display_msg.emit(Msg.DG_PREFLIGHT_SCENE_CHANGED.format(scene, self.preflight_scene),
+                                      ('[X]', None))
+            return
+
+    def record_event(self, event):
+        """ Record variant_state events read while waiting for other events """
+        if event.name == 'variant_state':
+            self.record_variant_state(event)
+
+    def record_variant_state(self, event):
+        """ Update the known variant state and the variant catalog of the scene reporting the event """
+        if len(event.args) < 2:
+            return
+
+        self.variant_state.update(event.args[0], event.args[1])
+
+        scene = event_scene_name(event)
+        if scene and (self.variant_catalog is None or self.variant_catalog.scene != scene):
+            self.save_variant_catalog()
+            self.variant_catalog = VariantCatalog.load(scene)
+
+        if self.variant_catalog is not None:
+            self.variant_catalog.record(event.args[0], event.args[1])
+
+    def record_variant_failed(self, variant, set_reported=False):
+        variant_split = split_variant(variant)
+
+        if self.variant_catalog is not None and variant_split:
+            self.variant_catalog.record_failed(*variant_split, set_reported=set_reported)
+
+    def save_variant_catalog(self):
+        if self.variant_catalog is not None:
+            self.variant_catalog.save()
 
     @staticmethod
     def return_time(only_minutes=False):
@@ -911,99 +1370,266 @@ class send_to_dg_worker(QObject):
 
     def init_render_log(self):
         self.render_log_name = 'RenderKnecht_Log_' + str(time.time()) + '.log'
-        self.render_log = ''
-        self.render_log += Msg.RENDER_LOG[0] + self.return_time() + '\n\n'
+
+    def start_png_pipeline(self, png_pipeline=None):
+        """
+            Rendered images are converted in a process pool while the next image renders
+            png_pipeline: pipeline shared with the other hosts of a render farm
+        """
+        self.png_pipeline = png_pipeline
+
+        if self.convert_to_png and not png_pipeline:
+            self.png_pipeline = PngConversionPipeline(self.create_render_preset_dir, self.png_workers,
+                                                      self.png_queue_size, on_converted=self.image_converted)
+
+        # Images of a resumed job that were rendered but not converted
+        if self.png_pipeline:
+            for img_path in self.resume_convert:
+                self.png_pipeline.submit(img_path, self.abort_requested)
+
+    def image_converted(self, img_path, success, message, duration):
+        self.journal.write('image_converted', img_name=img_path.name, success=success, message=message,
+                           duration=round(duration, 3), render_preset=self.img_render_presets.get(img_path))
+
+    def finish_png_pipeline(self):
+        """ Wait for outstanding conversions, results are written to the render journal """
+        if not self.png_pipeline:
+            return
+
+        if self.abort_connection:
+            self.png_pipeline.shutdown()
+        else:
+            self.status.emit('Konvertiere Bilddaten...')
+            self.png_pipeline.finish(self.abort_requested)
+
+        self.png_pipeline = None
 
     def render_loop(self):
         """ Render Loop """
         # List of paths to rendered img files
         self.img_list = []
-        img_count = 0
+        # Number of images rendered so far, differs from img_count if the render order is optimized
+        self.rendered_count = 0
         self.init_render_log()
+        self.render_time_estimator = RenderTimeEstimator(self.render_history, self.nc.server_address[0])
 
         # Render Path
         out_dir_name = 'out_' + str(time.time())
-        self.out_dir = HELPER_DIR.parents[0] / out_dir_name
 
-        if self.render_user_path:
-            self.out_dir = self.render_user_path / out_dir_name
+        if self.resume_dir:
+            # Continue a previous job in its output directory
+            self.out_dir = self.resume_dir
+        else:
+            self.out_dir = HELPER_DIR.parents[0] / out_dir_name
+
+            if self.render_user_path:
+                self.out_dir = self.render_user_path / out_dir_name
+
+            self.out_dir = self.out_dir.absolute()
+            self.out_dir = self.create_directory(self.out_dir, out_dir_name)
 
-        self.out_dir = self.out_dir.absolute()
-        self.out_dir = self.create_directory(self.out_dir, out_dir_name)
         self.initial_out_dir = self.out_dir
+        self.journal = RenderJournal(self.initial_out_dir, self.journal_listener)
         LOGGER.info('Output Directory: %s', self.out_dir)
 
         # Display render path in overlay
         self.strReady.emit(-1, Msg.OVERLAY_RENDER_DIR, str(self.out_dir))
 
+        if self.resume_dir:
+            # Planned order of the journal without the images already done
+            done, image_list = self.journal.remaining_images()
+            self.resume_convert = self.journal.unconverted_images()
+            self.journal.write('resume', done=len(done))
+            LOGGER.info('Resuming render job, %s images done, %s remaining.', len(done), len(image_list))
+        else:
+            # Expand render presets into images, optionally reordered to minimize variant switches
+            image_list = create_image_list(self.render_dict)
+            if self.optimize_render_order:
+                image_list = optimize_render_order(image_list)
+
+            self.journal.write_job(self.render_dict, image_list, self.optimize_render_order,
+                                   self.create_render_preset_dir, self.convert_to_png)
+
+        self.start_png_pipeline()
+
+        render_images = dict()
+        for image in image_list:
+            render_images.setdefault(image.render_preset_idx, list()).append(image)
+
         # Iterate Render Presets's
         for r in range(0, len(self.render_dict.items())):
+            if r not in render_images:
+                continue
+
             sampling = self.render_dict[r].get('sampling')
             resolution = self.render_dict[r].get('resolution')
             file_extension = self.render_dict[r].get('file_extension')
-            render_preset_name = self.render_dict[r]['render_preset_name']
+            self.render_preset_name = self.render_dict[r]['render_preset_name']
 
             # Create Render Preset Output Directory
             if self.create_render_preset_dir:
-                render_preset_name = to_valid_chrs(render_preset_name)
-
-                new_out_dir = self.initial_out_dir / render_preset_name
+                new_out_dir = self.initial_out_dir / to_valid_chrs(self.render_preset_name)
                 self.out_dir = self.create_directory(new_out_dir, out_dir_name)
                 LOGGER.debug('Created Render Preset directory: %s', self.out_dir.name)
 
-            try:
-                samples = str(2 ** int(sampling))
-                self.render_log += render_preset_name + ' Einstellungen - '
-                self.render_log += 'Sampling: 2^' + sampling + ' ' + samples + ' - Res: '
-                self.render_log += resolution.replace(' ', 'x') + 'px - Ext: ' + file_extension + '\n\n'
-            except:
-                pass
-
-            # Make sure we render even if no viewset supplied
-            if self.render_dict[r]['viewsets'] == []:
-                self.render_dict[r]['viewsets'].append('Dummy')
+            self.journal.write('render_preset', render_preset=self.render_preset_name, sampling=sampling,
+                               resolution=resolution, file_extension=file_extension)
 
             self.render_start_time = time.time()
 
-            # Render Preset preset's / reference's (one image per reference)
-            for preset in self.render_dict[r]['preset'].items():
-                # unpack tuple
-                idx, preset = preset
+            # Render Preset preset's / reference's (one image per reference and viewset)
+            for idx, image in enumerate(render_images[r]):
+                self.rendered_count += 1
 
-                # Iterate Render Preset viewset's
-                for viewset in self.render_dict[r]['viewsets']:
-                    # Ascend image number for all images in all Render Preset's
-                    img_count += 1
+                # Call render method, image number of the original order keeps file names stable
+                rendered = self.render_preset(image.img_count, image.preset, image.viewset, sampling, resolution,
+                                              file_extension)
 
-                    # Call render method
-                    self.render_preset(img_count, preset, viewset, sampling, resolution, file_extension)
+                # DeltaGen dropped the connection, re-connect and render the image again
+                if not rendered and not self.abort_connection and self.reconnect_render_host():
+                    rendered = self.render_preset(image.img_count, image.preset, image.viewset, sampling,
+                                                  resolution, file_extension)
 
-                    # Abort signal
-                    QtWidgets.QApplication.processEvents()
-                    if self.abort_connection: return
+                if not rendered and not self.abort_connection:
+                    remaining = render_images[r][idx:]
+                    for q in range(r + 1, len(self.render_dict.items())):
+                        remaining += render_images.get(q, list())
+
+                    self.render_connection_lost(remaining)
+
+                # Abort signal
+                if self.abort_connection:
+                    self.finish_png_pipeline()
+                    return
 
             if self.create_render_preset_dir:
-                try:
-                    with open(self.out_dir / self.render_log_name, 'w') as e:
-                        print(self.render_log, file=e)
-                    self.init_render_log()
-                except:
-                    pass
+                self.journal.write_render_log(self.out_dir / self.render_log_name, self.render_preset_name)
 
-        # Convert rendered images
-        self.status.emit('Konvertiere Bilddaten...')
-        if self.convert_to_png and self.img_list:
-            self.render_log += create_png_images(self.img_list, self.create_render_preset_dir)
+        # Wait for outstanding image conversions
+        self.finish_png_pipeline()
 
         # Create log file after rendering complete
-        try:
-            with open(self.initial_out_dir / self.render_log_name, 'w') as e:
-                print(self.render_log, file=e)
-        except Exception as e:
-            LOGGER.error('Error saving render log file: %s', e)
+        self.write_cache_stats()
+        self.journal.write('job_finished')
+        self.journal.write_render_log(self.initial_out_dir / self.render_log_name)
+
+    def reconnect_render_host(self):
+        """ Re-connect after DeltaGen dropped the connection, returns True if DeltaGen is responding again """
+        LOGGER.warning('DeltaGen connection lost while rendering, re-connecting to %s', self.nc.server_address)
+        self.status.emit('Verbindung verloren, verbinde erneut...')
+        self.nc.close()
+
+        if not self.connect_to_deltagen(20, num_tries=2):
+            return False
+
+        if self.viewer:
+            self.nc.send('SIZE VIEWER 320 240; FREEZE VIEWER;')
+
+        self.nc.send('SUBSCRIBE VARIANT_STATE;')
+
+        # Variant state of the host is unknown after the re-connect, send all variants of the next image
+        self.variant_state.clear()
+        return True
+
+    def render_connection_lost(self, remaining):
+        """ Render job can not continue, finish conversions and report the images not rendered """
+        img_names = [image.img_name for image in remaining]
+        LOGGER.error('DeltaGen connection lost, %s images not rendered.', len(img_names))
+
+        # Convert the images rendered so far before the job ends
+        self.finish_png_pipeline()
+
+        self.write_cache_stats()
+        self.journal.write('not_rendered', images=img_names)
+        self.journal.write_render_log(self.initial_out_dir / self.render_log_name)
+
+        self.display_msg.emit(Msg.RENDER_CONNECTION_LOST.format(len(img_names)), ('[X]', None))
+        self.abort_connection = True
+
+    @pyqtSlot()
+    def render_farm_images(self):
+        """ Render images taken from the render farm queue until it is empty, slot of render host threads """
+        self.img_list = []
+        self.rendered_count = 0
+        self.journal = self.farm.journal
+        self.start_png_pipeline(self.farm.png_pipeline)
+
+        self.status.emit('Prüfe Verbindung...')
+        connected = self.connect_to_deltagen(20, num_tries=2)
+
+        if connected:
+            self.render_farm_queue()
+        else:
+            self.farm.host_failed(self)
+
+        # The last host leaving waits for the outstanding image conversions of all hosts
+        if self.farm.host_finished():
+            self.finish_png_pipeline()
+        self.png_pipeline = None
+
+        if connected:
+            self.exit_thread()
+        else:
+            self.finished.emit()
+
+    def render_farm_queue(self):
+        """ Render images of the render farm queue on the connected host """
+        if self.viewer:
+            self.nc.send('SIZE VIEWER 320 240; FREEZE VIEWER;')
+
+        # Subscribe to variant states
+        self.nc.send('SUBSCRIBE VARIANT_STATE;')
+
+        self.render_time_estimator = RenderTimeEstimator(self.render_history, self.nc.server_address[0])
+        self.render_start_time = time.time()
+
+        while not self.abort_connection:
+            image = self.farm.next_image(self.abort_requested)
+            if image is None:
+                break
+
+            self.out_dir = self.farm.image_out_dir(image)
+            self.render_preset_name = image.render_preset_name
+            self.rendered_count += 1
+
+            if self.render_preset(image.img_count, image.preset, image.viewset, image.sampling, image.resolution,
+                                  image.file_extension):
+                self.farm.image_finished(self, image)
+                continue
+
+            if self.abort_connection:
+                self.farm.requeue_image(image)
+            else:
+                # Host died mid-image, other hosts will render it
+                self.farm.host_failed(self, image)
+            break
+
+        self.write_cache_stats()
+
+    def image_from_cache(self, img_count, img_name, cache_key):
+        """ Treat an image taken from the render cache like a rendered and verified image """
+        img_file_path = self.out_dir / img_name
+        self.img_list.append(img_file_path)
+        self.img_render_presets[img_file_path] = self.render_preset_name
+
+        self.journal.write('image_cached', img_count=img_count, img_name=img_name, key=cache_key,
+                           render_preset=self.render_preset_name)
+        self.journal.write('image_verified', img_count=img_count, img_name=img_name, path=str(img_file_path),
+                           valid=True, message='', render_preset=self.render_preset_name)
+        self.status.emit(Msg.RENDER_CACHE_HIT.format(img_name))
+
+        if self.png_pipeline:
+            self.png_pipeline.submit(img_file_path, self.abort_requested)
+
+    def write_cache_stats(self):
+        if self.render_cache:
+            self.journal.write('cache_stats', hits=self.render_cache.hits, misses=self.render_cache.misses)
 
     def render_preset(self, img_count, preset, viewset, sampling, resolution, file_extension):
-        """ Sub loop, switch variants and render current preset """
+        """
+            Sub loop, switch variants and render current preset
+            Returns True if the image was created, False on abort or lost DeltaGen connection
+        """
         # Make sure we are not assigning objects with +=
         name = preset.get('name')
         variant_list = []
@@ -1023,76 +1649,147 @@ class send_to_dg_worker(QObject):
         img_name = to_valid_chrs(img_name)
 
         LOGGER.info('Rendering: %s\nAA: %s RES: %s EXT: %s', img_name, sampling, resolution, file_extension)
-        self.render_log += self.return_time() + ' ' + Msg.RENDER_LOG[1] + img_name + '\n' + Msg.RENDER_LOG[2]
+
+        # Re-use a verified image of the same render configuration
+        cache_key = None
+        if self.render_cache:
+            cache_key = self.render_cache.key(variant_list, resolution, sampling, file_extension)
+
+            if self.render_cache.fetch(cache_key, self.out_dir / img_name):
+                self.image_from_cache(img_count, img_name, cache_key)
+                return True
+
+        # Only send variants that change the known DeltaGen state, full send every n images
+        send_list = variant_list
+        if self.delta_variants and self.check_variants:
+            if not self.variant_state or self.images_since_full_send >= self.full_resend_interval:
+                self.images_since_full_send = 0
+            else:
+                send_list = self.variant_state.delta(variant_list)
+                LOGGER.info('Sending %s of %s variants that differ from the DeltaGen variant state.',
+                            len(send_list), len(variant_list))
+
+            self.images_since_full_send += 1
+
+        self.journal.write('image_sent', img_count=img_count, img_name=img_name, render_preset=self.render_preset_name,
+                           host=self.nc.server_address[0] if self.farm else '', variants=variant_list,
+                           sent=len(send_list))
 
         # Send variants
-        for idx, variant in enumerate(variant_list):
-            time.sleep(0.001)
-            self.send_and_check_variant(variant, idx, len(variant_list))
+        send_start_time = time.time()
+        self.pacer.start_image()
 
-            self.render_log += variant.replace('VARIANT ', '')
+        if self.pipeline_variants:
+            self.send_variants_pipelined(send_list)
 
-            # Abort signal
-            QtWidgets.QApplication.processEvents()
-            if self.abort_connection: return
+            if self.abort_connection: return False
+        else:
+            for idx, variant in enumerate(send_list):
+                self.send_and_check_variant(variant, idx, len(send_list))
 
-        self.render_log += '\n\n'
+                # Abort signal
+                if self.abort_connection: return False
 
-        time.sleep(0.1)
         # Send settings command
         self.nc.send('IMAGE_SAA_QUALITY VIEWER ' + sampling)
-
-        # Rendering command
-        time.sleep(0.1)
         img_file_path = self.out_dir / img_name
 
-        # Build img list for conversion
-        self.img_list.append(img_file_path)
+        # Render command as soon as DeltaGen processed variants and settings
+        if not self.pacer.wait_ready(20):
+            # Variant state events may be missed while DeltaGen is not answering, next image sends all variants
+            self.variant_state.clear()
+            if self.abort_connection: return False
 
-        # Feedbackloop before render command
-        if self.long_render_timeout:
-            self.nc.close()
-            time.sleep(1)
-            # Subscribe to variant states
-            self.nc.send('SUBSCRIBE VARIANT_STATE;')
-            time.sleep(1)
+            if self.long_render_timeout:
+                # Renew the connection of a host that stopped answering, eg. after long texture loading
+                LOGGER.warning('DeltaGen not responding, re-connecting before render command.')
+                self.nc.close()
+                self.nc.connect()
+                self.nc.send('SUBSCRIBE VARIANT_STATE;')
 
-        self.nc.deltagen_is_alive(20)
+            if not self.pacer.wait_ready(20) and self.farm:
+                # Let another render host take this image
+                LOGGER.error('Render host %s is not responding.', self.nc.server_address)
+                return False
 
         # Render command
         self.nc.send('IMAGE "' + str(img_file_path) + '" ' + str(resolution) + ';')
+        image_start_time = time.time()
 
         # Calculate render time
-        if img_count == 1: self.render_start_time = time.time()
-        render_time, image_num = self.calc_render_time(self.render_dict)
+        if self.rendered_count == 1: self.render_start_time = time.time()
+        render_time, image_num = self.calc_render_time(self.render_dict, self.render_time_estimator)
 
-        # Wait until image was created
-        while not img_file_path.exists():
-            time.sleep(1)
-            render_display = self.calculate_remaining(render_time, img_count, image_num)
+        # Wait until image was created and completely written
+        watcher = RenderFileWatcher(img_file_path)
+        abort = self.abort_requested
+
+        while not watcher.wait(1.0, abort):
+            render_display = self.calculate_remaining(render_time, self.rendered_count, image_num)
             self.status.emit('Rendering ' + render_display)
 
-            QtWidgets.QApplication.processEvents()
-            if self.abort_connection: return
+            if self.abort_connection:
+                watcher.close()
+                return False
+
+            if self.nc.connection_lost():
+                LOGGER.error('DeltaGen connection lost while rendering %s', img_name)
+                watcher.close()
+                return False
+
+        # Build img list for conversion
+        self.img_list.append(img_file_path)
+        self.img_render_presets[img_file_path] = self.render_preset_name
+        self.journal.write('image_rendered', img_count=img_count, img_name=img_name, path=str(img_file_path),
+                           render_preset=self.render_preset_name)
 
         # Verify a valid image file was created
+        verify_start_time = time.time()
         self.status.emit('Prüfe Bilddaten...')
-        self.verify_rendered_image(img_file_path)
+        valid, message = self.verify_rendered_image(img_file_path, resolution, watcher)
+        watcher.close()
+
+        self.journal.write('image_verified', img_count=img_count, img_name=img_name, path=str(img_file_path),
+                           valid=valid, message=message, render_preset=self.render_preset_name)
 
-        # Image created
+        if valid and cache_key:
+            self.render_cache.store(cache_key, img_file_path)
+
+        # Timings for future render time estimates
+        self.render_history.record(self.nc.server_address[0], resolution, sampling, file_extension,
+                                   len(variant_list), len(send_list), image_start_time - send_start_time,
+                                   verify_start_time - image_start_time, time.time() - verify_start_time)
+
+        # Convert while the next image renders
+        if self.png_pipeline:
+            self.png_pipeline.submit(img_file_path, self.abort_requested)
+
+        # Image created, continue once DeltaGen recovered from writing the image
         self.status.emit('Rendering erzeugt.')
-        time.sleep(0.5)
+        if not self.pacer.wait_ready(20):
+            self.variant_state.clear()
+            if self.abort_connection: return False
 
-        # Wait 5 seconds for DeltaGen to recover
-        for count in range(2, 0, -1):
-            self.status.emit('Erzeuge nächstes Bild in ' + str(count) + '...')
-            time.sleep(1)
+        # Time spent outside of DeltaGen rendering the image
+        heartbeat_s, backoff_s = self.pacer.image_overhead()
+        overhead_s = time.time() - send_start_time - (verify_start_time - image_start_time)
+        LOGGER.info('Image overhead %.2fs, heartbeats %.2fs, back off %.2fs', overhead_s, heartbeat_s, backoff_s)
+        self.journal.write('image_overhead', img_count=img_count, img_name=img_name, overhead_s=round(overhead_s, 3),
+                           heartbeat_s=heartbeat_s, backoff_s=backoff_s, render_preset=self.render_preset_name)
 
-    def verify_rendered_image(self, img_path, timeout=3300):
-        """ Read rendered image with ImageIO to verify as valid image or break after 55mins/3300secs """
+        return True
+
+    def abort_requested(self):
+        return self.abort_event.is_set()
+
+    def verify_rendered_image(self, img_path, resolution=None, watcher=None, timeout=3300):
+        """
+            Validate the image header, dimensions and file size, optionally decode the whole image.
+            Retry on every change of the file or break after 55mins/3300secs
+            Returns (valid, message)
+        """
         begin = time.time()
-        img = False
-        exception_message = ''
+        error_displayed = False
 
         if self.long_render_timeout:
             # Long render timeout eg. A3 can take up to 40min to write an image
@@ -1100,57 +1797,44 @@ class send_to_dg_worker(QObject):
             timeout = 1800
 
         while 1:
-            QtWidgets.QApplication.processEvents()
-            if self.abort_connection: return
+            if self.abort_connection: return False, 'Abort'
 
-            try:
-                # Try to read image
-                img = imread(str(img_path))
-                img = True
-            except ValueError or OSError as exception_message:
-                """ Value error if format not found or file incomplete; OSError on non-existent file """
-                if time.time() - begin < 11:
-                    LOGGER.debug('Rendered image could not be verified. Verification loop %s sec.\n%s', timeout,
-                                 exception_message)
+            valid, exception_message = validate_image_file(img_path, resolution, self.verify_full_decode)
+
+            if valid:
+                LOGGER.debug('Rendered image was verified as valid image file.')
 
                 # Display image verification in Overlay
                 try:
-                    msg = Msg.OVERLAY_RENDER_IMG_ERR + str(img_path.name)
+                    msg = Msg.OVERLAY_RENDER_IMG + str(img_path.name)
                     self.display_msg.emit(msg, ())
                 except Exception as e:
-                    LOGGER.error('Tried to send overlay message. But:\n%s', e)
+                    LOGGER.error('Tried to send overlay error message. But:\n%s', e)
 
-                QtWidgets.QApplication.processEvents()
-                # Wait 10 seconds
-                time.sleep(10)
+                return True, ''
 
-            if img:
-                del img
-                LOGGER.debug('Rendered image was verified as valid image file.')
+            LOGGER.debug('Rendered image could not be verified. Verification loop %s sec.\n%s', timeout,
+                         exception_message)
 
-                # Display image verification in Overlay
+            # Display image verification in Overlay
+            if not error_displayed:
+                error_displayed = True
                 try:
-                    msg = Msg.OVERLAY_RENDER_IMG + str(img_path.name)
+                    msg = Msg.OVERLAY_RENDER_IMG_ERR + str(img_path.name)
                     self.display_msg.emit(msg, ())
                 except Exception as e:
-                    LOGGER.error('Tried to send overlay error message. But:\n%s', e)
-
-                break
+                    LOGGER.error('Tried to send overlay message. But:\n%s', e)
 
             # Timeout
             if time.time() - begin > timeout:
                 LOGGER.error('Rendered image could not be verified as valid image file after %s seconds.', timeout)
-                self.render_log += '\nDatei konnte nicht als gültige Bilddatei verfiziert werden: ' + str(
-                    img_path) + '\n'
-
-                try:
-                    if exception_message:
-                        self.render_log += exception_message + '\n'
-                except UnboundLocalError:
-                    # exception_message not defined
-                    pass
+                return False, exception_message
 
-                break
+            # Retry once the file changes, at least every 10 seconds
+            if watcher:
+                watcher.wait_for_change(10, self.abort_requested)
+            else:
+                self.abort_event.wait(10)
 
     def calculate_remaining(self, render_time, img_count, image_num):
         """ Returns remaining time in hh: mm: ss """
@@ -1175,8 +1859,11 @@ class send_to_dg_worker(QObject):
         return time_string(render_seconds_remaining)
 
     @staticmethod
-    def calc_render_time(render_dict):
-        """ Calculate render time in seconds """
+    def calc_render_time(render_dict, estimator=None):
+        """ Calculate render time in seconds, from the render history if an estimator is provided """
+        if estimator:
+            return estimator.estimate_render_dict(render_dict)
+
         render_time = 0
         image_num_all = 0
 
@@ -0,0 +1,166 @@
+"""
+knecht_dg_benchmark measures send and render worker throughput against the DeltaGen simulator.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+Run from the application directory:
+    python -m modules.knecht_dg_benchmark --variants 400 --images 5 --latency 0.01 --jitter 0.005
+
+Reports variants per second for the serial and pipelined send path,
+time to first image and per image overhead of the render path.
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PyQt5.QtCore import QCoreApplication
+
+from modules.knecht_deltagen import send_to_dg_worker
+from modules.knecht_dg_simulator import DeltaGenSimulator
+from modules.knecht_log import init_logging
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+
+def create_benchmark_variants(num_variants, num_sets=50):
+    return ['VARIANT bench_set_{:03d} value_{:04d};'.format(idx % num_sets, idx) for idx in range(num_variants)]
+
+
+def create_benchmark_render_dict(num_images, variants_per_image, resolution='64 64', sampling='0',
+                                 file_extension='.png'):
+    """ One render preset with num_images presets and one viewset """
+    presets = dict()
+
+    for idx in range(1, num_images + 1):
+        variants = ['VARIANT bench_set_{:03d} value_{:03d};'.format(v, idx) for v in range(variants_per_image)]
+        presets[idx] = dict(name='bench_preset_{:03d}'.format(idx), variants=variants)
+
+    return {0: dict(render_preset_name='Benchmark', viewsets=['VARIANT bench_shot shot_01;'], preset=presets,
+                    sampling=sampling, resolution=resolution, file_extension=file_extension)}
+
+
+def benchmark_send(simulator, num_variants, pipeline_variants):
+    """ Send num_variants with state check, returns result dict """
+    variants = create_benchmark_variants(num_variants)
+    worker = send_to_dg_worker(variants, False, True, pipeline_variants=pipeline_variants,
+                               tcp_ip=simulator.host, tcp_port=simulator.port)
+    results = list()
+    send_start = list()
+
+    def on_status(msg):
+        if msg.startswith('Schaltung') and not send_start:
+            send_start.append(time.time())
+
+    worker.status.connect(on_status)
+    worker.strReady.connect(lambda idx, variant_set, variant_value: results.append(bool(variant_set and variant_value)))
+
+    begin = time.time()
+    worker.send_variants()
+    end = time.time()
+
+    send_duration = end - (send_start[0] if send_start else begin)
+
+    return dict(mode='pipelined' if pipeline_variants else 'serial',
+                variants=num_variants,
+                verified=sum(results),
+                total_s=round(end - begin, 3),
+                send_s=round(send_duration, 3),
+                variants_per_s=round(num_variants / max(0.001, send_duration), 1))
+
+
+def benchmark_render(simulator, num_images, variants_per_image, pipeline_variants):
+    """ Render num_images with the simulator, returns result dict """
+    render_dict = create_benchmark_render_dict(num_images, variants_per_image)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        simulator.stats.reset()
+        worker = send_to_dg_worker([], False, True, render_dict, Path(out_dir), convert_to_png=False,
+                                   pipeline_variants=pipeline_variants,
+                                   tcp_ip=simulator.host, tcp_port=simulator.port)
+
+        begin = time.time()
+        worker.send_variants()
+        end = time.time()
+
+        image_times = list(simulator.stats.image_times)
+
+    total = end - begin
+    render_sum = sum(written - received for received, written, __p in image_times)
+    first_image = min((written for __r, written, __p in image_times), default=end) - begin
+    images = max(1, len(image_times))
+
+    return dict(mode='pipelined' if pipeline_variants else 'serial',
+                images=len(image_times),
+                total_s=round(total, 3),
+                time_to_first_image_s=round(first_image, 3),
+                render_s=round(render_sum, 3),
+                overhead_per_image_s=round((total - render_sum) / images, 3))
+
+
+def print_results(title, results):
+    print('\n' + title)
+
+    if not results:
+        return
+
+    keys = list(results[0].keys())
+    print(' | '.join('{:>22}'.format(k) for k in keys))
+    for result in results:
+        print(' | '.join('{:>22}'.format(str(result[k])) for k in keys))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DeltaGen send and render throughput benchmark')
+    parser.add_argument('--variants', type=int, default=400, help='Number of variants for the send benchmark')
+    parser.add_argument('--images', type=int, default=5, help='Number of images for the render benchmark')
+    parser.add_argument('--image-variants', type=int, default=30, help='Variants per rendered image')
+    parser.add_argument('--latency', type=float, default=0.005, help='Simulated event latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Simulated random event latency in seconds')
+    parser.add_argument('--render-delay', type=float, default=0.5, help='Simulated render time per image')
+    parser.add_argument('--skip-render', action='store_true', help='Only run the send benchmark')
+    parser.add_argument('--json', type=Path, help='Write results to this json file')
+    args = parser.parse_args()
+
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    results = dict(send=list(), render=list())
+
+    with DeltaGenSimulator(latency=args.latency, jitter=args.jitter, render_delay=args.render_delay) as simulator:
+        for pipeline_variants in (False, True):
+            results['send'].append(benchmark_send(simulator, args.variants, pipeline_variants))
+
+        if not args.skip_render:
+            for pipeline_variants in (False, True):
+                results['render'].append(
+                    benchmark_render(simulator, args.images, args.image_variants, pipeline_variants))
+
+    print_results('Send variants', results['send'])
+    print_results('Render images', results['render'])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    del app
+
+
+if __name__ == '__main__':
+    main()
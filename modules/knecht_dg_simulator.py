@@ -0,0 +1,340 @@
+"""
+knecht_dg_simulator provides a local TCP stand-in for the DeltaGen command port.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+Speaks the subset of the DeltaGen protocol RenderKnecht uses:
+
+    SUBSCRIBE VARIANT_STATE;                -> enables variant_state events
+    SUBSCRIBE LIGHT Headlight;              -> enables Headlight events
+    VARIANT set value;                      -> EVENT variant_state scene "set" "value"
+    LIGHT_COLOR Headlight r g b;            -> EVENT Headlight r g b
+    IMAGE "path" width height;              -> writes a dummy image after the render delay
+    SIZE/FREEZE/UNFREEZE/BACKGROUND VIEWER, IMAGE_SAA_QUALITY VIEWER n -> accepted, recorded
+
+Run standalone:
+    python -m modules.knecht_dg_simulator --port 3333 --latency 0.02 --jitter 0.01 --render-delay 2
+"""
+import argparse
+import random
+import shlex
+import socket
+import socketserver
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from queue import Queue, Empty
+
+from modules.knecht_log import init_logging
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+# Commands without trailing ; are processed if nothing follows for this long
+_COMMAND_FLUSH_TIMEOUT = 0.05
+
+
+def create_dummy_png(width, height):
+    """ Return bytes of a valid, grey RGB png image of the given size """
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    # One filter byte per scanline
+    scanline = b'\x00' + b'\x80' * (width * 3)
+    raw = scanline * height
+
+    return b'\x89PNG\r\n\x1a\n' \
+           + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) \
+           + chunk(b'IDAT', zlib.compress(raw, 1)) \
+           + chunk(b'IEND', b'')
+
+
+def create_dummy_hdr(width, height):
+    """ Return bytes of a valid, flat Radiance HDR image of the given size """
+    header = '#?RADIANCE\nFORMAT=32-bit_rle_rgbe\n\n-Y {} +X {}\n'.format(height, width).encode('ascii')
+    return header + b'\x80\x80\x80\x80' * (width * height)
+
+
+class SimulatorStats:
+    """ Counters and time stamps recorded by the simulator """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.commands = 0
+        self.variants = 0
+        self.events = 0
+        self.images = 0
+        self.settings = dict()
+        # (time stamp command received, time stamp image written, path)
+        self.image_times = list()
+        self.start_time = time.time()
+
+
+class _DeltaGenHandler(socketserver.BaseRequestHandler):
+    """ One client connection, DeltaGen handles one command connection at a time """
+    def setup(self):
+        self.sim = self.server.simulator
+        self.subscribed_variant_state = False
+        self.subscribed_headlight = False
+        self.reply_queue = Queue()
+        self.connected = True
+        self.last_due = 0.0
+
+        self.sender = threading.Thread(target=self.send_replies, daemon=True)
+        self.sender.start()
+
+    def handle(self):
+        self.request.settimeout(_COMMAND_FLUSH_TIMEOUT)
+        pending = ''
+
+        while self.connected and not self.sim.stopped.is_set():
+            try:
+                data = self.request.recv(4096)
+            except socket.timeout:
+                # Quiet line, a pending command without terminator is complete
+                if pending.strip():
+                    self.process_command(pending)
+                pending = ''
+                continue
+            except OSError as e:
+                LOGGER.debug('Client connection lost: %s', e)
+                break
+
+            if not data:
+                break
+
+            pending += data.decode('utf-8', errors='replace')
+            commands = pending.split(';')
+            pending = commands.pop()
+
+            for command in commands:
+                self.process_command(command)
+
+    def finish(self):
+        self.connected = False
+        self.reply_queue.put(None)
+
+    def queue_reply(self, message, delay):
+        """ Schedule a reply, replies keep the order of their commands """
+        due = max(time.time() + delay, self.last_due)
+        self.last_due = due
+        self.reply_queue.put((due, message))
+
+    def send_replies(self):
+        while self.connected:
+            try:
+                reply = self.reply_queue.get(timeout=0.5)
+            except Empty:
+                continue
+
+            if reply is None:
+                break
+
+            due, message = reply
+            time.sleep(max(0.0, due - time.time()))
+
+            try:
+                self.request.sendall((message + '\n').encode('utf-8'))
+            except OSError:
+                break
+
+            with self.sim.stats.lock:
+                self.sim.stats.events += 1
+
+    def process_command(self, command):
+        command = command.strip()
+        if not command:
+            return
+
+        with self.sim.stats.lock:
+            self.sim.stats.commands += 1
+
+        keyword = command.split(' ', 1)[0].upper()
+        delay = self.sim.reply_delay()
+
+        if keyword == 'SUBSCRIBE':
+            target = command.upper()
+            if 'VARIANT_STATE' in target:
+                self.subscribed_variant_state = True
+            elif 'HEADLIGHT' in target:
+                self.subscribed_headlight = True
+        elif keyword == 'VARIANT':
+            variant = command.split(' ', 2)
+            if len(variant) < 3:
+                return
+
+            variant_set, variant_value = variant[1], variant[2].strip()
+
+            with self.sim.stats.lock:
+                self.sim.stats.variants += 1
+
+            if not self.sim.is_valid_variant(variant_set, variant_value):
+                return
+
+            self.sim.variant_state[variant_set] = variant_value
+
+            if self.subscribed_variant_state:
+                self.queue_reply('EVENT variant_state {} "{}" "{}"'.format(
+                    self.sim.scene, variant_set, variant_value), delay)
+        elif keyword == 'LIGHT_COLOR':
+            light = command.split(' ', 2)
+            if len(light) == 3 and light[1] == 'Headlight' and self.subscribed_headlight:
+                self.queue_reply('EVENT Headlight {}'.format(light[2]), delay)
+        elif keyword == 'IMAGE':
+            self.render_image(command)
+        else:
+            # SIZE VIEWER, FREEZE VIEWER, IMAGE_SAA_QUALITY VIEWER etc.
+            with self.sim.stats.lock:
+                self.sim.stats.settings[command.rsplit(' ', 1)[0]] = command.rsplit(' ', 1)[-1]
+
+    def render_image(self, command):
+        try:
+            __cmd, img_path, width, height = shlex.split(command, posix=False)[:4]
+            img_path = Path(img_path.strip('"'))
+            width, height = int(width), int(height)
+        except ValueError:
+            LOGGER.error('Simulator received invalid IMAGE command: %s', command)
+            return
+
+        received = time.time()
+
+        def write_image():
+            time.sleep(self.sim.render_duration())
+
+            if img_path.suffix.casefold() == '.hdr':
+                data = create_dummy_hdr(width, height)
+            else:
+                # Other formats are written as png data
+                data = create_dummy_png(width, height)
+
+            # Write to a temporary name first so the file appears complete, like DeltaGen
+            tmp_path = img_path.with_name(img_path.name + '.tmp')
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                tmp_path.replace(img_path)
+            except OSError as e:
+                LOGGER.error('Simulator could not write image %s\n%s', img_path, e)
+                return
+
+            with self.sim.stats.lock:
+                self.sim.stats.images += 1
+                self.sim.stats.image_times.append((received, time.time(), img_path))
+
+        threading.Thread(target=write_image, daemon=True).start()
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class DeltaGenSimulator:
+    """
+        Local TCP server answering like a DeltaGen command port.
+
+        latency: seconds until an event is answered
+        jitter: random additional seconds 0 - jitter per event
+        render_delay: seconds until an image is written, render_jitter added randomly
+        variant_catalog: optional dict variant_set: set(values), unknown variants will not be answered
+        port: 0 chooses a free port, read it from self.port after start
+    """
+    def __init__(self, host='localhost', port=0, latency=0.0, jitter=0.0, render_delay=0.5, render_jitter=0.0,
+                 scene='simulator_scene', variant_catalog=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.render_delay = render_delay
+        self.render_jitter = render_jitter
+        self.scene = scene
+        self.variant_catalog = variant_catalog
+        self.variant_state = dict()
+
+        self.stats = SimulatorStats()
+        self.stopped = threading.Event()
+        self.server = None
+        self.thread = None
+
+    @property
+    def address(self):
+        return self.host, self.port
+
+    def reply_delay(self):
+        return self.latency + random.uniform(0.0, self.jitter)
+
+    def render_duration(self):
+        return self.render_delay + random.uniform(0.0, self.render_jitter)
+
+    def is_valid_variant(self, variant_set, variant_value):
+        if self.variant_catalog is None:
+            return True
+
+        return variant_value in self.variant_catalog.get(variant_set, set())
+
+    def start(self):
+        self.stopped.clear()
+        self.server = _ThreadingTCPServer((self.host, self.port), _DeltaGenHandler)
+        self.server.simulator = self
+        self.port = self.server.server_address[1]
+
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        LOGGER.info('DeltaGen simulator listening on %s:%s', self.host, self.port)
+
+    def stop(self):
+        self.stopped.set()
+
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+        LOGGER.info('DeltaGen simulator stopped.')
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local DeltaGen command port simulator')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=3333)
+    parser.add_argument('--latency', type=float, default=0.01, help='Event latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random additional event latency in seconds')
+    parser.add_argument('--render-delay', type=float, default=2.0, help='Seconds until an image is written')
+    parser.add_argument('--render-jitter', type=float, default=0.0)
+    args = parser.parse_args()
+
+    simulator = DeltaGenSimulator(args.host, args.port, args.latency, args.jitter, args.render_delay,
+                                  args.render_jitter)
+    simulator.start()
+
+    try:
+        while 1:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()
@@ -0,0 +1,149 @@
+"""
+knecht_excel_cache on disk cache of parsed V Plus workbooks.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+Stores the worksheet snapshots, PR-Family set and model list of a V Plus export
+keyed by the file content hash and the parser version. Opening the same export again,
+eg. with other filters, skips openpyxl. Entries are gzip compressed pickles and are
+evicted least recently used once the cache exceeds its size limit.
+"""
+import gzip
+import hashlib
+import json
+import pickle
+import threading
+import time
+from pathlib import Path
+
+from modules.app_globals import HELPER_DIR
+from modules.knecht_log import init_logging
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+VPLUS_CACHE_DIR = HELPER_DIR / 'vplus_cache'
+_INDEX_FILE_NAME = 'vplus_cache_index.json'
+
+# Increase if the cached data or the way worksheets are read changes
+PARSER_VERSION = 1
+
+
+def file_hash(file_path, chunk_size=1024 ** 2):
+    h = hashlib.sha256()
+
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+class VplusCache:
+    """ Parsed V Plus workbooks keyed by file content and parser version """
+    lock = threading.Lock()
+
+    def __init__(self, max_size_mb=500.0, cache_dir=VPLUS_CACHE_DIR):
+        self.max_size = int(max_size_mb * 1024 ** 2)
+        self.cache_dir = Path(cache_dir)
+        self.index_file = self.cache_dir / _INDEX_FILE_NAME
+
+    @staticmethod
+    def key(file_path):
+        return '{}_{}'.format(file_hash(file_path), PARSER_VERSION)
+
+    def _load_index(self):
+        if not self.index_file.exists():
+            return dict()
+
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            LOGGER.error('Could not read V Plus cache index, starting empty cache: %s', e)
+            return dict()
+
+    def _save_index(self, index):
+        tmp_file = self.index_file.with_suffix('.tmp')
+
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(index, f)
+            tmp_file.replace(self.index_file)
+        except OSError as e:
+            LOGGER.error('Could not write V Plus cache index: %s', e)
+
+    def load(self, key):
+        """ Returns the cached data dict of key or None """
+        with self.lock:
+            index = self._load_index()
+            entry = index.get(key)
+
+            if not entry:
+                return
+
+            try:
+                with gzip.open(str(self.cache_dir / entry['file']), 'rb') as f:
+                    data = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+                LOGGER.warning('Dropping invalid V Plus cache entry %s: %s', key[:12], e)
+                del index[key]
+                self._save_index(index)
+                return
+
+            entry['last_used'] = time.time()
+            self._save_index(index)
+
+        LOGGER.info('V Plus cache hit %s for %s', key[:12], entry['source'])
+        return data
+
+    def store(self, key, data: dict, source=''):
+        """ Add parsed workbook data and evict least recently used entries above the size limit """
+        cache_file_name = key + '.pkl.gz'
+        cache_file = self.cache_dir / cache_file_name
+
+        with self.lock:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                with gzip.open(str(cache_file), 'wb', compresslevel=6) as f:
+                    pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except (OSError, pickle.PicklingError) as e:
+                LOGGER.error('Could not add %s to V Plus cache: %s', source, e)
+                return
+
+            index = self._load_index()
+            index[key] = dict(file=cache_file_name, size=cache_file.stat().st_size,
+                              last_used=time.time(), source=source)
+            self._evict(index)
+            self._save_index(index)
+
+    def _evict(self, index):
+        cache_size = sum(entry['size'] for entry in index.values())
+
+        for key, entry in sorted(index.items(), key=lambda item: item[1]['last_used']):
+            if cache_size <= self.max_size:
+                break
+
+            try:
+                (self.cache_dir / entry['file']).unlink()
+            except OSError as e:
+                LOGGER.debug('Could not remove cached file %s: %s', entry['file'], e)
+
+            cache_size -= entry['size']
+            del index[key]
+            LOGGER.debug('Evicted V Plus cache entry %s', key[:12])
@@ -0,0 +1,84 @@
+"""
+knecht_excel_sheet cell value snapshots of V Plus worksheets.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+Random cell access on read only openpyxl worksheets re-parses the worksheet Xml
+up to the requested row. The V Plus readers access cells column by column, so
+every sheet is read once row by row into a list of value tuples instead.
+"""
+from modules.knecht_log import init_logging
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+
+def _worksheet_rows(worksheet):
+    try:
+        return [tuple(row) for row in worksheet.iter_rows(values_only=True)]
+    except TypeError:
+        # openpyxl < 2.6 has no values_only argument
+        return [tuple(cell.value for cell in row) for row in worksheet.iter_rows()]
+
+
+class SheetSnapshot:
+    """ Cell values of one worksheet, indexed like openpyxl with 1-based rows and columns """
+    def __init__(self, title, rows):
+        self.title = title
+        self.rows = rows
+        self.max_row = len(rows)
+        self.max_column = max((len(row) for row in rows), default=0)
+
+    @classmethod
+    def from_worksheet(cls, worksheet):
+        return cls(worksheet.title, _worksheet_rows(worksheet))
+
+    @classmethod
+    def concat(cls, sheet, rows):
+        """ Snapshot of sheet continued by rows of another sheet, the row tuples are shared """
+        return cls(sheet.title, sheet.rows + rows)
+
+    def column(self, column: int):
+        """ Values of column from the first to the last row """
+        return tuple(self.value(row, column) for row in range(1, self.max_row + 1))
+
+    def value(self, row: int, column: int):
+        """ Value of the cell at row, column or None outside of the used sheet range """
+        if row < 1 or column < 1:
+            return None
+
+        try:
+            return self.rows[row - 1][column - 1]
+        except IndexError:
+            return None
+
+
+class SnapshotWorkbook:
+    """ Read only stand-in for an openpyxl workbook, worksheets are SheetSnapshots """
+    def __init__(self, sheets: dict):
+        self.sheets = sheets
+
+    @property
+    def sheetnames(self):
+        return list(self.sheets)
+
+    def __getitem__(self, sheet_name):
+        return self.sheets[sheet_name]
+
+    def close(self):
+        pass
@@ -0,0 +1,145 @@
+"""
+knecht_file_watcher waits for rendered image files to be completely written.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+import time
+from pathlib import Path
+
+from PyQt5.QtCore import QEventLoop, QFileSystemWatcher, QObject, QTimer
+
+from modules.knecht_log import init_logging
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+# Abort and poll interval checks while waiting for watcher events
+_CHECK_INTERVAL_MS = 100
+
+
+class RenderFileWatcher(QObject):
+    """
+        Watches the output directory for img_path. The file counts as complete once it exists
+        and its size did not change for stable_time seconds.
+
+        Directory and file change events trigger an immediate check. Network shares do not
+        always report changes, so the file is also checked every poll_interval seconds.
+        Waiting runs a local event loop of the waiting thread that delivers the watcher events,
+        create the watcher in the thread that waits.
+    """
+    def __init__(self, img_path: Path, stable_time=0.5, poll_interval=1.0):
+        super(RenderFileWatcher, self).__init__()
+        self.img_path = img_path
+        self.stable_time = stable_time
+        self.poll_interval = poll_interval
+
+        self.changed = True
+        self.last_poll = 0.0
+        self.last_stat = None
+        self.stable_since = None
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.path_changed)
+        self.watcher.fileChanged.connect(self.path_changed)
+
+        if img_path.parent.exists():
+            self.watcher.addPath(str(img_path.parent))
+
+    def path_changed(self, path):
+        self.changed = True
+
+        # Watch the file itself once it appears
+        if self.img_path.exists() and str(self.img_path) not in self.watcher.files():
+            self.watcher.addPath(str(self.img_path))
+
+    def is_complete(self):
+        """ Check file size stability, only stats the file after an event or the poll interval """
+        now = time.time()
+
+        if not self.changed and now - self.last_poll < self.poll_interval and self.stable_since is None:
+            return False
+
+        self.changed = False
+        self.last_poll = now
+
+        try:
+            stat = self.img_path.stat()
+            stat = (stat.st_size, stat.st_mtime)
+        except OSError:
+            self.last_stat, self.stable_since = None, None
+            return False
+
+        if stat != self.last_stat or not stat[0]:
+            # Still growing or empty
+            self.last_stat, self.stable_since = stat, now
+            return False
+
+        return now - self.stable_since >= self.stable_time
+
+    def _run_event_loop(self, timeout, abort, done):
+        """
+            Run a local event loop that delivers the watcher events of this thread until
+            done() or abort() return True or timeout expired. Returns the last result of done().
+        """
+        end = time.time() + timeout
+        loop = QEventLoop()
+        result = [done()]
+
+        def check(*__args):
+            result[0] = done()
+
+            if result[0] or (abort is not None and abort()) or time.time() >= end:
+                loop.quit()
+
+        if result[0] or (abort is not None and abort()) or timeout <= 0:
+            return result[0]
+
+        # The timer checks abort and the poll interval, change events trigger an immediate check
+        timer = QTimer()
+        timer.setInterval(_CHECK_INTERVAL_MS)
+        timer.timeout.connect(check)
+        self.watcher.directoryChanged.connect(check)
+        self.watcher.fileChanged.connect(check)
+
+        timer.start()
+        loop.exec_()
+        timer.stop()
+
+        self.watcher.directoryChanged.disconnect(check)
+        self.watcher.fileChanged.disconnect(check)
+
+        return result[0]
+
+    def wait(self, timeout, abort=None):
+        """
+            Wait up to timeout seconds for the file to be complete.
+            abort: callable returning True to stop waiting early.
+            Returns True if the file is complete.
+        """
+        return self._run_event_loop(timeout, abort, self.is_complete)
+
+    def wait_for_change(self, timeout, abort=None):
+        """ Wait up to timeout seconds for the next change event of the watched file or directory """
+        self.changed = False
+        self._run_event_loop(timeout, abort, lambda: self.changed)
+
+    def close(self):
+        paths = self.watcher.files() + self.watcher.directories()
+        if paths:
+            self.watcher.removePaths(paths)
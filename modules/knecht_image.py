@@ -1,3 +1,10 @@
+import math
+import struct
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import imageio
 import numpy as np
 from PIL import Image
@@ -14,6 +21,275 @@ mask_img_path = base_path / 'DG_masked_view.png'
 result_img_path = base_path / 'output.png'
 
 
+# format, dimensions and expected minimum file size, exact=True if expected_size is the exact file size
+ImageHeader = namedtuple('ImageHeader', 'format width height expected_size exact')
+
+# OpenEXR scanlines per chunk by compression type
+_EXR_LINES_PER_CHUNK = {0: 1, 1: 1, 2: 1, 3: 16, 4: 32, 5: 16, 6: 32, 7: 32, 8: 32, 9: 256}
+
+
+def _read_png_header(f, file_size):
+    f.seek(16)
+    width, height = struct.unpack('>II', f.read(8))
+
+    # Complete files end with the IEND chunk
+    f.seek(max(0, file_size - 12))
+    if f.read(12)[4:8] != b'IEND':
+        raise ValueError('PNG IEND chunk missing, file incomplete')
+
+    return ImageHeader('PNG', width, height, file_size, True)
+
+
+def _read_jpeg_header(f, file_size):
+    f.seek(2)
+    width = height = None
+
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError('JPEG frame header not found')
+
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue
+
+        length = struct.unpack('>H', f.read(2))[0]
+
+        # SOF0 - SOF15 except DHT, JPG and DAC
+        if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>xHH', f.read(5))
+            break
+
+        f.seek(length - 2, 1)
+
+    f.seek(max(0, file_size - 2))
+    if f.read(2) != b'\xff\xd9':
+        raise ValueError('JPEG end of image marker missing, file incomplete')
+
+    return ImageHeader('JPEG', width, height, file_size, True)
+
+
+def _read_bmp_header(f, file_size):
+    f.seek(2)
+    expected_size = struct.unpack('<I', f.read(4))[0]
+    f.seek(18)
+    width, height = struct.unpack('<ii', f.read(8))
+
+    # Some writers leave the file size field empty
+    return ImageHeader('BMP', width, abs(height), expected_size, expected_size > 0)
+
+
+def _read_tiff_header(f, file_size):
+    f.seek(0)
+    endian = '<' if f.read(2) == b'II' else '>'
+    f.seek(4)
+    ifd_offset = struct.unpack(endian + 'I', f.read(4))[0]
+
+    f.seek(ifd_offset)
+    num_entries = struct.unpack(endian + 'H', f.read(2))[0]
+    entries = dict()
+
+    for __i in range(num_entries):
+        tag, field_type, count, value = struct.unpack(endian + 'HHI4s', f.read(12))
+        entries[tag] = (field_type, count, value)
+
+    def tag_values(tag):
+        field_type, count, value = entries[tag]
+        fmt = 'H' if field_type == 3 else 'I'
+        size = struct.calcsize(fmt) * count
+
+        if size > 4:
+            position = f.tell()
+            f.seek(struct.unpack(endian + 'I', value)[0])
+            value = f.read(size)
+            f.seek(position)
+
+        return struct.unpack(endian + fmt * count, value[:size])
+
+    width, height = tag_values(256)[0], tag_values(257)[0]
+
+    # Strip or tile offsets + byte counts determine the file size
+    expected_size = 0
+    for offsets_tag, counts_tag in ((273, 279), (324, 325)):
+        if offsets_tag in entries and counts_tag in entries:
+            expected_size = max(o + c for o, c in zip(tag_values(offsets_tag), tag_values(counts_tag)))
+
+    return ImageHeader('TIFF', width, height, expected_size, False)
+
+
+def _read_hdr_header(f, file_size):
+    f.seek(0)
+    header_size = 0
+
+    # Header lines until an empty line, followed by the resolution string
+    for line in iter(f.readline, b''):
+        header_size += len(line)
+        if line.strip() == b'':
+            break
+        if header_size > 65536:
+            raise ValueError('Radiance HDR header too long')
+
+    resolution = f.readline()
+    header_size += len(resolution)
+    res = resolution.split()
+
+    if len(res) != 4:
+        raise ValueError('Radiance HDR resolution string invalid')
+
+    if res[0] in (b'-Y', b'+Y'):
+        height, width = int(res[1]), int(res[3])
+    else:
+        width, height = int(res[1]), int(res[3])
+
+    flat_size = header_size + width * height * 4
+    if file_size == flat_size:
+        return ImageHeader('HDR', width, height, flat_size, True)
+
+    # Run length encoded, the end of the last scanline is the file size
+    return ImageHeader('HDR', width, height, header_size + _hdr_rle_data_size(f.read(), width, height), False)
+
+
+def _hdr_rle_data_size(data, width, height):
+    """ Walk the run length encoded scanlines of Radiance HDR data, raises ValueError if data is truncated """
+    pos = 0
+
+    for __y in range(height):
+        if data[pos:pos + 2] != b'\x02\x02' or not 8 <= width <= 0x7fff:
+            # Flat scanline
+            pos += width * 4
+        else:
+            if (data[pos + 2] << 8) + data[pos + 3] != width:
+                raise ValueError('Radiance HDR scanline width invalid')
+            pos += 4
+
+            # Four components of runs, a count above 128 repeats one byte, otherwise count bytes follow
+            for __c in range(4):
+                x = 0
+                while x < width:
+                    count = data[pos]
+                    if count > 128:
+                        count -= 128
+                        pos += 2
+                    else:
+                        pos += 1 + count
+
+                    if not count:
+                        raise ValueError('Radiance HDR run length invalid')
+                    x += count
+
+        if pos > len(data):
+            raise ValueError('Radiance HDR scanlines incomplete, file incomplete')
+
+    return pos
+
+
+def _read_exr_header(f, file_size):
+    f.seek(4)
+    version = struct.unpack('<I', f.read(4))[0]
+    tiled = bool(version & 0x200)
+    attributes = dict()
+
+    while True:
+        name = b''.join(iter(lambda: f.read(1), b'\x00'))
+        if not name:
+            break
+
+        # Skip the attribute type
+        b''.join(iter(lambda: f.read(1), b'\x00'))
+        size = struct.unpack('<I', f.read(4))[0]
+        attributes[name] = f.read(size)
+
+        if f.tell() >= file_size:
+            raise ValueError('OpenEXR header incomplete')
+
+    x_min, y_min, x_max, y_max = struct.unpack('<iiii', attributes[b'dataWindow'])
+    width, height = x_max - x_min + 1, y_max - y_min + 1
+    header_size = f.tell()
+
+    if tiled:
+        return ImageHeader('EXR', width, height, header_size, False)
+
+    # Scanline image, the last chunk in the offset table ends the file
+    compression = attributes.get(b'compression', b'\x00')[0]
+    num_chunks = math.ceil(height / _EXR_LINES_PER_CHUNK.get(compression, 1))
+
+    f.seek(header_size + (num_chunks - 1) * 8)
+    last_offset = struct.unpack('<Q', f.read(8))[0]
+
+    if not last_offset or last_offset + 8 > file_size:
+        raise ValueError('OpenEXR offset table incomplete')
+
+    f.seek(last_offset + 4)
+    last_chunk_size = struct.unpack('<I', f.read(4))[0]
+
+    return ImageHeader('EXR', width, height, last_offset + 8 + last_chunk_size, False)
+
+
+_IMAGE_MAGIC = (
+    (b'\x89PNG\r\n\x1a\n', _read_png_header),
+    (b'\xff\xd8', _read_jpeg_header),
+    (b'BM', _read_bmp_header),
+    (b'II*\x00', _read_tiff_header),
+    (b'MM\x00*', _read_tiff_header),
+    (b'#?', _read_hdr_header),
+    (b'v/1\x01', _read_exr_header),
+    )
+
+
+def read_image_header(img_path: Path):
+    """
+        Read format and dimensions of an image from its header without decoding the image data.
+        Raises ValueError for unknown formats or truncated files, OSError if the file can not be read.
+    """
+    file_size = img_path.stat().st_size
+
+    with open(img_path, 'rb') as f:
+        magic = f.read(8)
+
+        for magic_bytes, read_header in _IMAGE_MAGIC:
+            if magic.startswith(magic_bytes):
+                try:
+                    return read_header(f, file_size)
+                except (struct.error, KeyError, IndexError) as e:
+                    raise ValueError('{} header incomplete or invalid: {}'.format(read_header.__name__, e))
+
+    raise ValueError('Unknown image format')
+
+
+def validate_image_file(img_path: Path, resolution: str=None, full_decode=False):
+    """
+        Cheap validation of a rendered image: format magic, dimensions matching
+        resolution 'width height' and the expected file size. full_decode additionally reads the image data.
+        Returns (True, '') or (False, reason)
+    """
+    try:
+        header = read_image_header(img_path)
+        file_size = img_path.stat().st_size
+    except (ValueError, OSError) as e:
+        return False, str(e)
+
+    if resolution:
+        try:
+            width, height = (int(r) for r in resolution.split()[:2])
+        except ValueError:
+            width, height = header.width, header.height
+
+        if (header.width, header.height) != (width, height):
+            return False, '{} dimensions {}x{} do not match requested {}x{}'.format(
+                header.format, header.width, header.height, width, height)
+
+    if file_size < header.expected_size or (header.exact and file_size != header.expected_size):
+        return False, '{} file size {} does not match expected size {}'.format(
+            header.format, file_size, header.expected_size)
+
+    if full_decode:
+        try:
+            imageio.imread(str(img_path))
+        except (ValueError, OSError) as e:
+            return False, str(e)
+
+    return True, ''
+
+
 def read_to_pil_image(image_path: Path):
     """ Read an image using imageio and return as PIL Image object """
     # Read with imageio for format compatibility
@@ -56,6 +332,55 @@ def convert_to_black_white_mask(img: Image.Image):
     return Image.eval(img, lambda px: 0 if px <= 254 else px)
 
 
+def convert_png_image(img_file_path: Path, contains_render_preset_dir=False,
+                      converted_dir_name='non_converted_render_output'):
+    """
+        Convert one image to png and move the source into converted_dir_name.
+        Module level so it can run in a process pool. Returns (success, message, duration)
+    """
+    begin = time.time()
+    return_msg = ''
+
+    # Read image
+    try:
+        img_hdr = imageio.imread(str(img_file_path))
+    except (ValueError, OSError) as exception_message:
+        # Image may not be completly written yet
+        LOGGER.error('Could not open image: %s, %s', img_file_path, exception_message)
+        return_msg += '\nBild konnte nicht gelesen werden: '\
+                      + img_file_path.name + '\n' + str(exception_message) + '\n'
+        # Skip image
+        return False, return_msg, time.time() - begin
+
+    # Set target png file
+    img_png = img_file_path.parent / Path(img_file_path.stem).with_suffix('.png')
+
+    # Convert image file
+    try:
+        imageio.imwrite(str(img_png), img_hdr)
+        return_msg += str(img_png.name)
+    except Exception as e:
+        LOGGER.error('Could not write png image: %s\n%s', img_png, e)
+        return False, 'Konnte Bild nicht schreiben: ' + str(img_png) + '\n', time.time() - begin
+
+    # Move source file to 'converted' directory
+    if contains_render_preset_dir:
+        new_img_hdr = img_file_path.parent.parent / converted_dir_name / img_file_path.name
+    else:
+        new_img_hdr = img_file_path.parent / converted_dir_name / img_file_path.name
+
+    # Create converted directory, may be created by another conversion process at the same time
+    new_img_hdr.parent.mkdir(exist_ok=True)
+
+    # Move the file
+    try:
+        img_file_path.replace(new_img_hdr)
+    except (FileNotFoundError, FileExistsError):
+        pass
+
+    return True, return_msg, time.time() - begin
+
+
 def create_png_images(img_list, contains_render_preset_dir=False, converted_dir_name='non_converted_render_output'):
     return_msg = '\nErstelle PNG Bildaten:\n'
 
@@ -64,45 +389,111 @@ def create_png_images(img_list, contains_render_preset_dir=False, converted_dir_
         if str(img_file_path.suffix).casefold() == '.png':
             continue
 
-        # Read image
-        try:
-            img_hdr = imageio.imread(str(img_file_path))
-        except ValueError or OSError as exception_message:
-            # Image may not be completly written yet
-            LOGGER.error('Could not open image: %s, %s', img_file_path, exception_message)
-            return_msg += '\nBild konnte nicht gelesen werden: '\
-                          + img_file_path.name + '\n' + str(exception_message) + '\n'
-            # Skip image
-            continue
+        success, msg, __duration = convert_png_image(img_file_path, contains_render_preset_dir, converted_dir_name)
+        return_msg += msg + '\n' if success else msg
 
-        # Set target png file
-        img_png = img_file_path.parent / Path(img_file_path.stem).with_suffix('.png')
+    return return_msg
 
-        # Convert image file
-        try:
-            imageio.imwrite(str(img_png), img_hdr)
-            return_msg += str(img_png.name) + '\n'
-        except Exception as e:
-            LOGGER.error('Could not write png image: %s\n%s', img_png, e)
-            return_msg += 'Konnte Bild nicht schreiben: ' + str(img_png) + '\n'
-
-        # Move source file to 'converted' directory
-        if contains_render_preset_dir:
-            new_img_hdr = img_file_path.parent.parent / converted_dir_name / img_file_path.name
-        else:
-            new_img_hdr = img_file_path.parent / converted_dir_name / img_file_path.name
 
-        # Create converted directory
-        if not new_img_hdr.parent.exists():
-            new_img_hdr.parent.mkdir()
+class PngConversionPipeline:
+    """
+        Converts images in a process pool while rendering continues.
+        Thread safe, the render hosts of a render farm share one pipeline.
 
-        # Move the file
-        try:
-            img_file_path.replace(new_img_hdr)
-        except FileNotFoundError or FileExistsError:
-            pass
+        max_workers: number of conversion processes
+        max_queued: submit blocks while this many images are waiting or converting,
+                    keeps the memory used by decoded images bounded
+        on_converted: optional callable(img_path, success, message, duration) called per finished image
+    """
+    def __init__(self, contains_render_preset_dir=False, max_workers=1, max_queued=2,
+                 converted_dir_name='non_converted_render_output', on_converted=None):
+        self.contains_render_preset_dir = contains_render_preset_dir
+        self.on_converted = on_converted
+        self.converted_dir_name = converted_dir_name
+        self.max_queued = max(1, max_queued)
+        self.executor = ProcessPoolExecutor(max_workers=max(1, max_workers))
+        self.lock = threading.Lock()
 
-    return return_msg
+        # (img_path, future) in submit order
+        self.pending = list()
+        self.results = list()
+
+    def submit(self, img_file_path: Path, abort=None):
+        """ Queue an image for conversion, blocks while the queue is full. abort: callable to stop waiting """
+        if str(img_file_path.suffix).casefold() == '.png':
+            return
+
+        # Report conversions finished in the meantime
+        self.collect()
+
+        while 1:
+            with self.lock:
+                if len(self.pending) < self.max_queued:
+                    future = self.executor.submit(convert_png_image, img_file_path, self.contains_render_preset_dir,
+                                                  self.converted_dir_name)
+                    self.pending.append((img_file_path, future))
+                    break
+
+            if abort is not None and abort():
+                return
+
+            self.collect(timeout=0.5)
+
+        LOGGER.debug('Queued %s for png conversion.', img_file_path.name)
+
+    def collect(self, timeout=0.0):
+        """ Move finished conversions to results, waits up to timeout for the first one to finish """
+        with self.lock:
+            futures = [f for __p, f in self.pending]
+
+        if futures and timeout:
+            wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        finished = list()
+        with self.lock:
+            for img_file_path, future in self.pending[:]:
+                if future.done():
+                    self.pending.remove((img_file_path, future))
+                    finished.append((img_file_path, future))
+
+        for img_file_path, future in finished:
+            try:
+                result = future.result()
+            except Exception as e:
+                # Broken process pool or pickling error
+                LOGGER.error('Png conversion of %s failed: %s', img_file_path, e)
+                result = (False, '\nBild konnte nicht konvertiert werden: {}\n{}\n'.format(img_file_path.name, e), 0.0)
+
+            with self.lock:
+                self.results.append(result)
+            if self.on_converted:
+                self.on_converted(img_file_path, *result)
+
+    def finish(self, abort=None):
+        """ Wait for all queued conversions and return the conversion log """
+        while self.pending:
+            if abort is not None and abort():
+                self.shutdown()
+                break
+
+            self.collect(timeout=0.5)
+
+        self.shutdown()
+
+        return_msg = '\nErstelle PNG Bildaten:\n'
+        for success, msg, duration in self.results:
+            if success:
+                return_msg += '{} - {:.1f}s\n'.format(msg, duration)
+            else:
+                return_msg += msg
+
+        return return_msg
+
+    def shutdown(self):
+        for __p, future in self.pending:
+            future.cancel()
+
+        self.executor.shutdown(wait=not self.pending)
 
 
 if __name__ == '__main__':
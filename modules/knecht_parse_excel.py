@@ -65,20 +65,422 @@ Copyright (C) 2017 Stefan Tapper, All rights reserved.
     </renderknecht_varianten>
 """
 
+import math
 import os
+import pickle
 import re
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
 import lxml.etree as ET
 from PyQt5 import QtCore
 from openpyxl import load_workbook
-from openpyxl.utils import get_column_letter
+from openpyxl.utils import get_column_letter, column_index_from_string
 
 from modules.app_strings import Msg
 from modules.app_globals import HELPER_DIR
+from modules.knecht_excel_cache import VplusCache
+from modules.knecht_excel_sheet import SheetSnapshot, SnapshotWorkbook
 from modules.knecht_log import init_logging
+from modules.knecht_vplus_import import VplusIncrementalImport, fingerprint
+from modules.knecht_xlsx_reader import XlsxStreamReader
+from modules.knecht_xml_writer import XmlStreamWriter
 
 # Initialize logging for this module
 LOGGER = init_logging(__name__)
 
+# Worksheet reader backends
+READER_OPENPYXL = 'openpyxl'
+READER_LXML = 'lxml'
+
+
+def shorten_model_name(model_name, num_words: int = 6, shorten: bool = False):
+    # Remove horse power description
+    model_name = re.sub('(\d?\d\d)[()](...........)\s', '', model_name)
+    # Replace to one word
+    model_name = re.sub('(S\sline)', 'S-line', model_name)
+    model_name = re.sub('(S\stronic)', 'S-tronic', model_name)
+    model_name = re.sub('(RS\s)', 'RS', model_name)
+
+    # Split and make sure end index is not smaller than number of words
+    # (Do not limit num of words if no shorten set)
+    model_name = model_name.split(' ')
+    if len(model_name) < num_words or not shorten:
+        num_words = len(model_name)
+
+    # If shorten is set, limit to 5 chars/word
+    short_name = ''
+    for m in model_name[0:num_words]:
+        if shorten:
+            short_name += m[0:5] + ' '
+        else:
+            short_name += m + ' '
+
+    # Readabilty
+    short_name = re.sub('(quatt\s)', 'quattro ', short_name, flags=re.I)
+    short_name = re.sub('(Limou\s)', 'Limo ', short_name)
+    short_name = re.sub('(allro\s)', 'allroad ', short_name)
+    short_name = re.sub('(desig\s)', 'design ', short_name)
+    short_name = re.sub('(RSD)', 'RS D', short_name)
+    short_name = re.sub('(Navig\s)', 'Navi ', short_name, flags=re.I)
+    short_name = re.sub('(Premi\s)', 'Prem ', short_name, flags=re.I)
+    short_name = re.sub('(packa\s)', 'Pkg ', short_name, flags=re.I)
+    short_name = re.sub('(Techn\s)', 'Tech ', short_name, flags=re.I)
+    short_name = re.sub('(Advan\s)', 'Adv ', short_name, flags=re.I)
+
+    return short_name
+
+
+def read_pr_family_map(prn_sheet, pr_col, pr_family_col, pr_start_row):
+    """ Returns a dict PR-Code: PR-Family of all PR-Codes in the PR worksheet """
+    pr_fam_map = dict()
+    current_pr_family = None
+    current_row = pr_start_row - 1
+
+    while 1:
+        current_row += 1
+
+        # Break if emtpy row reached(new PR-Family begins every third row / 2 empty rows between)
+        if prn_sheet.value(current_row, pr_col) is None:
+            current_row += 2
+            if prn_sheet.value(current_row, pr_col) is None:
+                break
+
+        # Find PR-Family
+        pr_family = prn_sheet.value(current_row - 1, pr_family_col)
+        if pr_family is not None:
+            current_pr_family = pr_family
+
+        if current_pr_family:
+            pr_opt = prn_sheet.value(current_row, pr_col)
+            if pr_opt:
+                pr_fam_map[pr_opt] = current_pr_family
+
+    return pr_fam_map
+
+
+def read_model_columns(reader, model_args):
+    """ Process pool task, returns serialized presets and counts of several model columns """
+    results = list()
+
+    for args in model_args:
+        model_element, preset_count, variant_count, pkg_count = reader.read(*args)
+        results.append((ET.tostring(model_element), preset_count, variant_count, pkg_count))
+
+    return results
+
+
+class VplusDocument:
+    """
+        RenderKnecht Xml document of a V Plus export with lookup indices for
+        model elements by model code and PR-Families by PR-Code.
+    """
+    # PR-Codes used in packages but not listed in the PR worksheet
+    default_pr_familys = {'1XW': 'LRA'}
+
+    def __init__(self, root_tag, sourcedoc):
+        self.root = ET.Element(root_tag)
+
+        # Add info about source document
+        ET.SubElement(self.root, 'origin', dict(sourcedoc=sourcedoc))
+
+        # Model code: first model element with this code
+        self.models = dict()
+
+        # PR-Code: PR-Family for lookup in packages
+        self.pr_familys = dict(self.default_pr_familys)
+
+        # Root children not yet written to the Xml file
+        self._writer = None
+        self._unwritten = deque()
+
+    def add_model(self, attributes):
+        model_element = ET.SubElement(self.root, 'model', attributes)
+        self.models.setdefault(attributes['value'], model_element)
+        return model_element
+
+    def find_model(self, model_code):
+        return self.models.get(model_code)
+
+    def stream_to(self, writer: XmlStreamWriter):
+        """ Write the root children to writer with write_elements while presets are created """
+        self._writer = writer
+        self._unwritten = deque(self.root)
+
+    def write_elements(self, open_models: Counter = None):
+        """
+            Write root children in document order until a model element with unread
+            model columns in open_models is reached.
+        """
+        while self._unwritten:
+            element = self._unwritten[0]
+
+            if open_models and open_models[element]:
+                return
+
+            self._writer.write(element)
+            self._unwritten.popleft()
+
+            # Release the presets of the written model, its attributes are kept
+            del element[:]
+
+
+class ModelColumnReader:
+    """
+        Creates the presets of one model column of the PR and Package worksheets.
+        Model columns only share the PR-Family lookup, so they can be read in any order
+        or process. Must stay pickle-able for the process pool.
+    """
+    def __init__(self, vplus, prn_sheet, pkg_sheet, pr_familys: dict):
+        self.prn_sheet = prn_sheet
+        self.pkg_sheet = pkg_sheet
+        self.pr_familys = pr_familys
+
+        # PR Sheet Coordinates
+        self.pr_col = vplus.ws['PR']['attrib']['name_col']  # PR-Code name column
+        self.pr_start_row = vplus.ws['PR']['attrib']['name_start_row']  # PR-Code name start row
+        self.pr_family_col = vplus.ws['PR']['attrib']['pr_family_column']
+        self.desc_col = vplus.ws['PR']['attrib']['desc_col']  # PR-Description column
+
+        # Options given by the dialog
+        self.pr_fam_filter = set(vplus.pr_fam_filter)
+        self.shorten_names = vplus.shorten_names
+        self.shorten_pkg_name = vplus.shorten_pkg_name
+        self.read_trim = vplus.read_trim
+        self.read_options = vplus.read_options
+        self.read_packages = vplus.read_packages
+        self.read_pkg_options = vplus.read_pkg_options
+        self.package_pr_fam_filter = vplus.package_pr_fam_filter
+        self.read_pkg_options_pr_family_filter = set(vplus.read_pkg_options_pr_family_filter)
+
+    def options(self):
+        """ Options and worksheet coordinates that change the created presets """
+        return (sorted(self.pr_fam_filter, key=str), self.shorten_names, self.shorten_pkg_name, self.read_trim,
+                self.read_options, self.read_packages, self.read_pkg_options, self.package_pr_fam_filter,
+                sorted(self.read_pkg_options_pr_family_filter, key=str), self.pr_col, self.pr_start_row,
+                self.pr_family_col, self.desc_col)
+
+    def read(self, current_col, model_code, model_name, current_market, model_year):
+        """
+            Returns a detached model element with the presets of this column and the
+            number of presets, trim variants and packages. Preset id and order start at 1.
+        """
+        prn_sheet, pkg_sheet = self.prn_sheet, self.pkg_sheet
+        pr_col, pr_family_col, desc_col = self.pr_col, self.pr_family_col, self.desc_col
+        current_model_element = ET.Element('model')
+        preset_count = 0
+        trim_attr = {}
+        opti_attr = {}
+        opti_pkg_set = {}
+
+        # Preset name: model name, market, model year
+        trim_attr['name'] = shorten_model_name(model_name, 8, self.shorten_names) + current_market + ' ' + model_year
+
+        # Extract first n string elements eg. Brand Model for options preset name
+        opti_attr['name'] = shorten_model_name(model_name, 3, True) + model_code + ' Options ' + current_market
+
+        trim_attr['value'] = model_code
+        opti_attr['value'] = model_code
+        trim_attr['type'] = 'trim_setup'
+        opti_attr['type'] = 'options'
+
+        # Set trim_setup and options preset's id and order
+        if self.read_trim:
+            preset_count += 1
+            trim_attr['order'], trim_attr['id'] = str(preset_count), str(preset_count)
+            # Create xml tag Trimline Preset
+            preset = ET.SubElement(current_model_element, 'preset', trim_attr)
+            # Create xml tag Modelcode variant
+            variant_attr = dict(name=model_code, value='on', order='0')
+            ET.SubElement(preset, 'variant', variant_attr)
+
+        if self.read_options:
+            preset_count += 1
+            opti_attr['order'], opti_attr['id'] = str(preset_count), str(preset_count)
+            opt_preset = ET.SubElement(current_model_element, 'preset', opti_attr)
+
+        # Iterate PR-Codes
+        variant_count = 0
+        options_count = 0
+        current_pr_family = None
+
+        current_row = self.pr_start_row - 1
+
+        while 1:
+            current_row += 1
+
+            # Break if emtpy row reached(new PR-Family begins every third row / 2 empty rows between)
+            if prn_sheet.value(current_row, pr_col) is None:
+                current_row += 2
+                if prn_sheet.value(current_row, pr_col) is None:
+                    break
+
+            # Find PR-Family
+            pr_family = prn_sheet.value(current_row - 1, pr_family_col)
+            if pr_family is not None:
+                current_pr_family = pr_family
+
+            # PR Family Filer
+            if current_pr_family in self.pr_fam_filter:
+                # Store trimline codes and options
+                variant_attr = {}
+                variant_attr['type'] = current_pr_family
+                options_attr = {}
+                options_attr['type'] = current_pr_family
+
+                # Read PR name
+                val = prn_sheet.value(current_row, current_col)
+
+                if val in ['L', 'I'] and self.read_trim:
+                    variant_count += 1
+                    variant_attr['name'] = prn_sheet.value(current_row, pr_col)
+                    variant_attr['description'] = prn_sheet.value(current_row, desc_col)
+                    variant_attr['value'] = 'on'
+                    variant_attr['order'] = str(variant_count)
+
+                    # Create xml tag
+                    ET.SubElement(preset, 'variant', variant_attr)
+                elif val == 'E' and self.read_options:
+                    options_count += 1
+                    options_attr['name'] = prn_sheet.value(current_row, pr_col)
+                    options_attr['description'] = prn_sheet.value(current_row, desc_col)
+                    options_attr['value'] = 'on'
+                    options_attr['order'] = str(options_count)
+
+                    # Create xml tag
+                    ET.SubElement(opt_preset, 'variant', options_attr)
+                elif val == 'P' and self.read_pkg_options:
+                    # Prepare optional packages that will always be read eg. Seats
+                    if current_pr_family in self.read_pkg_options_pr_family_filter:
+                        name = prn_sheet.value(current_row, pr_col)
+
+                        if current_pr_family in opti_pkg_set.keys():
+                            opti_pkg_set[current_pr_family].add(name)
+                        else:
+                            opti_pkg_set[current_pr_family] = {name}
+
+        # Iterate Packages
+        pkg_count = 0
+        # (package preset, PR-Codes, PR-Familys) of every package of this model
+        packages = list()
+
+        if self.read_packages or self.read_pkg_options:
+            current_row = self.pr_start_row - 1
+            skip_package = True
+
+            while 2:
+
+                def create_package_preset(preset_count):
+                    options_attr = {}
+                    # Values
+                    options_attr['value'] = pkg_pr
+                    options_attr['type'] = 'package'
+
+                    # Description
+                    desc = pkg_sheet.value(current_row - 1, pr_family_col + 1)
+                    desc = shorten_model_name(desc, 4, self.shorten_pkg_name)
+
+                    # Name
+                    options_attr['name'] = pkg_pr + ' ' + desc + model_code + ' ' + current_market
+
+                    # Order, Id
+                    options_attr['order'], options_attr['id'] = str(preset_count), str(preset_count)
+
+                    # Create Xml tag
+                    return ET.SubElement(current_model_element, 'preset', options_attr)
+
+                current_row += 1
+
+                # Break if empty row reached(new Package begins every third row / 2 empty rows between)
+                if pkg_sheet.value(current_row, pr_col) is None:
+                    current_row += 2
+                    if pkg_sheet.value(current_row, pr_col) is None:
+                        break
+
+                # Find Package
+                pkg_pr = pkg_sheet.value(current_row - 1, pr_family_col)
+                if pkg_pr is not None:
+                    # Is it an option?
+                    option = pkg_sheet.value(current_row - 1, current_col)
+                    skip_package = True
+
+                    # and option != 'F' - removed
+                    if option != '-' and option is not None:
+                        skip_package = False
+                        pkg_count += 1
+                        preset_count += 1
+                        pkg_variant_count = 0
+                        pkg_preset = create_package_preset(preset_count)
+                        pkg_names, pkg_types = set(), set()
+                        packages.append((pkg_preset, pkg_names, pkg_types))
+
+                if not skip_package:
+                    # Store package codes and options
+                    variant_attr = {}
+
+                    # Read PR name
+                    val = pkg_sheet.value(current_row, current_col)
+                    pr_opt = pkg_sheet.value(current_row, pr_col)
+
+                    # Lookup PR-Family if known
+                    if pr_opt in self.pr_familys:
+                        variant_attr['type'] = self.pr_familys[pr_opt]
+
+                    if val != '-' and val != 'F' and val is not None:
+                        pkg_variant_count += 1
+                        variant_attr['name'] = pr_opt
+                        variant_attr['description'] = pkg_sheet.value(current_row, desc_col)
+                        variant_attr['value'] = 'on'
+                        variant_attr['order'] = str(pkg_variant_count)
+
+                        # Create xml tag
+                        ET.SubElement(pkg_preset, 'variant', variant_attr)
+                        pkg_names.add(pr_opt)
+                        pkg_types.add(variant_attr.get('type'))
+
+            # PR-Code: PR-Family of the optional package PR-Codes, last PR-Family wins
+            opti_pkg_familys = dict()
+            for pr_family, option_set in opti_pkg_set.items():
+                for name in option_set:
+                    opti_pkg_familys[name] = pr_family
+
+            # Remove non-optional packages
+            non_essential_msg = list()
+            non_fam_msg = list()
+
+            for pkg_preset, pkg_names, pkg_types in packages:
+                keep_package = True
+
+                if self.read_pkg_options and not self.read_packages:
+                    # Remove non-essential packages and keep eg. Seat-Packages
+                    keep_package = not pkg_names.isdisjoint(opti_pkg_familys)
+
+                    if keep_package:
+                        for sub_elem in pkg_preset.iterfind('.//'):
+                            if sub_elem.get('name') in opti_pkg_familys:
+                                sub_elem.attrib['type'] = opti_pkg_familys[sub_elem.get('name')]
+                    else:
+                        non_essential_msg.append(pkg_preset.get('value'))
+                elif self.package_pr_fam_filter and self.read_packages:
+                    # Keep package if any PR-Option matches PR-Family filter
+                    keep_package = not pkg_types.isdisjoint(self.pr_fam_filter)
+
+                    if not keep_package:
+                        non_fam_msg.append(pkg_preset.get('value'))
+
+                if not keep_package:
+                    current_model_element.remove(pkg_preset)
+
+            # Report purged Packages
+            if non_essential_msg:
+                LOGGER.debug('Purged non-essential packages %s', non_essential_msg)
+            if non_fam_msg:
+                LOGGER.debug('Purged packages, not matching PR-Family filter: %s', non_fam_msg)
+
+        return current_model_element, preset_count, variant_count, pkg_count
+
 
 class LoadVplus(QtCore.QObject):
     """
@@ -120,14 +522,45 @@ class LoadVplus(QtCore.QObject):
     # Model filter
     model_filter = []
 
-    # PR-Family Storage for lookup in packages
-    # eg. pr-option: pr-family
-    pr_fam_storage = {'1XW': 'LRA'}
+    # Processes reading model columns, 1 reads in the conversion thread
+    workers = 1
+
+    # Save the workbook with Exterior Scope appended to Interior Scope as <name>_modified copy
+    write_modified_copy = False
+
+    # Read worksheets with openpyxl or stream them with lxml
+    reader_backend = READER_OPENPYXL
+
+    # Cache parsed workbooks in HELPER_DIR
+    use_cache = True
+    cache_size_mb = 500.0
+
+    # Copy presets of unchanged models from the previous import of the same vehicle line
+    incremental_import = True
 
     # Last file name in use
     # Vplus window will store this here, if recently loaded file - apply same filters
     last_file = ''
 
+    @classmethod
+    def load_settings(cls, app):
+        """ Apply the V Plus import settings, app: knechtSettings.app """
+        try:
+            cls.workers = max(1, int(app['vplus_workers']))
+        except ValueError:
+            LOGGER.error('Invalid vplus_workers setting: %s', app['vplus_workers'])
+        if app['vplus_reader'] in (READER_OPENPYXL, READER_LXML):
+            cls.reader_backend = app['vplus_reader']
+        else:
+            LOGGER.error('Invalid vplus_reader setting: %s', app['vplus_reader'])
+        cls.write_modified_copy = app['vplus_modified_copy']
+        cls.use_cache = app['vplus_cache']
+        cls.incremental_import = app['vplus_incremental']
+        try:
+            cls.cache_size_mb = float(app['vplus_cache_size_mb'])
+        except ValueError:
+            LOGGER.error('Invalid vplus_cache_size_mb setting: %s', app['vplus_cache_size_mb'])
+
     def __init__(self, filepath=None):
         # inherit from QObject so we can handle signals
         super(LoadVplus, self).__init__()
@@ -135,6 +568,9 @@ class LoadVplus(QtCore.QObject):
         self.filepath = filepath
         self.filename = os.path.basename(self.filepath)
 
+        # Directory of the created Xml document
+        self.xml_dir = HELPER_DIR
+
         # Worksheet column definitions, values will be read from title_row + 1
         # attrib dict defines columns to read
         self.ws = dict()
@@ -166,76 +602,172 @@ class LoadVplus(QtCore.QObject):
         self.pr_fam_filter = set()
         self.ext_copied = False
         self.model = None
+        self.document = None
         self._book = None
 
+        # Model fingerprints and report of an incremental import
+        self.incremental = None
+        self.import_report = None
+
+        # Parsed workbook data of the V Plus cache
+        self._cache_key = None
+        self._cache_data = None
+        self._cache_stored = False
+
     def read_workbook(self, read_only_mode: bool = False):
+        """ Returns a SnapshotWorkbook of the worksheets read by this class """
         # Load workbook
         self.status_msg.emit(Msg.EXC_FILE_LOAD.format(self.filename))
 
-        with open(self.filepath, 'rb') as f:
-            self._book = load_workbook(filename=f, read_only=read_only_mode)
+        if self.use_cache and self.read_cache():
+            return self._book
+
+        sheet_names = self.potential_sheet_names() + [self.ws['PR']['ext_sheet']]
 
-        LOGGER.debug('Workbook loaded: %s', self.filepath)
-        self.status_msg.emit(Msg.EXC_FILE_LOADED)
+        if self.reader_backend == READER_LXML:
+            sheets = self.read_sheets_lxml(sheet_names)
+        else:
+            sheets = self.read_sheets_openpyxl(sheet_names, read_only_mode)
 
-        # Copy "Exterior Scope" worksheet contents to "Interior Scope"
-        if not self.ext_copied:
-            for sheet_name in self._book.sheetnames:
-                if sheet_name == self.ws['PR']['ext_sheet']:
-                    self.copy_ext_to_int(wb=self._book, ext_ws=self._book[sheet_name])
-                    self.ext_copied = True
+        # Read "Exterior Scope" worksheet contents as continuation of "Interior Scope"
+        ext_sheet = sheets.pop(self.ws['PR']['ext_sheet'], None)
+        if not self.ext_copied and ext_sheet is not None:
+            self.ext_copied = self.copy_ext_to_int(sheets, ext_sheet)
+
+            if self.ext_copied and self.write_modified_copy:
+                self.save_modified_copy(ext_sheet)
+
+        self._book = SnapshotWorkbook(sheets)
+
+        if self.use_cache:
+            self._cache_data = dict(sheets={n: sheet.rows for n, sheet in self._book.sheets.items()},
+                                    ext_copied=self.ext_copied)
 
         return self._book
 
-    def copy_ext_to_int(self, wb, ext_ws, _int_ws=None):
-        """ Copy Exterior Scope rows to Interior Scope """
-        temp_rows, temp_cells = [], []
+    def read_sheets_openpyxl(self, sheet_names, read_only_mode: bool = False):
+        """ Snapshots of the worksheets in sheet_names read with openpyxl """
+        with open(self.filepath, 'rb') as f:
+            book = load_workbook(filename=f, read_only=read_only_mode)
+
+            LOGGER.debug('Workbook loaded: %s', self.filepath)
+            self.status_msg.emit(Msg.EXC_FILE_LOADED)
+
+            # Read worksheets while the file is open, read only worksheets load lazily
+            sheets = {sheet_name: self.sheet_snapshot(book, sheet_name)
+                      for sheet_name in book.sheetnames if sheet_name in sheet_names}
+
+        book.close()
+        return sheets
+
+    def read_sheets_lxml(self, sheet_names):
+        """ Snapshots of the worksheets in sheet_names streamed from the xlsx archive """
+        sheets = dict()
+
+        with XlsxStreamReader(self.filepath) as reader:
+            LOGGER.debug('Workbook opened for streaming: %s', self.filepath)
+            self.status_msg.emit(Msg.EXC_FILE_LOADED)
+
+            for sheet_name in reader.sheetnames:
+                if sheet_name not in sheet_names:
+                    continue
+
+                start = time.time()
+                sheets[sheet_name] = reader.read_sheet(sheet_name)
+                self.report_sheet_read(sheets[sheet_name], time.time() - start)
 
-        for sheet_name in wb.sheetnames:
+        return sheets
+
+    def read_cache(self):
+        """ Load the workbook from the V Plus cache, returns True on a cache hit """
+        cache = VplusCache(self.cache_size_mb)
+
+        try:
+            self._cache_key = cache.key(self.filepath)
+        except OSError as e:
+            LOGGER.error('Could not hash %s: %s', self.filepath, e)
+            return False
+
+        self._cache_data = cache.load(self._cache_key)
+
+        if not self._cache_data:
+            return False
+
+        self._book = SnapshotWorkbook({n: SheetSnapshot(n, rows) for n, rows in self._cache_data['sheets'].items()})
+        self.ext_copied = self._cache_data['ext_copied']
+        self._cache_stored = True
+        self.status_msg.emit(Msg.EXC_FILE_CACHED)
+        return True
+
+    def update_cache(self, key, value):
+        """ Store the workbook in the V Plus cache once the PR-Family set and model list are read """
+        if self._cache_data is None or self._cache_stored:
+            return
+
+        self._cache_data[key] = value
+
+        if 'pr_familys' in self._cache_data and 'models' in self._cache_data:
+            VplusCache(self.cache_size_mb).store(self._cache_key, self._cache_data, self.filename)
+            self._cache_stored = True
+
+    def potential_sheet_names(self):
+        return self.ws['model']['potential_names'] + self.ws['PR']['potential_names_pr'] + \
+               self.ws['PR']['potential_names_pkg']
+
+    def copy_ext_to_int(self, sheets: dict, ext_sheet: SheetSnapshot):
+        """ Continue the Interior Scope snapshot in sheets with the Exterior Scope rows """
+        for sheet_name, int_sheet in sheets.items():
             if sheet_name in self.ws['PR']['potential_names_pr']:
-                _int_ws = wb[sheet_name]
                 break
-
-        if not _int_ws:
+        else:
             LOGGER.error('Tried to copy values from "Exterior Scope" to "Interior Scope" but'
                          'could not find "Interior Scope" worksheet.')
+            return False
+
+        ext_rows = ext_sheet.rows[self.ws['PR']['pr_family_start_row'] - 1:]
+        LOGGER.debug('Adding %s exterior rows to %s interior rows.', ext_sheet.max_row, int_sheet.max_row)
+
+        # Rows are shared, not copied
+        sheets[sheet_name] = SheetSnapshot.concat(int_sheet, ext_rows)
+        return True
+
+    def save_modified_copy(self, ext_sheet: SheetSnapshot):
+        """ Save a copy of the workbook with the Exterior Scope rows appended to the Interior Scope worksheet """
+        if not self.filepath:
             return
 
-        # Read from Exterior Scope worksheet
-        for row in ext_ws.iter_rows(min_row=self.ws['PR']['pr_family_start_row']):
-            temp_cells = []
-            for cell in row:
-                temp_cells.append(cell.value)
+        try:
+            with open(self.filepath, 'rb') as f:
+                wb = load_workbook(filename=f)
 
-            # Store exterior cells
-            temp_rows.append(temp_cells)
+            for sheet_name in wb.sheetnames:
+                if sheet_name in self.ws['PR']['potential_names_pr']:
+                    int_ws = wb[sheet_name]
+                    break
+            else:
+                return
 
-        LOGGER.debug('Adding %s exterior rows to %s interior rows.', ext_ws.max_row, _int_ws.max_row)
-        # Append to Interior Scope worksheet
-        for row in temp_rows:
-            _int_ws.append(row)
+            for row in ext_sheet.rows[self.ws['PR']['pr_family_start_row'] - 1:]:
+                int_ws.append(row)
 
-        # Create copy of modified workbook
-        if self.filepath:
-            try:
-                name, ext = os.path.splitext(self.filepath)
-                new_filename = name + '_modified' + ext
-                del ext_ws
+            name, ext = os.path.splitext(self.filepath)
+            new_filename = name + '_modified' + ext
 
-                with open(new_filename, 'wb') as f:
-                    wb.save(f)
-            except Exception as e:
-                LOGGER.error('Error saving backup of modified, filtered workbook.\n%s', e)
+            with open(new_filename, 'wb') as f:
+                wb.save(f)
+        except Exception as e:
+            LOGGER.error('Error saving backup of modified, filtered workbook.\n%s', e)
 
     def read_worksheet(self, workbook, type_key, sheet_key: str = '', potential_names_key: str = '', worksheet=None):
         """
             Iterate thru existing worksheets and find sheets with name
             matching potential sheet names.
             Update coordinates dictonary sheetname with matching name.
+            Returns a SheetSnapshot of the worksheet.
         """
         for sheet_name in workbook.sheetnames:
             if sheet_name in self.ws[type_key][potential_names_key]:
-                worksheet = workbook[sheet_name]
+                worksheet = self.sheet_snapshot(workbook, sheet_name)
                 self.ws[type_key][sheet_key] = sheet_name
                 break
 
@@ -246,6 +778,24 @@ class LoadVplus(QtCore.QObject):
             self.error_msg.emit(Msg.EXC_FILE_WORKSHEET_ERROR.format(self.ws[type_key][sheet_key]))
             return False
 
+    def sheet_snapshot(self, workbook, sheet_name):
+        """ Read all cell values of a worksheet once, the readers access cells column by column """
+        worksheet = workbook[sheet_name]
+
+        if isinstance(worksheet, SheetSnapshot):
+            return worksheet
+
+        start = time.time()
+        snapshot = SheetSnapshot.from_worksheet(worksheet)
+        self.report_sheet_read(snapshot, time.time() - start)
+
+        return snapshot
+
+    def report_sheet_read(self, snapshot: SheetSnapshot, duration: float):
+        LOGGER.debug('Worksheet %s read with %s rows and %s columns in %.2fs', snapshot.title,
+                     snapshot.max_row, snapshot.max_column, duration)
+        self.status_msg.emit(Msg.EXC_FILE_SHEET_READ.format(snapshot.title, snapshot.max_row, duration))
+
     def read_and_return_models(self, wb):
         mod_sheet = self.read_worksheet(wb, 'model', 'name', 'potential_names')
 
@@ -253,7 +803,12 @@ class LoadVplus(QtCore.QObject):
             LOGGER.error('Model Worksheet: %s not found.', self.ws['model']['name'])
             return False
 
-        return self.read_model_sheet(mod_sheet, True)
+        if self._cache_data and 'models' in self._cache_data:
+            return [list(model) for model in self._cache_data['models']]
+
+        model_list = self.read_model_sheet(mod_sheet, True)
+        self.update_cache('models', model_list)
+        return model_list
 
     def read_pr_familys(self, wb):
         """ Read PR familys """
@@ -273,6 +828,9 @@ class LoadVplus(QtCore.QObject):
             self.status_msg.emit(
                 Msg.EXC_FILE_FILTERED_COPIED.format(self.ws['PR']['ext_sheet'], self.ws['PR']['name_pr']))
 
+        if self._cache_data and 'pr_familys' in self._cache_data:
+            return set(self._cache_data['pr_familys'])
+
         # Read PR_Familys from worksheet
         current_row = self.ws['PR']['attrib']['name_start_row'] - 1
         max_row = pr_sheet.max_row
@@ -281,17 +839,18 @@ class LoadVplus(QtCore.QObject):
 
         while 1:
             current_row += 1
-            pr_fam = pr_sheet.cell(row=current_row, column=pr_fam_col).value
+            pr_fam = pr_sheet.value(current_row, pr_fam_col)
 
             if pr_fam:
                 # Read description
-                pr_fam_desc = pr_sheet.cell(row=current_row, column=pr_fam_col + 1).value
+                pr_fam_desc = pr_sheet.value(current_row, pr_fam_col + 1)
                 # Update PR-Family list
                 temp_pr_fam_set.add((pr_fam, pr_fam_desc))
 
             if current_row >= max_row:
                 break
 
+        self.update_cache('pr_familys', temp_pr_fam_set)
         return temp_pr_fam_set
 
     def create_document(self, wb):
@@ -307,8 +866,7 @@ class LoadVplus(QtCore.QObject):
         LOGGER.debug('V Plus read only option: %s', LoadVplus.wb_read_only)
 
         # Expected sheet names
-        potential_sheet_names = self.ws['model']['potential_names'] + self.ws['PR']['potential_names_pr'] + \
-                                self.ws['PR']['potential_names_pkg']
+        potential_sheet_names = self.potential_sheet_names()
 
         mod_sheet = self.read_worksheet(self._book, 'model', 'name', 'potential_names')
         prn_sheet = self.read_worksheet(self._book, 'PR', 'name_pr', 'potential_names_pr')
@@ -342,12 +900,27 @@ class LoadVplus(QtCore.QObject):
         self.create_xml_root()
         # Create model elements
         self.read_model_sheet(mod_sheet)
-        # Create trim_setup elements
-        if not self.read_pr_sheet(prn_sheet, pkg_sheet):
-            return
+
+        # Models are streamed to the Xml file while their presets are created
+        with self.create_xml_tree() as writer:
+            self.document.stream_to(writer)
+
+            # Create trim_setup elements
+            if not self.read_pr_sheet(prn_sheet, pkg_sheet):
+                writer.discard()
+                return
+
+            self.document.write_elements()
 
         # Return XML Tree file path
-        return self.create_xml_tree()
+        xml_path = writer.file
+
+        # Remember the model fingerprints for the next import of this vehicle line
+        if self.incremental:
+            self.incremental.save(xml_path)
+            self.import_report = self.incremental.report
+
+        return xml_path
 
     def read_model_sheet(self, mod_sheet, only_return_list=False):
         """ Reads model definitions from worksheet and creates xml elements accordingly """
@@ -360,7 +933,7 @@ class LoadVplus(QtCore.QObject):
 
         # Detect Model columns, col_index starts at 1
         for col in range(1, 13):
-            val = mod_sheet.cell(row=title_row, column=col).value
+            val = mod_sheet.value(title_row, col)
 
             # Column index as letter
             column_letter = get_column_letter(col)
@@ -380,362 +953,196 @@ class LoadVplus(QtCore.QObject):
                 self.ws['model']['attrib']['market'] = column_letter
                 LOGGER.debug('Found %s in column %s', val, column_letter)
 
+        # Column letters to column index
+        attrib_columns = {k: column_index_from_string(v) for k, v in self.ws['model']['attrib'].items()}
+
         while 1:
             current_row += 1
-            row = str(current_row)
             # Break if empty row reached
-            if mod_sheet[self.ws['model']['attrib']['value'] + row].value is None:
+            if mod_sheet.value(current_row, attrib_columns['value']) is None:
                 break
 
             # Read Attributes
-            for k, v in self.ws['model']['attrib'].items():
-                model_attributes[k] = mod_sheet[v + row].value
+            for k, col in attrib_columns.items():
+                model_attributes[k] = mod_sheet.value(current_row, col)
 
             if only_return_list:
                 # Append to model_list for model filter list
                 model_list.append([model_attributes['value'], model_attributes['name']])
             else:
                 # Create Xml element
-                self.model = self.create_xml_sub(self.root, 'model', model_attributes)
+                self.model = self.document.add_model(model_attributes)
 
         if only_return_list:
             return model_list
 
     def read_pr_sheet(self, prn_sheet, pkg_sheet):
         """ Iterate thru PR and Package worksheets and create presets """
-
-        def shorten_model_name(model_name, num_words: int = 6, shorten: bool = False):
-            # Remove horse power description
-            model_name = re.sub('(\d?\d\d)[()](...........)\s', '', model_name)
-            # Replace to one word
-            model_name = re.sub('(S\sline)', 'S-line', model_name)
-            model_name = re.sub('(S\stronic)', 'S-tronic', model_name)
-            model_name = re.sub('(RS\s)', 'RS', model_name)
-
-            # Split and make sure end index is not smaller than number of words
-            # (Do not limit num of words if no shorten set)
-            model_name = model_name.split(' ')
-            if len(model_name) < num_words or not shorten:
-                num_words = len(model_name)
-
-            # If shorten is set, limit to 5 chars/word
-            short_name = ''
-            for m in model_name[0:num_words]:
-                if shorten:
-                    short_name += m[0:5] + ' '
-                else:
-                    short_name += m + ' '
-
-            # Readabilty
-            short_name = re.sub('(quatt\s)', 'quattro ', short_name, flags=re.I)
-            short_name = re.sub('(Limou\s)', 'Limo ', short_name)
-            short_name = re.sub('(allro\s)', 'allroad ', short_name)
-            short_name = re.sub('(desig\s)', 'design ', short_name)
-            short_name = re.sub('(RSD)', 'RS D', short_name)
-            short_name = re.sub('(Navig\s)', 'Navi ', short_name, flags=re.I)
-            short_name = re.sub('(Premi\s)', 'Prem ', short_name, flags=re.I)
-            short_name = re.sub('(packa\s)', 'Pkg ', short_name, flags=re.I)
-            short_name = re.sub('(Techn\s)', 'Tech ', short_name, flags=re.I)
-            short_name = re.sub('(Advan\s)', 'Adv ', short_name, flags=re.I)
-
-            return short_name
-
         # PR Sheet Coordinates
-        title_row = self.ws['PR']['title_row']
         min_row = self.ws['PR']['start_model_row']
         max_row = self.ws['PR']['end_model_row'] + 1  # for range iterator +1
-        min_col = self.ws['PR']['start_model_col']
-        max_col = prn_sheet.max_column
-        pr_col = self.ws['PR']['attrib']['name_col']  # PR-Code name column
-        pr_start_row = self.ws['PR']['attrib']['name_start_row']  # PR-Code name start row
-        pr_family_col = self.ws['PR']['attrib']['pr_family_column']
-        desc_col = self.ws['PR']['attrib']['desc_col']  # PR-Description column
-        model_dom_tag = self.ws['model']['model_dom_tag']
-        current_col = min_col - 1
-        model_count = 0
-        preset_count = 0
+        current_col = self.ws['PR']['start_model_col']
 
-        # Read PR codes
-        while 1:
-            # Iterate model columns
-            current_col += 1
-            model_code = ''
-            trim_attr = {}
-            opti_attr = {}
-            opti_pkg_set = {}
-            read_model = True
+        # Packages look up the PR-Family of their PR-Codes
+        self.document.pr_familys.update(read_pr_family_map(
+            prn_sheet, self.ws['PR']['attrib']['name_col'], self.ws['PR']['attrib']['pr_family_column'],
+            self.ws['PR']['attrib']['name_start_row']))
 
-            # Break if empty model column reached
-            if prn_sheet.cell(row=min_row, column=current_col).value is None:
-                break
+        # Collect model columns to read, break if empty model column reached
+        columns = list()
+        vehicle_lines = set()
+
+        while prn_sheet.value(min_row, current_col) is not None:
+            vehicle_lines.add(str(prn_sheet.value(min_row, current_col)))
 
             # Create model code from the two model code row's
+            model_code = ''
             for r in range(min_row, max_row):
-                model_code += prn_sheet.cell(row=r, column=current_col).value
-
-            if model_code not in self.model_filter: read_model = False
-
-            # LOGGER.debug('Filter: %s Code: %s', self.model_filter, model_code)
-
-            if read_model:
-                model_count += 1
-                LOGGER.debug('Found model #%s: %s in worksheet %s in column %s', model_count, model_code,
-                             self.ws['PR']['name_pr'], current_col)
+                model_code += prn_sheet.value(r, current_col)
 
-                # Create trim_setup preset attributes
+            if model_code in self.model_filter:
                 # Get model element so we can read attributes from it
-                current_model_element = self.root.find(model_dom_tag + '[@value="' + model_code + '"]')
-
-                # Model in PR-Codes but not in Modelsheet
-                try:
-                    current_market = current_model_element.get('market')
-                    model_name = current_model_element.get('name')
-                    model_year = current_model_element.get('modelyear')
-                    # Preset name: model name, market, model year
-                    trim_attr['name'] = shorten_model_name(model_name, 8,
-                        self.shorten_names) + current_market + ' ' + model_year
-
-                    # Extract first n string elements eg. Brand Model for options preset name
-                    opti_attr['name'] = shorten_model_name(model_name, 3,
-                        True) + model_code + ' Options ' + current_market
-                except Exception as e:
+                model_element = self.document.find_model(model_code)
+
+                if model_element is None:
                     # Model in PR-Codes but not in Modelsheet
-                    LOGGER.error('Model %s in PR-Codes but not found in worksheet %s.\n%s',
+                    LOGGER.error('Model %s in PR-Codes but not found in worksheet %s.',
                                  model_code,
-                                 self.ws['model']['name'],
-                                 e)
+                                 self.ws['model']['name'])
                     break
 
-            trim_attr['value'] = model_code
-            opti_attr['value'] = model_code
-            trim_attr['type'] = 'trim_setup'
-            opti_attr['type'] = 'options'
-
-            # Set trim_setup and options preset's id and order
-            if self.read_trim and read_model:
-                preset_count += 1
-                trim_attr['order'], trim_attr['id'] = str(preset_count), str(preset_count)
-                # Create xml tag Trimline Preset
-                preset = self.create_xml_sub(current_model_element, 'preset', trim_attr)
-                # Create xml tag Modelcode variant
-                variant_attr = dict(name=model_code, value='on', order='0')
-                variant = self.create_xml_sub(preset, 'variant', variant_attr)
-
-            if self.read_options and read_model:
-                preset_count += 1
-                opti_attr['order'], opti_attr['id'] = str(preset_count), str(preset_count)
-                opt_preset = self.create_xml_sub(current_model_element, 'preset', opti_attr)
-
-            # Iterate PR-Codes
-            variant_count = 0
-            options_count = 0
-
-            current_row = pr_start_row - 1
-
-            while 1:
-                current_row += 1
+                columns.append((current_col, model_code, model_element))
 
-                # Break if emtpy row reached(new PR-Family begins every third row / 2 empty rows between)
-                if prn_sheet.cell(row=current_row, column=pr_col).value is None:
-                    current_row += 2
-                    if prn_sheet.cell(row=current_row, column=pr_col).value is None:
-                        break
+            current_col += 1
 
-                # Find PR-Family
-                pr_family = prn_sheet.cell(row=current_row - 1, column=pr_family_col).value
-                if pr_family is not None:
-                    current_pr_family = pr_family
+        reader = ModelColumnReader(self, prn_sheet, pkg_sheet, dict(self.document.pr_familys))
+        previous_models = dict()
+        self.incremental = None
 
-                # Update PR-Family Storage
-                if current_pr_family:
-                    pr_opt = prn_sheet.cell(row=current_row, column=pr_col).value
-                    if pr_opt:
-                        self.pr_fam_storage[pr_opt] = current_pr_family
+        if self.incremental_import:
+            self.incremental = self.compare_previous_import('_'.join(sorted(vehicle_lines)), reader, columns)
+            previous_models = self.incremental.previous_models
 
-                # PR Family Filer
-                if current_pr_family in self.pr_fam_filter and read_model:
-                    # Store trimline codes and options
-                    variant_attr = {}
-                    variant_attr['type'] = current_pr_family
-                    options_attr = {}
-                    options_attr['type'] = current_pr_family
+        read_columns = [column for column in columns if column[1] not in previous_models]
+        results = self.read_model_columns(reader, read_columns)
+        preset_count = 0
 
-                    # Read PR name
-                    val = prn_sheet.cell(row=current_row, column=current_col).value
+        # Model elements are written once all of their columns are read
+        open_models = Counter(model_element for __, __, model_element in columns)
+        self.document.write_elements(open_models)
 
-                    if val in ['L', 'I'] and self.read_trim:
-                        variant_count += 1
-                        variant_attr['name'] = prn_sheet.cell(row=current_row, column=pr_col).value
-                        variant_attr['description'] = prn_sheet.cell(row=current_row, column=desc_col).value
-                        variant_attr['value'] = 'on'
-                        variant_attr['order'] = str(variant_count)
+        for model_count, (current_col, model_code, model_element) in enumerate(columns, 1):
+            if model_code in previous_models:
+                # Copy presets of unchanged models from the previous import
+                column_element, previous_offset, column_preset_count = previous_models[model_code]
 
-                        # Create xml tag
-                        variant = self.create_xml_sub(preset, 'variant', variant_attr)
-                    elif val == 'E' and self.read_options:
-                        options_count += 1
-                        options_attr['name'] = prn_sheet.cell(row=current_row, column=pr_col).value
-                        options_attr['description'] = prn_sheet.cell(row=current_row, column=desc_col).value
-                        options_attr['value'] = 'on'
-                        options_attr['order'] = str(options_count)
+                for preset in column_element.iterfind('preset'):
+                    preset.set('order', str(int(preset.get('order')) - previous_offset))
+                    preset.set('id', str(int(preset.get('id')) - previous_offset))
 
-                        # Create xml tag
-                        option = self.create_xml_sub(opt_preset, 'variant', options_attr)
-                    elif val == 'P' and self.read_pkg_options:
-                        # Prepare optional packages that will always be read eg. Seats
-                        if current_pr_family in self.read_pkg_options_pr_family_filter:
-                            name = prn_sheet.cell(row=current_row, column=pr_col).value
-
-                            if current_pr_family in opti_pkg_set.keys():
-                                opti_pkg_set[current_pr_family].add(name)
-                            else:
-                                opti_pkg_set[current_pr_family] = {name}
-
-            # Iterate Packages
-            pkg_count = 0
-
-            if (self.read_packages or self.read_pkg_options) and read_model:
-                current_row = pr_start_row - 1
-
-                while 2:
-
-                    def create_package_preset(preset_count):
-                        options_attr = {}
-                        # Values
-                        options_attr['value'] = pkg_pr
-                        options_attr['type'] = 'package'
-
-                        # Description
-                        desc = pkg_sheet.cell(row=current_row - 1, column=pr_family_col + 1).value
-                        desc = shorten_model_name(desc, 4, self.shorten_pkg_name)
-
-                        # Name
-                        options_attr['name'] = pkg_pr + ' ' + desc + model_code + ' ' + current_market
-
-                        # Order, Id
-                        options_attr['order'], options_attr['id'] = str(preset_count), str(preset_count)
-
-                        # Create Xml tag
-                        pkg_preset = self.create_xml_sub(current_model_element, 'preset', options_attr)
-                        return pkg_preset
-
-                    current_row += 1
-
-                    # Break if empty row reached(new Package begins every third row / 2 empty rows between)
-                    if pkg_sheet.cell(row=current_row, column=pr_col).value is None:
-                        current_row += 2
-                        if pkg_sheet.cell(row=current_row, column=pr_col).value is None:
-                            break
-
-                    # Find Package
-                    pkg_pr = pkg_sheet.cell(row=current_row - 1, column=pr_family_col).value
-                    if pkg_pr is not None:
-                        # Set current package
-                        current_pkg = pkg_pr
-                        # Is it an option?
-                        option = pkg_sheet.cell(row=current_row - 1, column=current_col).value
-                        skip_package = True
-
-                        # and option != 'F' - removed
-                        if option != '-' and option is not None:
-                            skip_package = False
-                            pkg_count += 1
-                            preset_count += 1
-                            pkg_variant_count = 0
-                            pkg_preset = create_package_preset(preset_count)
-
-                    if not skip_package:
-                        # Store package codes and options
-                        variant_attr = {}
-
-                        # Read PR name
-                        val = pkg_sheet.cell(row=current_row, column=current_col).value
-                        pr_opt = pkg_sheet.cell(row=current_row, column=pr_col).value
-
-                        # Lookup PR-Family if in storage
-                        if pr_opt in self.pr_fam_storage.keys():
-                            variant_attr['type'] = self.pr_fam_storage[pr_opt]
-
-                        if val != '-' and val != 'F' and val is not None:
-                            pkg_variant_count += 1
-                            variant_attr['name'] = pr_opt
-                            variant_attr['description'] = pkg_sheet.cell(row=current_row, column=desc_col).value
-                            variant_attr['value'] = 'on'
-                            variant_attr['order'] = str(pkg_variant_count)
-
-                            # Create xml tag
-                            variant = self.create_xml_sub(pkg_preset, 'variant', variant_attr)
-
-                # Iterate packages and remove non-optional ones
-                non_essential_msg = list()
-                non_fam_msg = list()
-
-                for element in current_model_element.findall('*'):
-                    if element.get('type') == 'package':
-                        if self.read_pkg_options and not self.read_packages:
-                            # Remove non-essential packages and keep eg. Seat-Packages
-                            keep_package = False
-
-                            for sub_elem in element.iterfind('.//'):
-                                # Iterate PR Familys
-                                for items in opti_pkg_set.items():
-                                    # Unpack pr_family, options-set eg: VOS, {'Q4H', 'Q1D'}
-                                    pr_family, option_set = items
-
-                                    if sub_elem.get('name') in option_set:
-                                        keep_package = True
-                                        sub_elem.attrib['type'] = pr_family
-
-                            if not keep_package:
-                                non_essential_msg.append(element.get('value'))
-                        elif self.package_pr_fam_filter and self.read_packages:
-                            # Apply optional PR-Family filter to packages
-                            keep_package = False
-
-                            # Keep package if any PR-Option matches PR-Family filter
-                            for sub_elem in element.iterfind('.//'):
-                                if sub_elem.get('type') in self.pr_fam_filter:
-                                    keep_package = True
-
-                            if not keep_package:
-                                non_fam_msg.append(element.get('value'))
-
-                        if not keep_package:
-                            current_model_element.remove(element)
-
-                # Report purged Packages
-                if non_essential_msg:
-                    LOGGER.debug('Purged non-essential packages %s', non_essential_msg)
-                if non_fam_msg:
-                    LOGGER.debug('Purged packages, not matching PR-Family filter: %s', non_fam_msg)
-                del non_fam_msg, non_essential_msg
-
-            if read_model:
-                self.status_msg.emit(Msg.EXC_FILE_MODEL_READ.format(variant_count, pkg_count, model_count, model_code))
+                LOGGER.debug('Copied %s presets of unchanged model #%s: %s', column_preset_count, model_count,
+                             model_code)
+            else:
+                column_element, column_preset_count, variant_count, pkg_count = next(results)
+                LOGGER.debug('Found model #%s: %s in worksheet %s in column %s', model_count, model_code,
+                             self.ws['PR']['name_pr'], current_col)
+
+                self.status_msg.emit(Msg.EXC_FILE_MODEL_READ.format(variant_count, pkg_count, model_count,
+                                                                    model_code))
                 LOGGER.info('Read %s trim variants and %s packages for model #%s: %s.', variant_count, pkg_count,
-                    model_count, model_code)
+                            model_count, model_code)
+
+            if self.incremental:
+                self.incremental.model_presets[model_code] = preset_count, column_preset_count
+
+            # Continue preset id and order of the previous model columns
+            for preset in column_element.findall('preset'):
+                preset.set('order', str(int(preset.get('order')) + preset_count))
+                preset.set('id', str(int(preset.get('id')) + preset_count))
+                model_element.append(preset)
+
+                if self.incremental:
+                    self.incremental.report.presets.setdefault(model_code, list()).append(
+                        (preset.get('id'), preset.get('order')))
+
+            preset_count += column_preset_count
+
+            open_models[model_element] -= 1
+            self.document.write_elements(open_models)
+
+        if self.incremental and self.incremental.report.incremental:
+            report = self.incremental.report
+            self.status_msg.emit(Msg.EXC_FILE_INCREMENTAL.format(
+                len(report.unchanged), ', '.join(report.added) or '-', ', '.join(report.changed) or '-',
+                ', '.join(report.removed) or '-'))
+
         # All columns parsed
         return True
 
-    def create_xml_tree(self):
-        self.pretty_print_xml(self.root)
-        self.xmlTree = ET.ElementTree(self.root)
+    def compare_previous_import(self, vehicle_line, reader, columns):
+        """ Fingerprint the model columns and compare them with the previous import of vehicle_line """
+        prn_sheet, pkg_sheet = reader.prn_sheet, reader.pkg_sheet
+        start_col = self.ws['PR']['start_model_col']
 
-        xmlFilename = os.path.splitext(self.filename)[0] + '.xml'
-        xmlPath = HELPER_DIR / xmlFilename
+        # Options, PR-Codes, descriptions and PR-Familys shared by all model columns
+        import_fingerprint = fingerprint(reader.options(), sorted(reader.pr_familys.items()),
+                                         [row[:start_col - 1] for row in prn_sheet.rows],
+                                         [row[:start_col - 1] for row in pkg_sheet.rows])
+        model_fingerprints = dict()
 
-        with open(xmlPath, 'wb') as f:
-            self.xmlTree.write(f, encoding='UTF-8', xml_declaration=True)
+        for current_col, model_code, model_element in columns:
+            if model_code in model_fingerprints:
+                # Duplicate model columns share one model element, always read them
+                model_fingerprints[model_code] = None
+                continue
 
-        return xmlPath
+            model_fingerprints[model_code] = fingerprint(
+                model_element.get('name'), model_element.get('market'), model_element.get('modelyear'),
+                prn_sheet.column(current_col), pkg_sheet.column(current_col))
 
-    def create_xml_root(self):
-        # XML Root
-        self.root = ET.Element(self.xml_dom_tags['root'])
+        return VplusIncrementalImport(vehicle_line, import_fingerprint, model_fingerprints)
 
-        # Add info about source document
-        origin_attr = dict(sourcedoc=self.filename)
-        origin = ET.SubElement(self.root, 'origin', origin_attr)
+    def read_model_columns(self, reader, columns):
+        """
+            Yields (model element, preset count, variant count, package count) for every
+            (column, model code, model element) of columns in column order.
+        """
+        model_args = [(col, model_code, e.get('name'), e.get('market'), e.get('modelyear'))
+                      for col, model_code, e in columns]
+        workers = min(self.workers, len(model_args))
+        chunks = list()
+        chunks_read = 0
+
+        if workers > 1:
+            # Several columns per task, every task pickles the worksheets
+            chunk_size = max(1, math.ceil(len(model_args) / (workers * 2)))
+            chunks = [model_args[i:i + chunk_size] for i in range(0, len(model_args), chunk_size)]
+            LOGGER.debug('Reading %s model columns in %s processes.', len(model_args), workers)
+
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    for results in executor.map(read_model_columns, repeat(reader), chunks):
+                        for model_xml, preset_count, variant_count, pkg_count in results:
+                            yield ET.fromstring(model_xml), preset_count, variant_count, pkg_count
+                        chunks_read += 1
+            except (OSError, BrokenProcessPool, pickle.PicklingError) as e:
+                LOGGER.error('Process pool failed, reading remaining model columns in this thread: %s', e)
+
+            model_args = [args for chunk in chunks[chunks_read:] for args in chunk]
+
+        for args in model_args:
+            yield reader.read(*args)
+
+    def create_xml_tree(self):
+        """ Returns the writer of the Xml document in xml_dir """
+        xmlFilename = os.path.splitext(self.filename)[0] + '.xml'
+        xmlPath = self.xml_dir / xmlFilename
+
+        return XmlStreamWriter(xmlPath, self.root.tag, self.root.attrib)
+
+    def create_xml_root(self):
+        self.document = VplusDocument(self.xml_dom_tags['root'], self.filename)
+        self.root = self.document.root
 
     def create_xml_sub(self, parent, tag, attributes):
         """ Create xml node with given attributes """
@@ -744,22 +1151,3 @@ class LoadVplus(QtCore.QObject):
             tag, # Attributes to store
             attributes)
         return e
-
-    def pretty_print_xml(self, elem, level=0):
-        """ Pretty XML print for better human readabilty """
-        NEW_LINE = '\n'
-        NEW_LEVEL = '\t'
-        i = NEW_LINE + level * NEW_LEVEL
-
-        if len(elem):
-            if not elem.text or not elem.text.strip():
-                elem.text = i + NEW_LEVEL
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
-            for elem in elem:
-                self.pretty_print_xml(elem, level + 1)
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
-        else:
-            if level and (not elem.tail or not elem.tail.strip()):
-                elem.tail = i
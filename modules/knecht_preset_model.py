@@ -0,0 +1,532 @@
+"""
+knecht_preset_model item model of RenderKnecht preset trees.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+Preset trees as QAbstractItemModel for QTreeView instead of one QTreeWidgetItem
+per preset and variant. Items are nodes numbered in load order, node 0 is the
+invisible root. Column values are stored in one list per ItemColumn with interned
+strings, parent nodes, rows and item types in arrays. Only nodes with children own
+a child node list, which is also the internal pointer of their child indices.
+
+Documents are loaded in bulk from lxml elements with the rules of XML.read_node,
+views receive the children of a node in batches with canFetchMore/fetchMore.
+Filtering, sorting, copying and reference lookup work on nodes, unfetched nodes
+included.
+"""
+import re
+import sys
+from array import array
+
+import lxml.etree as Et
+from PyQt5 import QtCore
+
+from modules.app_globals import ItemColumn
+from modules.app_strings import Msg
+from modules.knecht_log import init_logging
+from modules.knecht_xml import XML
+from modules.tree_methods import generate_number_outside_set, lead_zeros
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+ROOT_NODE = 0
+
+# Item types as QTreeWidgetItem.UserType
+PRESET_TYPE = XML.xmlTagDict['preset']
+REFERENCE_TYPE = XML.xmlTagDict['reference']
+
+
+class _ChildNodes:
+    """ Child nodes of one parent node, internal pointer of the model indices of the children """
+    __slots__ = ('node', 'nodes', 'fetched')
+
+    def __init__(self, node):
+        self.node = node
+        self.nodes = array('l')
+
+        # Number of children reported to views
+        self.fetched = 0
+
+
+def filter_pattern(txt, pattern=1):
+    """ Regular expression of the tree filter for filter text txt """
+    def search_pattern(word):
+        if pattern == 1:
+            return '(?=.*' + word + ')'
+        return word + '|'
+
+    # Single words always use a lookahead
+    if ' ' not in txt:
+        return '(?=.*' + txt + ')'
+
+    reg_search = ''.join(search_pattern(word) for word in set(txt.split(' ')))
+    if reg_search.endswith('|'):
+        reg_search = reg_search[:-1]
+
+    return reg_search
+
+
+class PresetTreeModel(QtCore.QAbstractItemModel):
+    """ Read only preset tree of a RenderKnecht Xml document """
+    # Children handed to a view per fetchMore call
+    fetch_batch_size = 1000
+
+    # Data role of the item type, QTreeWidgetItem.UserType of the widget trees
+    UserTypeRole = QtCore.Qt.UserRole + 1
+
+    def __init__(self, parent=None):
+        super(PresetTreeModel, self).__init__(parent)
+        self._clear()
+
+    def _clear(self):
+        # Node: column text, one list per ItemColumn
+        self._columns = [list() for __ in ItemColumn.COLUMN_KEYS]
+        self._user_types = array('H')
+        self._parents = array('l')
+        self._rows = array('l')
+
+        # Parent node: _ChildNodes
+        self._child_nodes = {ROOT_NODE: _ChildNodes(ROOT_NODE)}
+
+        # Id: top level nodes and reference Id: reference nodes, created on first lookup
+        self._id_index = None
+        self._reference_index = None
+
+        # Invisible root
+        self._columns_append([''] * len(self._columns))
+        self._user_types.append(0)
+        self._parents.append(-1)
+        self._rows.append(0)
+
+    def _columns_append(self, values):
+        for column, value in zip(self._columns, values):
+            column.append(sys.intern(value))
+
+    def _add_node(self, parent, user_type, values):
+        node = len(self._user_types)
+        children = self._child_nodes.get(parent)
+
+        if children is None:
+            children = self._child_nodes[parent] = _ChildNodes(parent)
+
+        self._columns_append(values)
+        self._user_types.append(user_type)
+        self._parents.append(parent)
+        self._rows.append(len(children.nodes))
+        children.nodes.append(node)
+
+        return node
+
+    # ---- Bulk load ----
+    def load_file(self, file):
+        """ Replace the model content with the presets of a RenderKnecht Xml file """
+        try:
+            xml_root = Et.parse(str(file)).getroot()
+        except (OSError, Et.XMLSyntaxError) as e:
+            LOGGER.error('Parsing this Xml document failed: %s\n%s', file, e)
+            return False
+
+        return self.load_element(xml_root)
+
+    def load_element(self, xml_root):
+        """ Replace the model content with the presets of a RenderKnecht Xml root element """
+        return self.load_elements([xml_root])
+
+    def load_elements(self, xml_roots):
+        """ Replace the model content with the presets of several RenderKnecht Xml root elements """
+        for xml_root in xml_roots:
+            if xml_root.tag != XML.dom_tags['root']:
+                LOGGER.error('Can not load Xml document. Expected xml root tag: %s, received: %s',
+                             XML.dom_tags['root'], xml_root.tag)
+                return False
+
+        self.beginResetModel()
+        self._clear()
+
+        try:
+            for xml_root in xml_roots:
+                self._read_elements(xml_root.iterfind('./*//'))
+        finally:
+            self.endResetModel()
+
+        LOGGER.debug('Loaded %s preset tree nodes.', self.node_count())
+        return True
+
+    def _read_elements(self, elements):
+        """ Create nodes like XML.read_node creates tree widget items """
+        preset_node = None
+        preset_count = 0
+
+        for element in elements:
+            user_type = XML.xmlTagDict.get(element.tag)
+            if user_type is None:
+                continue
+
+            attrib = element.attrib
+            values = [attrib.get(key, '') for key in ItemColumn.COLUMN_KEYS]
+
+            # Re-write order with leading zeros
+            if 'order' in attrib:
+                values[ItemColumn.ORDER] = lead_zeros(attrib['order'])
+
+            # Backwards compatible, value stored in tag text
+            if element.tag == 'variant' and element.text:
+                values[ItemColumn.VALUE] = element.text
+
+            if element.tag == 'preset':
+                preset_count += 1
+                if 'id' not in attrib:
+                    values[ItemColumn.ID] = str(preset_count)
+
+                preset_node = self._add_node(ROOT_NODE, user_type, values)
+            elif element.tag == 'render_preset':
+                preset_node = self._add_node(ROOT_NODE, user_type, values)
+            elif element.tag == 'seperator':
+                self._add_node(ROOT_NODE, user_type, values)
+            elif element.tag in ('sub_seperator', 'render_setting'):
+                # Tree widget items without preset are not added to the widget
+                if preset_node is not None:
+                    self._add_node(preset_node, user_type, values)
+            else:
+                # Variants and references, orphans are top level nodes
+                self._add_node(ROOT_NODE if preset_node is None else preset_node, user_type, values)
+
+    # ---- Nodes ----
+    def node_count(self):
+        """ Number of nodes without the invisible root """
+        return len(self._user_types) - 1
+
+    def text(self, node, column):
+        return self._columns[column][node]
+
+    def user_type(self, node):
+        return self._user_types[node]
+
+    def parent_node(self, node):
+        return self._parents[node]
+
+    def child_nodes(self, node=ROOT_NODE):
+        """ All child nodes of node, fetched or not """
+        children = self._child_nodes.get(node)
+        if children is None:
+            return array('l')
+        return children.nodes
+
+    def iterate_nodes(self, node=ROOT_NODE):
+        """ Yields all nodes below node in tree order, like iterate_tree_widget_items_flat """
+        for child in self.child_nodes(node):
+            yield child
+            if child in self._child_nodes:
+                yield from self.iterate_nodes(child)
+
+    def node_from_index(self, index):
+        if not index.isValid():
+            return ROOT_NODE
+        return index.internalPointer().nodes[index.row()]
+
+    def _index(self, node, column=0):
+        """ Index of node or an invalid index if node was not fetched by views """
+        if node == ROOT_NODE:
+            return QtCore.QModelIndex()
+
+        children = self._child_nodes[self._parents[node]]
+        row = self._rows[node]
+
+        if row >= children.fetched:
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, children)
+
+    def index_from_node(self, node, column=0):
+        """ Index of node, node and its parents are fetched if necessary """
+        if node == ROOT_NODE:
+            return QtCore.QModelIndex()
+
+        parent = self._parents[node]
+        parent_index = self.index_from_node(parent)
+        children = self._child_nodes[parent]
+
+        while self._rows[node] >= children.fetched:
+            self.fetchMore(parent_index)
+
+        return self.createIndex(self._rows[node], column, children)
+
+    # ---- QAbstractItemModel ----
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+
+        return self.createIndex(row, column, self._child_nodes[self.node_from_index(parent)])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+
+        return self._index(index.internalPointer().node)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return 0
+
+        children = self._child_nodes.get(self.node_from_index(parent))
+        if children is None:
+            return 0
+        return children.fetched
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(ItemColumn.COLUMN_KEYS)
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return False
+
+        children = self._child_nodes.get(self.node_from_index(parent))
+        return children is not None and len(children.nodes) > 0
+
+    def canFetchMore(self, parent):
+        children = self._child_nodes.get(self.node_from_index(parent))
+        return children is not None and children.fetched < len(children.nodes)
+
+    def fetchMore(self, parent):
+        children = self._child_nodes.get(self.node_from_index(parent))
+        if children is None:
+            return
+
+        count = min(self.fetch_batch_size, len(children.nodes) - children.fetched)
+        if count <= 0:
+            return
+
+        self.beginInsertRows(parent, children.fetched, children.fetched + count - 1)
+        children.fetched += count
+        self.endInsertRows()
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        node = self.node_from_index(index)
+
+        if role in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+            return self._columns[index.column()][node]
+        if role == self.UserTypeRole:
+            return self._user_types[node]
+
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+            return Msg.XML_MODEL_HEADER[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDragEnabled
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        """ Sort the children of every node by the text of column """
+        self.layoutAboutToBeChanged.emit()
+
+        persistent_indices = self.persistentIndexList()
+        persistent_nodes = [self.node_from_index(index) for index in persistent_indices]
+        column_values = self._columns[column]
+
+        for children in self._child_nodes.values():
+            nodes = sorted(children.nodes, key=column_values.__getitem__,
+                           reverse=order == QtCore.Qt.DescendingOrder)
+            children.nodes = array('l', nodes)
+
+            for row, node in enumerate(nodes):
+                self._rows[node] = row
+
+        self.changePersistentIndexList(
+            persistent_indices,
+            [self._index(node, index.column()) for node, index in zip(persistent_nodes, persistent_indices)])
+        self.layoutChanged.emit()
+
+    # ---- Filter ----
+    def match_nodes(self, columns, txt, pattern=1):
+        """ Set of nodes matching the tree filter text txt in columns, see tree_worker_thread """
+        if type(columns) is not list:
+            columns = [columns]
+
+        # Find "id 001" or "id 1 002 55 800"
+        id_search = set()
+        id_match = re.search(r'(id\s)(\d+)*(.*?\d+)+', txt)
+        if id_match:
+            id_search = set(re.split(r'.*?(\d+)', id_match.group()))
+            id_search.discard('')
+
+        try:
+            search = re.compile(filter_pattern(txt, pattern), flags=re.IGNORECASE)
+        except re.error as e:
+            LOGGER.error('Invalid search pattern in filter. Skipping search.\n%s', e)
+            search = None
+
+        column_values = [self._columns[c] for c in columns]
+        ref_values, id_values = self._columns[ItemColumn.REF], self._columns[ItemColumn.ID]
+        matches = set()
+
+        for node in range(1, len(self._user_types)):
+            if search and search.search(' '.join(values[node] for values in column_values)):
+                matches.add(node)
+            elif id_search and (ref_values[node] in id_search or id_values[node] in id_search):
+                matches.add(node)
+
+        return matches
+
+    def filter_nodes(self, columns, txt, filter_children=True, pattern=1):
+        """ Set of visible nodes for filter text txt: matches and their parents """
+        matches = self.match_nodes(columns, txt, pattern)
+        visible = set()
+
+        for node in matches:
+            while node != ROOT_NODE and node not in visible:
+                visible.add(node)
+                node = self._parents[node]
+
+        if not filter_children:
+            # Children of matching parents stay visible
+            for node in matches:
+                visible.update(self.child_nodes(node))
+
+        return visible
+
+    # ---- References ----
+    def _create_lookup_indices(self):
+        self._id_index, self._reference_index = dict(), dict()
+        id_values, ref_values = self._columns[ItemColumn.ID], self._columns[ItemColumn.REF]
+
+        for node in self.child_nodes(ROOT_NODE):
+            if id_values[node]:
+                self._id_index.setdefault(id_values[node], list()).append(node)
+
+        for node in range(1, len(self._user_types)):
+            if ref_values[node]:
+                self._reference_index.setdefault(ref_values[node], list()).append(node)
+
+    def find_presets(self, item_id):
+        """ Top level nodes with Id item_id, findItems(item_id, MatchExactly, ItemColumn.ID) """
+        if self._id_index is None:
+            self._create_lookup_indices()
+        return list(self._id_index.get(item_id, list()))
+
+    def find_references(self, item_id):
+        """ Nodes referencing item_id, findItems(item_id, MatchRecursive, ItemColumn.REF) """
+        if self._reference_index is None:
+            self._create_lookup_indices()
+        return list(self._reference_index.get(item_id, list()))
+
+    def referenced_presets(self, reference_node):
+        """
+            Returns the preset nodes referenced by reference_node and by the references inside
+            of them and a list of reference nodes that reference a preset of their own chain.
+        """
+        presets, recursion_errors = list(), list()
+        self._collect_references(reference_node, presets, list(), recursion_errors)
+        return presets, recursion_errors
+
+    def _collect_references(self, reference_node, presets, chain, recursion_errors):
+        reference_id = self._columns[ItemColumn.REF][reference_node]
+
+        # Skip presets eg. render_presets without Id
+        if not reference_id:
+            return
+
+        for preset in self.find_presets(reference_id):
+            if preset in chain:
+                LOGGER.error('Reference recursion error: %s with Id %s references itself!',
+                             self._columns[ItemColumn.NAME][preset], reference_id)
+                recursion_errors.append(reference_node)
+                continue
+
+            if preset not in presets:
+                presets.append(preset)
+
+            chain.append(preset)
+            for child in self.child_nodes(preset):
+                if self._user_types[child] == REFERENCE_TYPE:
+                    self._collect_references(child, presets, chain, recursion_errors)
+            chain.pop()
+
+    def unused_id(self, used_ids=()):
+        """ Lowest Id not used by any node or in used_ids """
+        id_ints = {int(i) for i in self._columns[ItemColumn.ID] if i.isdigit()}
+        id_ints.update(int(i) for i in used_ids if i.isdigit())
+
+        for id_int in generate_number_outside_set(id_ints):
+            if id_int:
+                return str(id_int)
+
+    # ---- Copy ----
+    def node_element(self, node, parent_element=None):
+        """ Xml element of node and its children, columns without text are not stored """
+        attrib = {key: values[node] for key, values in zip(ItemColumn.COLUMN_KEYS, self._columns) if values[node]}
+        tag = XML.xmlTypeDict[self._user_types[node]]
+
+        if parent_element is None:
+            element = Et.Element(tag, attrib)
+        else:
+            element = Et.SubElement(parent_element, tag, attrib)
+
+        for child in self.child_nodes(node):
+            self.node_element(child, element)
+
+        return element
+
+    def copy_element(self, nodes=None):
+        """
+            RenderKnecht Xml root element with nodes and their children, all top level nodes by
+            default. Can be loaded by XML.parse_element_to_tree_widget or another model.
+        """
+        if nodes is None:
+            nodes = self.child_nodes(ROOT_NODE)
+
+        root = Et.Element(XML.dom_tags['root'])
+        Et.SubElement(root, XML.dom_tags['origin'])
+        variant_presets = Et.SubElement(root, XML.dom_tags['sub_lvl_1'])
+
+        for node in nodes:
+            self.node_element(node, variant_presets)
+
+        return root
+
+
+class PresetFilterProxyModel(QtCore.QSortFilterProxyModel):
+    """ Shows the nodes of PresetTreeModel.filter_nodes """
+    def __init__(self, parent=None):
+        super(PresetFilterProxyModel, self).__init__(parent)
+        self.visible_nodes = None
+
+    def set_filter(self, columns, txt, filter_children=True):
+        model = self.sourceModel()
+
+        if txt:
+            self.visible_nodes = model.filter_nodes(columns, txt, filter_children)
+        else:
+            self.visible_nodes = None
+
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.visible_nodes is None:
+            return True
+
+        model = self.sourceModel()
+        node = model.child_nodes(model.node_from_index(source_parent))[source_row]
+        return node in self.visible_nodes
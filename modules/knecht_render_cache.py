@@ -0,0 +1,153 @@
+"""
+knecht_render_cache re-uses verified images of identical render configurations.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+The cache key hashes the scene fingerprint, the ordered variant list including the
+viewset, resolution, sampling and file extension. Cached files are hard links where
+the file system allows it, copies otherwise. The index is evicted least recently used
+once the cached files exceed the size limit.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from modules.app_globals import HELPER_DIR
+from modules.knecht_log import init_logging
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+RENDER_CACHE_DIR = HELPER_DIR / 'render_cache'
+_INDEX_FILE_NAME = 'render_cache_index.json'
+
+
+def link_or_copy(src: Path, dst: Path):
+    """ Hard link src to dst, copy if the file system or volume does not support it """
+    if dst.exists():
+        dst.unlink()
+
+    try:
+        os.link(str(src), str(dst))
+    except OSError:
+        shutil.copy2(str(src), str(dst))
+
+
+class RenderCache:
+    """ Index of verified render outputs keyed by their render configuration """
+    # Index file is shared by all render workers of this application
+    lock = threading.Lock()
+
+    def __init__(self, scene_fingerprint, max_size_gb=20.0, cache_dir=RENDER_CACHE_DIR):
+        self.scene_fingerprint = scene_fingerprint
+        self.max_size = int(max_size_gb * 1024 ** 3)
+        self.cache_dir = Path(cache_dir)
+        self.index_file = self.cache_dir / _INDEX_FILE_NAME
+
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, variant_list, resolution, sampling, file_extension):
+        config = [self.scene_fingerprint, list(variant_list), resolution, str(sampling), file_extension]
+        return hashlib.sha256(json.dumps(config).encode('utf-8')).hexdigest()
+
+    def _load_index(self):
+        if not self.index_file.exists():
+            return dict()
+
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            LOGGER.error('Could not read render cache index, starting empty cache: %s', e)
+            return dict()
+
+    def _save_index(self, index):
+        tmp_file = self.index_file.with_suffix('.tmp')
+
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(index, f)
+            tmp_file.replace(self.index_file)
+        except OSError as e:
+            LOGGER.error('Could not write render cache index: %s', e)
+
+    def fetch(self, key, img_path: Path):
+        """ Place the cached image of key at img_path, returns True on a cache hit """
+        with self.lock:
+            index = self._load_index()
+            entry = index.get(key)
+
+            if entry:
+                cache_file = self.cache_dir / entry['file']
+
+                try:
+                    if cache_file.stat().st_size != entry['size']:
+                        raise OSError('Cached file size changed')
+
+                    link_or_copy(cache_file, img_path)
+                    entry['last_used'] = time.time()
+                    self._save_index(index)
+                    self.hits += 1
+                    LOGGER.info('Render cache hit %s for %s', key[:12], img_path.name)
+                    return True
+                except OSError as e:
+                    LOGGER.warning('Dropping invalid render cache entry %s: %s', key[:12], e)
+                    del index[key]
+                    self._save_index(index)
+
+        self.misses += 1
+        return False
+
+    def store(self, key, img_path: Path):
+        """ Add a verified image to the cache and evict least recently used entries above the size limit """
+        cache_file_name = key + img_path.suffix
+
+        with self.lock:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                link_or_copy(img_path, self.cache_dir / cache_file_name)
+            except OSError as e:
+                LOGGER.error('Could not add %s to render cache: %s', img_path.name, e)
+                return
+
+            index = self._load_index()
+            index[key] = dict(file=cache_file_name, size=(self.cache_dir / cache_file_name).stat().st_size,
+                              last_used=time.time(), img_name=img_path.name)
+            self._evict(index)
+            self._save_index(index)
+
+    def _evict(self, index):
+        cache_size = sum(entry['size'] for entry in index.values())
+
+        for key, entry in sorted(index.items(), key=lambda item: item[1]['last_used']):
+            if cache_size <= self.max_size:
+                break
+
+            try:
+                (self.cache_dir / entry['file']).unlink()
+            except OSError as e:
+                LOGGER.debug('Could not remove cached file %s: %s', entry['file'], e)
+
+            cache_size -= entry['size']
+            del index[key]
+            LOGGER.debug('Evicted render cache entry %s', key[:12])
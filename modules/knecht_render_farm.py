@@ -0,0 +1,299 @@
+"""
+knecht_render_farm distributes the images of a render job across several DeltaGen hosts.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+Every host gets its own send_to_dg_worker in its own QThread. Idle workers pull the next
+image from a shared queue, images of a host that drops out are put back in front of the
+queue and rendered by the remaining hosts. Workers wait for the images still rendering on
+other hosts before they leave. All hosts need to write to the same render path.
+All hosts write to one shared render journal in the output directory.
+Rendered images of all hosts are converted in one shared png conversion pool.
+"""
+import threading
+import time
+from collections import deque
+from functools import partial
+from pathlib import Path
+
+from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+
+from modules.app_globals import HELPER_DIR, Msg, TCP_PORT
+from modules.knecht_image import PngConversionPipeline
+from modules.knecht_log import init_logging
+from modules.knecht_render_journal import RenderJournal
+from modules.knecht_render_plan import create_image_list, optimize_render_order, to_valid_chrs
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+
+def parse_render_hosts(hosts_str):
+    """
+        'host_a:3333, host_b' will return [('host_a', 3333), ('host_b', TCP_PORT)]
+    """
+    render_hosts = list()
+
+    for host in hosts_str.replace(';', ',').split(','):
+        host = host.strip()
+        if not host:
+            continue
+
+        ip, __sep, port = host.partition(':')
+        try:
+            port = int(port) if port else TCP_PORT
+        except ValueError:
+            LOGGER.error('Invalid render host port: %s, using default port %s', host, TCP_PORT)
+            port = TCP_PORT
+
+        render_hosts.append((ip.strip(), port))
+
+    return render_hosts
+
+
+class RenderFarm(QObject):
+    """ Schedules the images of render_dict on one worker per render host """
+    finished = pyqtSignal()
+    status = pyqtSignal(str)
+    display_msg = pyqtSignal(str, object)
+    strReady = pyqtSignal(object, object, object)
+    render_progress = pyqtSignal(int)
+    task_progress = pyqtSignal(int)
+
+    def __init__(self, render_hosts, render_dict, worker_factory, render_user_path=False,
+                 create_render_preset_dir=False, optimize_order=False, resume_journal=None):
+        """
+            render_hosts: list of (ip, port)
+            worker_factory: callable(tcp_ip, tcp_port) returning a configured send_to_dg_worker
+            resume_journal: RenderJournal of a previous job to continue
+        """
+        super(RenderFarm, self).__init__()
+        self.render_hosts = render_hosts
+        self.render_dict = render_dict
+        self.create_render_preset_dir = create_render_preset_dir
+        self.optimize_order = optimize_order
+        self.resume_journal = resume_journal
+        self.images_done = 0
+
+        if resume_journal:
+            # Continue in the output directory of the previous job
+            self.initial_out_dir = resume_journal.out_dir
+            done, self.image_list = resume_journal.remaining_images()
+            self.images_done = len(done)
+        else:
+            self.image_list = create_image_list(render_dict)
+            if optimize_order:
+                self.image_list = optimize_render_order(self.image_list)
+
+            # Render Path
+            out_dir_name = 'out_' + str(time.time())
+            self.initial_out_dir = HELPER_DIR.parents[0] / out_dir_name
+
+            if render_user_path:
+                self.initial_out_dir = Path(render_user_path) / out_dir_name
+
+            self.initial_out_dir = self.initial_out_dir.absolute()
+
+        self.journal = resume_journal or RenderJournal(self.initial_out_dir)
+
+        self.queue = deque(self.image_list)
+        self.lock = threading.Lock()
+        # Notified when an image is finished or put back into the queue
+        self.image_done = threading.Condition(self.lock)
+        # Images taken from the queue that are not finished yet
+        self.images_in_flight = 0
+        self.finished_images = 0
+
+        # Rendered image paths of all hosts
+        self.img_list = list()
+        # Render preset names of the rendered images of all hosts for the conversion journal records
+        self.img_render_presets = dict()
+
+        # One png conversion pool shared by all hosts, created on start
+        self.png_pipeline = None
+        # Hosts that did not leave the render farm yet
+        self.active_hosts = len(render_hosts)
+
+        self.render_log_name = 'RenderKnecht_Log_' + str(time.time()) + '.log'
+
+        self.workers = list()
+        self.threads = list()
+        self.host_progress = dict()
+
+        for tcp_ip, tcp_port in render_hosts:
+            worker = worker_factory(tcp_ip, tcp_port)
+            worker.farm = self
+            worker.initial_out_dir = self.initial_out_dir
+            worker.img_render_presets = self.img_render_presets
+            self.workers.append(worker)
+
+    def image_out_dir(self, image):
+        """ Output directory of image, created on first use """
+        out_dir = self.initial_out_dir
+
+        if self.create_render_preset_dir:
+            out_dir = out_dir / to_valid_chrs(image.render_preset_name)
+
+        if not out_dir.exists():
+            with self.lock:
+                try:
+                    out_dir.mkdir(parents=True, exist_ok=True)
+                except OSError as e:
+                    LOGGER.critical('Could not create rendering directory %s\n%s', out_dir, e)
+
+        return out_dir
+
+    def next_image(self, abort=None):
+        """
+            Next RenderImage to render or None if all images are done. While the queue is empty
+            but other hosts are still rendering, waits as their images may be put back.
+            abort: callable returning True to stop waiting
+        """
+        with self.image_done:
+            while not self.queue and self.images_in_flight:
+                if abort is not None and abort():
+                    return None
+
+                self.image_done.wait(0.5)
+
+            if self.queue:
+                self.images_in_flight += 1
+                return self.queue.popleft()
+
+    def image_finished(self, worker, image):
+        with self.image_done:
+            self.images_in_flight -= 1
+            self.finished_images += 1
+            progress = self.finished_images * 100 / max(1, len(self.image_list))
+            self.image_done.notify_all()
+
+        LOGGER.info('Render host %s finished image %s', worker.nc.server_address, image.img_name)
+        self.render_progress.emit(int(progress))
+
+    def requeue_image(self, image):
+        """ Put an image that was not rendered back in front of the queue for the remaining hosts """
+        with self.image_done:
+            self.queue.appendleft(image)
+            self.images_in_flight -= 1
+            self.image_done.notify_all()
+
+    def host_failed(self, worker, image=None):
+        """ Host dropped out, put its current image back in front of the queue """
+        if image is not None:
+            self.requeue_image(image)
+
+        host = '{}:{}'.format(*worker.nc.server_address)
+        LOGGER.error('Render host %s failed, remaining images are rendered by the other hosts.', host)
+        self.journal.write('host_failed', host=host)
+        self.display_msg.emit(Msg.RENDER_FARM_HOST_FAILED.format(host), ())
+
+    def image_converted(self, img_path, success, message, duration):
+        self.journal.write('image_converted', img_name=img_path.name, success=success, message=message,
+                           duration=round(duration, 3), render_preset=self.img_render_presets.get(img_path))
+
+    def host_finished(self):
+        """ Host leaves the render farm, returns True for the last host """
+        with self.lock:
+            self.active_hosts -= 1
+            return self.active_hosts == 0
+
+    def start(self):
+        """ Move every worker to its own thread and start rendering """
+        self.initial_out_dir.mkdir(parents=True, exist_ok=True)
+        LOGGER.info('Output Directory: %s', self.initial_out_dir)
+        self.strReady.emit(-1, Msg.OVERLAY_RENDER_DIR, str(self.initial_out_dir))
+
+        # Conversion processes and queue limit apply to the whole machine, not per host
+        if self.workers and self.workers[0].convert_to_png:
+            worker = self.workers[0]
+            self.png_pipeline = PngConversionPipeline(self.create_render_preset_dir, worker.png_workers,
+                                                      worker.png_queue_size, on_converted=self.image_converted)
+
+        if self.resume_journal:
+            self.journal.write('resume', done=self.images_done)
+
+            # Images rendered but not converted before the previous job ended
+            if self.workers:
+                self.workers[0].resume_convert = self.journal.unconverted_images()
+        else:
+            convert_to_png = self.workers[0].convert_to_png if self.workers else False
+            self.journal.write_job(self.render_dict, self.image_list, self.optimize_order,
+                                   self.create_render_preset_dir, convert_to_png)
+
+        for r in sorted({image.render_preset_idx for image in self.image_list}):
+            self.journal.write('render_preset', render_preset=self.render_dict[r]['render_preset_name'],
+                               sampling=self.render_dict[r].get('sampling'),
+                               resolution=self.render_dict[r].get('resolution'),
+                               file_extension=self.render_dict[r].get('file_extension'))
+
+        for worker in self.workers:
+            host = '{}:{}'.format(*worker.nc.server_address)
+            thread = QThread()
+
+            worker.status.connect(partial(self.host_status, host))
+            worker.display_msg.connect(self.display_msg)
+            worker.task_progress.connect(partial(self.host_task_progress, host))
+
+            worker.moveToThread(thread)
+            worker.finished.connect(thread.quit)
+            thread.started.connect(worker.render_farm_images)
+            thread.finished.connect(self.thread_finished)
+
+            self.threads.append(thread)
+
+        for thread in self.threads:
+            thread.start()
+
+    def host_status(self, host, msg):
+        self.status.emit('{} - {}'.format(host, msg))
+
+    def host_task_progress(self, host, progress):
+        self.host_progress[host] = progress
+        self.task_progress.emit(int(sum(self.host_progress.values()) / max(1, len(self.host_progress))))
+
+    @pyqtSlot()
+    def abort_signal(self):
+        for worker in self.workers:
+            worker.abort_signal()
+
+    def is_running(self):
+        return any(thread.isRunning() for thread in self.threads)
+
+    def end_threads(self):
+        for worker, thread in zip(self.workers, self.threads):
+            if thread.isRunning():
+                worker.abort_connection = True
+                thread.exit()
+                thread.wait(msecs=20000)
+
+    @pyqtSlot()
+    def thread_finished(self):
+        if self.is_running():
+            return
+
+        for worker in self.workers:
+            self.img_list += getattr(worker, 'img_list', list())
+
+        if self.queue:
+            LOGGER.error('Render farm finished with %s images not rendered.', len(self.queue))
+            self.journal.write('not_rendered', images=[i.img_name for i in self.queue])
+        else:
+            self.journal.write('job_finished')
+
+        self.journal.write_render_log(self.initial_out_dir / self.render_log_name)
+        self.finished.emit()
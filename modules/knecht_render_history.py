@@ -0,0 +1,194 @@
+"""
+knecht_render_history records image render timings and estimates render times from them.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+import json
+import threading
+import time
+from statistics import median
+
+import numpy as np
+
+from modules.app_globals import HELPER_DIR, RENDER_MACHINE_FACTOR, RENDER_RES_FACTOR
+from modules.knecht_log import init_logging
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+RENDER_HISTORY_FILE = HELPER_DIR / 'render_history.jsonl'
+
+# Only the most recent records are used, render hardware and scenes change over time
+_MAX_RECORDS = 2000
+# Minimum records and distinct resolution/sampling configurations to fit the regression
+_MIN_FIT_RECORDS = 8
+_MIN_FIT_CONFIGS = 3
+
+
+def formula_render_time(res_x, sampling):
+    """ Render time of one image in seconds from the fixed machine and resolution factors """
+    return (res_x * 2 ** int(sampling)) * RENDER_MACHINE_FACTOR * (res_x * RENDER_RES_FACTOR)
+
+
+def parse_resolution(resolution):
+    """ '1920 1080' will return (1920, 1080), invalid strings (1280, 720) """
+    try:
+        res_x, res_y = (int(r) for r in resolution.split()[:2])
+    except (AttributeError, ValueError):
+        return 1280, 720
+
+    return res_x, res_y
+
+
+class RenderHistory:
+    """ Append only JSONL store of finished images """
+    lock = threading.Lock()
+
+    def __init__(self, history_file=RENDER_HISTORY_FILE):
+        self.history_file = history_file
+
+    def record(self, host, resolution, sampling, file_extension, num_variants, num_sent,
+               send_s, render_s, verify_s):
+        entry = dict(time=round(time.time(), 1), host=host, resolution=resolution, sampling=int(sampling),
+                     file_extension=file_extension, variants=num_variants, sent=num_sent,
+                     send_s=round(send_s, 3), render_s=round(render_s, 3), verify_s=round(verify_s, 3),
+                     total_s=round(send_s + render_s + verify_s, 3))
+
+        with self.lock:
+            try:
+                with open(self.history_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + '\n')
+            except OSError as e:
+                LOGGER.error('Could not write render history %s\n%s', self.history_file, e)
+
+    def load(self, max_records=_MAX_RECORDS):
+        records = list()
+
+        if not self.history_file.exists():
+            return records
+
+        with self.lock:
+            try:
+                with open(self.history_file, 'r', encoding='utf-8') as f:
+                    lines = f.readlines()[-max_records:]
+            except OSError as e:
+                LOGGER.error('Could not read render history %s\n%s', self.history_file, e)
+                return records
+
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Line of an interrupted write
+                continue
+
+        return records
+
+
+class RenderTimeEstimator:
+    """
+        Estimates the duration of one image with a least squares fit on the render history:
+            total_s = a + b * pixels * samples + c * pixels + d * variants
+
+        Records of the given host are preferred if there are enough of them. With too few
+        records the formula is scaled by the median ratio of actual to formula time,
+        without history the formula is used as is.
+    """
+    def __init__(self, history=None, host=None):
+        self.history = history or RenderHistory()
+        self.host = host
+        self.coefficients = None
+        self.formula_scale = None
+        self.mean_variants = 0.0
+        self.fit()
+
+    @staticmethod
+    def _features(res_x, res_y, sampling, num_variants):
+        pixels = res_x * res_y / 1e6
+        return [1.0, pixels * 2 ** int(sampling), pixels, num_variants]
+
+    def fit(self):
+        records = self.history.load()
+
+        if self.host:
+            host_records = [r for r in records if r.get('host') == self.host]
+            if len(host_records) >= _MIN_FIT_RECORDS:
+                records = host_records
+
+        if not records:
+            return
+
+        try:
+            features, targets, ratios = list(), list(), list()
+
+            for r in records:
+                res_x, res_y = parse_resolution(r['resolution'])
+                features.append(self._features(res_x, res_y, r['sampling'], r['variants']))
+                targets.append(r['total_s'])
+                ratios.append(r['total_s'] / max(0.001, formula_render_time(res_x, r['sampling'])))
+        except (KeyError, TypeError, ValueError) as e:
+            LOGGER.error('Invalid render history record: %s', e)
+            return
+
+        self.mean_variants = sum(f[3] for f in features) / len(features)
+        self.formula_scale = median(ratios)
+
+        configs = {(f[1], f[2]) for f in features}
+        if len(records) < _MIN_FIT_RECORDS or len(configs) < _MIN_FIT_CONFIGS:
+            LOGGER.debug('Render history too small for regression, scaling formula by %.2f', self.formula_scale)
+            return
+
+        self.coefficients, *__ = np.linalg.lstsq(np.array(features), np.array(targets), rcond=None)
+        LOGGER.debug('Render time regression fitted on %s records: %s', len(records), self.coefficients)
+
+    def estimate_image(self, res_x, res_y, sampling, num_variants=None):
+        """ Estimated seconds to switch, render and verify one image """
+        formula_time = formula_render_time(res_x, sampling)
+
+        if num_variants is None:
+            num_variants = self.mean_variants
+
+        if self.coefficients is not None:
+            estimate = float(np.dot(self.coefficients, self._features(res_x, res_y, sampling, num_variants)))
+
+            # Extrapolation far outside the recorded configurations can go negative
+            if estimate > 0:
+                return estimate
+
+        if self.formula_scale is not None:
+            return formula_time * self.formula_scale
+
+        return formula_time
+
+    def estimate_render_dict(self, render_dict):
+        """ Returns (estimated seconds, number of images) of a render_dict """
+        render_time = 0
+        image_num_all = 0
+
+        for r in range(0, len(render_dict.items())):
+            res_x, res_y = parse_resolution(render_dict[r].get('resolution'))
+            viewset_num = max(1, len(render_dict[r]['viewsets']))
+
+            for preset in render_dict[r]['preset'].values():
+                num_variants = len(preset.get('variants') or []) or None
+                render_time += self.estimate_image(res_x, res_y, render_dict[r].get('sampling'),
+                                                   num_variants) * viewset_num
+                image_num_all += viewset_num
+
+        return render_time, image_num_all
@@ -0,0 +1,258 @@
+"""
+knecht_render_journal append only render journal, render log creation and render resume.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+Every record is one json line, written and flushed to disk when it happens:
+
+    job             render_dict, planned image order and render settings
+    resume          rendering continued, number of images already done
+    render_preset   render preset settings
+    image_sent      variants switched for an image
+    image_rendered  image file written by DeltaGen
+    image_verified  image validation result
+    image_converted png conversion result
+    image_cached    image taken from the render cache
+    image_overhead  seconds spent outside of rendering, heartbeat and back off time
+    cache_stats     render cache hits and misses
+    host_failed     render farm host dropped out
+    not_rendered    images left when the job ended
+    job_finished    all images processed
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from modules.app_strings import Msg
+from modules.knecht_image import validate_image_file
+from modules.knecht_log import init_logging
+from modules.knecht_render_plan import create_image_list, to_valid_chrs
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+RENDER_JOURNAL_FILE_NAME = 'RenderKnecht_Journal.jsonl'
+
+
+def _time_str(time_f):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time_f))
+
+
+def _render_dict_from_json(render_dict):
+    """ Json object keys are strings, restore the integer keys of render presets and presets """
+    restored = dict()
+
+    for r, render_preset in render_dict.items():
+        render_preset = dict(render_preset)
+        render_preset['preset'] = {int(k): v for k, v in render_preset['preset'].items()}
+        restored[int(r)] = render_preset
+
+    return restored
+
+
+class RenderJournal:
+    """ Crash safe JSONL journal of one render job inside its output directory """
+    def __init__(self, out_dir: Path, listener=None):
+        """ listener: optional callable receiving every written record dict """
+        self.out_dir = Path(out_dir)
+        self.file = self.out_dir / RENDER_JOURNAL_FILE_NAME
+        self.listener = listener
+        self.lock = threading.Lock()
+        self.tail_checked = False
+
+    def exists(self):
+        return self.file.exists()
+
+    def write(self, event, **data):
+        record = dict(event=event, time=round(time.time(), 3))
+        record.update(data)
+
+        with self.lock:
+            try:
+                line = json.dumps(record) + '\n'
+
+                # A crashed session may have left an incomplete last line
+                if not self.tail_checked:
+                    self.tail_checked = True
+                    if self.exists() and self.file.stat().st_size:
+                        with open(self.file, 'rb') as f:
+                            f.seek(-1, os.SEEK_END)
+                            if f.read(1) != b'\n':
+                                line = '\n' + line
+
+                with open(self.file, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError as e:
+                LOGGER.error('Could not write render journal %s\n%s', self.file, e)
+
+        if self.listener is not None:
+            self.listener(record)
+
+    def read(self):
+        records = list()
+
+        if not self.exists():
+            return records
+
+        with self.lock:
+            with open(self.file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # Incomplete last line of a crashed session
+                        LOGGER.warning('Skipping damaged render journal line: %s', line[:80])
+
+        return records
+
+    def write_job(self, render_dict, image_list, optimized, create_render_preset_dir, convert_to_png):
+        self.write('job', render_dict=render_dict, optimized=optimized,
+                   order=[image.img_count for image in image_list],
+                   create_render_preset_dir=create_render_preset_dir, convert_to_png=convert_to_png)
+
+    def job(self):
+        """ Returns the job record with restored render_dict or None """
+        for record in self.read():
+            if record.get('event') == 'job':
+                record['render_dict'] = _render_dict_from_json(record['render_dict'])
+                return record
+
+    def image_path(self, image, create_render_preset_dir):
+        if create_render_preset_dir:
+            return self.out_dir / to_valid_chrs(image.render_preset_name) / image.img_name
+        return self.out_dir / image.img_name
+
+    def remaining_images(self):
+        """
+            Rebuild the planned image list of the job and split it into (done, remaining).
+            An image is done if it was verified, or its file in the output directory is a valid image.
+            Returns None if the journal contains no job.
+        """
+        job = self.job()
+        if not job:
+            return
+
+        records = self.read()
+        verified = {r['img_name'] for r in records if r.get('event') == 'image_verified' and r.get('valid')}
+
+        image_list = create_image_list(job['render_dict'])
+        images = {image.img_count: image for image in image_list}
+        image_list = [images[img_count] for img_count in job['order'] if img_count in images]
+
+        done, remaining = list(), list()
+        for image in image_list:
+            img_path = self.image_path(image, job['create_render_preset_dir'])
+
+            if image.img_name in verified or validate_image_file(img_path, image.resolution)[0]:
+                done.append(image)
+            else:
+                remaining.append(image)
+
+        return done, remaining
+
+    def unconverted_images(self):
+        """ Verified image files that were not converted to png before the job ended """
+        records = self.read()
+        converted = {r['img_name'] for r in records if r.get('event') == 'image_converted'}
+        img_paths = list()
+
+        for r in records:
+            if r.get('event') != 'image_verified' or not r.get('valid') or r['img_name'] in converted:
+                continue
+
+            img_path = Path(r['path'])
+            if img_path.exists() and img_path.suffix.casefold() != '.png':
+                img_paths.append(img_path)
+
+        return img_paths
+
+    def create_render_log(self, render_preset_name=None):
+        """ Human readable render log, optionally only the images of one render preset """
+        render_log = ''
+        conversion_header = False
+        overhead = list()
+
+        for r in self.read():
+            event = r.get('event')
+
+            if render_preset_name and r.get('render_preset', render_preset_name) != render_preset_name:
+                continue
+
+            if event == 'job':
+                render_log += Msg.RENDER_LOG[0] + _time_str(r['time']) + '\n\n'
+                if r.get('optimized'):
+                    render_log += Msg.RENDER_LOG_ORDER.format(', '.join(str(i) for i in r['order'])) + '\n\n'
+            elif event == 'resume':
+                render_log += Msg.RENDER_LOG_RESUME.format(_time_str(r['time']), r['done']) + '\n\n'
+            elif event == 'render_preset':
+                try:
+                    samples = str(2 ** int(r['sampling']))
+                    render_log += r['render_preset'] + ' Einstellungen - '
+                    render_log += 'Sampling: 2^' + r['sampling'] + ' ' + samples + ' - Res: '
+                    render_log += r['resolution'].replace(' ', 'x') + 'px - Ext: ' + r['file_extension'] + '\n\n'
+                except (KeyError, TypeError, ValueError, AttributeError):
+                    pass
+            elif event == 'image_sent':
+                host = r['host'] + ' - ' if r.get('host') else ''
+                render_log += _time_str(r['time']) + ' ' + host + Msg.RENDER_LOG[1] + r['img_name'] + '\n'
+                render_log += Msg.RENDER_LOG[2] + ''.join(v.replace('VARIANT ', '') for v in r['variants'])
+
+                if r['sent'] != len(r['variants']):
+                    render_log += '\n' + Msg.RENDER_LOG_DELTA.format(r['sent'], len(r['variants']))
+
+                render_log += '\n\n'
+            elif event == 'image_verified' and not r.get('valid'):
+                render_log += '\nDatei konnte nicht als gültige Bilddatei verfiziert werden: ' + r['path'] + '\n'
+                render_log += r.get('message', '') + '\n'
+            elif event == 'image_converted':
+                if not conversion_header:
+                    conversion_header = True
+                    render_log += '\nErstelle PNG Bildaten:\n'
+
+                if r.get('success'):
+                    render_log += '{} - {:.1f}s\n'.format(r['message'], r['duration'])
+                else:
+                    render_log += r['message']
+            elif event == 'image_cached':
+                render_log += _time_str(r['time']) + ' ' + Msg.RENDER_CACHE_HIT.format(r['img_name']) + '\n\n'
+            elif event == 'image_overhead':
+                overhead.append((r['overhead_s'], r['heartbeat_s'], r['backoff_s']))
+            elif event == 'cache_stats':
+                render_log += '\n' + Msg.RENDER_LOG_CACHE.format(r['hits'], r['misses']) + '\n'
+            elif event == 'host_failed':
+                render_log += '\n' + _time_str(r['time']) + ' Render Host ' + r['host'] + ' ausgefallen.\n\n'
+            elif event == 'not_rendered':
+                render_log += Msg.RENDER_FARM_NOT_RENDERED.format(', '.join(r['images'])) + '\n'
+
+        if overhead:
+            render_log += '\n' + Msg.RENDER_LOG_OVERHEAD.format(
+                sum(o[0] for o in overhead) / len(overhead), sum(o[1] for o in overhead) / len(overhead),
+                sum(o[2] for o in overhead), len(overhead)) + '\n'
+
+        return render_log
+
+    def write_render_log(self, log_file: Path, render_preset_name=None):
+        try:
+            with open(log_file, 'w') as e:
+                print(self.create_render_log(render_preset_name), file=e)
+        except Exception as e:
+            LOGGER.error('Error saving render log file: %s', e)
@@ -0,0 +1,105 @@
+"""
+knecht_render_pacing paces render commands by DeltaGen readiness instead of fixed delays.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+DeltaGen processes socket commands in order. Once the Headlight heartbeat of
+Ncat.deltagen_is_alive is answered, every command sent before it was processed
+and the next command can follow immediately. A slow answer means DeltaGen is
+still busy, eg. loading textures after a variant switch, and the pacer backs off
+before the next heartbeat. The back off shrinks again with every fast answer.
+"""
+import time
+
+from modules.knecht_log import init_logging
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+# Heartbeat answered within this many seconds counts as DeltaGen being idle
+_FAST_ACK = 0.25
+# Heartbeats per readiness check before rendering continues anyway
+_MAX_HEARTBEATS = 4
+
+
+class RenderPacer:
+    """ Readiness driven pacing and per image overhead of one DeltaGen connection """
+    def __init__(self, nc, abort_event, max_backoff=5.0, fast_ack=_FAST_ACK, on_event=None):
+        """
+            nc: connected Ncat instance
+            abort_event: threading.Event set on abort, interrupts back off waits
+            on_event: callable receiving the events read while waiting for a heartbeat
+        """
+        self.nc = nc
+        self.abort_event = abort_event
+        self.on_event = on_event
+        self.max_backoff = max_backoff
+        self.fast_ack = fast_ack
+        self.backoff = 0.0
+
+        # Seconds of the current image
+        self.ack_s = 0.0
+        self.wait_s = 0.0
+
+    def sleep(self, seconds):
+        """ Sleep that returns early with False on abort """
+        if seconds <= 0:
+            return not self.abort_event.is_set()
+
+        return not self.abort_event.wait(seconds)
+
+    def heartbeat(self, timeout=20):
+        """ Returns (DeltaGen responded, seconds until the answer) """
+        begin = time.time()
+        alive = self.nc.deltagen_is_alive(timeout, self.on_event)
+        ack = time.time() - begin
+        self.ack_s += ack
+
+        return alive, ack
+
+    def wait_ready(self, timeout=20):
+        """
+            Wait until DeltaGen answers the heartbeat without delay, back off exponentially
+            while the answers are slow. Returns False if DeltaGen did not answer or on abort.
+        """
+        for __ in range(_MAX_HEARTBEATS):
+            alive, ack = self.heartbeat(timeout)
+
+            if not alive:
+                return False
+
+            if ack <= self.fast_ack:
+                self.backoff /= 2
+                return True
+
+            self.backoff = min(self.max_backoff, max(ack, self.backoff * 2))
+            LOGGER.debug('DeltaGen answered after %.2fs, backing off %.2fs', ack, self.backoff)
+
+            begin = time.time()
+            if not self.sleep(self.backoff):
+                return False
+            self.wait_s += time.time() - begin
+
+        return True
+
+    def start_image(self):
+        self.ack_s, self.wait_s = 0.0, 0.0
+
+    def image_overhead(self):
+        """ Returns (heartbeat seconds, back off seconds) of the current image """
+        return round(self.ack_s, 3), round(self.wait_s, 3)
@@ -0,0 +1,196 @@
+"""
+knecht_render_plan expands render presets into image lists and plans the render order.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+from math import log as math_log
+
+from modules.app_globals import INVALID_CHR
+from modules.knecht_log import init_logging
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+
+def split_variant(variant):
+    """
+        'VARIANT variant_set variant_value;' will return ('variant_set', 'variant_value') or None
+    """
+    var_split = variant.split(' ', 2)
+    if len(var_split) == 3:
+        return var_split[1], var_split[2].replace(';', '').strip()
+
+
+def get_viewset_name(viewset):
+    """
+        'Variant Viewset View;' will return '_View' or ''
+    """
+    # Viewset name if supplied as "Variant Viewset View;"
+    viewset_name = viewset.split(' ', 2)
+    if len(viewset_name) >= 2:
+        # VARIANT #_Shot Shot;
+        return '_' + viewset_name[2].replace(';', '')
+    else:
+        return ''
+
+
+def sampling_exponent(samples):
+    """
+        '256' samples will return '8', the power of two exponent clamped to 1 - 12
+    """
+    sample_pow = math_log(max(1, int(samples))) / math_log(2)
+    return str(int(max(1, min(12, sample_pow))))
+
+
+def to_valid_chrs(string):
+    """ Replace invalid characters in provided string """
+    for k, v in INVALID_CHR.items():
+        string = string.replace(k, v)
+    return string
+
+
+def variant_state(variant_list):
+    """ Resulting variant_set: variant_value state after switching variant_list, last command per set wins """
+    state = dict()
+
+    for variant in variant_list:
+        variant_split = split_variant(variant)
+        if variant_split:
+            state[variant_split[0]] = variant_split[1]
+
+    return state
+
+
+class RenderImage:
+    """ One image of a render preset, img_count is the number in the original render order """
+    def __init__(self, img_count, render_preset_idx, render_preset_name, preset_idx, preset, viewset,
+                 sampling, resolution, file_extension):
+        self.img_count = img_count
+        self.render_preset_idx = render_preset_idx
+        self.render_preset_name = render_preset_name
+        self.preset_idx = preset_idx
+        self.preset = preset
+        self.viewset = viewset
+        self.sampling = sampling
+        self.resolution = resolution
+        self.file_extension = file_extension
+
+    @property
+    def name(self):
+        return self.preset.get('name')
+
+    @property
+    def variant_list(self):
+        """ Preset variants plus the viewset variant if a valid viewset was supplied """
+        variant_list = list()
+        variant_list += self.preset.get('variants')
+
+        if get_viewset_name(self.viewset):
+            variant_list.append(self.viewset)
+
+        return variant_list
+
+    @property
+    def img_name(self):
+        img_name = '{:03d}_{name}{viewset}{ext}'.format(self.img_count, name=self.name,
+                                                        viewset=get_viewset_name(self.viewset),
+                                                        ext=self.file_extension)
+        return to_valid_chrs(img_name)
+
+
+def create_image_list(render_dict):
+    """ Expand render presets into a list of RenderImage's in the original render order """
+    image_list = list()
+    img_count = 0
+
+    for r in range(0, len(render_dict.items())):
+        viewsets = render_dict[r]['viewsets'] or ['Dummy']
+
+        # Render Preset preset's / reference's (one image per reference and viewset)
+        for preset_idx, preset in render_dict[r]['preset'].items():
+            for viewset in viewsets:
+                img_count += 1
+                image_list.append(RenderImage(img_count, r, render_dict[r]['render_preset_name'], preset_idx, preset,
+                                              viewset, render_dict[r].get('sampling'),
+                                              render_dict[r].get('resolution'), render_dict[r].get('file_extension')))
+
+    return image_list
+
+
+def count_variant_switches(image_list):
+    """ Number of variant commands that change the DeltaGen state when rendering image_list in order """
+    state = dict()
+    switches = 0
+
+    for image in image_list:
+        for variant_set, variant_value in variant_state(image.variant_list).items():
+            if state.get(variant_set) != variant_value:
+                switches += 1
+                state[variant_set] = variant_value
+
+    return switches
+
+
+def _switch_distance(state, target_state):
+    """ Number of variant sets that need to be switched to get from state to target_state """
+    return sum(1 for k, v in target_state.items() if state.get(k) != v)
+
+
+def optimize_render_order(image_list):
+    """
+        Reorder images inside every render preset to minimize variant switches.
+
+        Presets are ordered greedy nearest neighbour by the number of differing variant sets,
+        the images of one preset stay grouped with their viewsets. The viewset order
+        alternates so the viewset at the boundary of two presets does not need to be switched.
+        Render presets keep their order and the img_count of every image is unchanged.
+    """
+    optimized_list = list()
+    state = dict()
+    last_viewset = None
+
+    # Group images by render preset and preset
+    render_presets = dict()
+    for image in image_list:
+        render_presets.setdefault(image.render_preset_idx, dict()).setdefault(image.preset_idx, list()).append(image)
+
+    for r in sorted(render_presets.keys()):
+        groups = list(render_presets[r].values())
+        group_states = [variant_state(group[0].preset.get('variants')) for group in groups]
+
+        while groups:
+            # Nearest preset to the current state, ties resolved by original order
+            distances = [_switch_distance(state, group_state) for group_state in group_states]
+            nearest = distances.index(min(distances))
+
+            group = groups.pop(nearest)
+            state.update(group_states.pop(nearest))
+
+            # Start with the viewset that is already switched
+            if len(group) > 1 and group[0].viewset != last_viewset and group[-1].viewset == last_viewset:
+                group = list(reversed(group))
+
+            for image in group:
+                state.update(variant_state(image.variant_list))
+                optimized_list.append(image)
+
+            last_viewset = group[-1].viewset
+
+    LOGGER.debug('Optimized render order: %s', [image.img_count for image in optimized_list])
+    return optimized_list
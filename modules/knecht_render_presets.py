@@ -0,0 +1,150 @@
+"""
+knecht_render_presets expands render presets of a preset Xml document without tree widgets.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+Produces the same render_dict as SendToDeltaGen.collect_render_settings does from the
+User Presets and Render trees: reset presets, references and viewsets are resolved by
+preset id in document order.
+"""
+from modules.knecht_log import init_logging
+from modules.knecht_render_plan import sampling_exponent
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+_EMPTY_VIEWSET = 'VARIANT DUMMY EMPTY_VIEWSET;'
+
+
+def variant_command(element):
+    return 'VARIANT ' + element.get('name', '') + ' ' + element.get('value', '') + ';'
+
+
+class XmlRenderPresets:
+    """ Render presets of a parsed RenderKnecht preset Xml ElementTree """
+    def __init__(self, xml_tree, send_reset=True):
+        self.send_reset = send_reset
+        self.presets = dict()
+        self.render_presets = list()
+        self.reset_presets = list()
+        self.errors = list()
+
+        for element in xml_tree.iterfind('./*/'):
+            if element.tag == 'render_preset':
+                self.render_presets.append(element)
+            elif element.tag == 'preset':
+                self.presets.setdefault(element.get('id'), list()).append(element)
+
+                if element.get('type') == 'reset':
+                    self.reset_presets.append(element)
+
+        # Resolved variant commands per reference id
+        self.resolved = dict()
+
+    def resolve_reference(self, reference, recursion_list=None):
+        """ Ordered variant commands of the preset(s) referenced by reference """
+        reference_id = reference.get('reference', '')
+
+        if reference_id in self.resolved:
+            return self.resolved[reference_id]
+
+        recursion_list = recursion_list or list()
+        commands = list()
+
+        for preset in self.presets.get(reference_id, list()):
+            if preset in recursion_list:
+                msg = 'Reference recursion error: {} with Id {} references itself.'.format(
+                    preset.get('name'), reference_id)
+                LOGGER.error(msg)
+                self.errors.append(msg)
+                return commands
+
+            commands += self.resolve_children(preset, recursion_list + [preset])
+
+        self.resolved[reference_id] = commands
+        return commands
+
+    def resolve_children(self, preset, recursion_list=None):
+        commands = list()
+
+        for child in preset:
+            if child.tag == 'variant':
+                commands.append(variant_command(child))
+            elif child.tag == 'reference':
+                commands += self.resolve_reference(child, recursion_list)
+
+        return commands
+
+    def reset_commands(self):
+        commands = list()
+
+        if not self.send_reset:
+            return commands
+
+        for reset_preset in self.reset_presets:
+            commands += self.resolve_children(reset_preset)
+
+        return commands
+
+    def viewset_command(self, reference):
+        for preset in self.presets.get(reference.get('reference', ''), list()):
+            for child in preset:
+                if child.tag == 'variant':
+                    return variant_command(child)
+
+        msg = 'Viewset {} is empty or missing.'.format(reference.get('name'))
+        LOGGER.error(msg)
+        self.errors.append(msg)
+        return _EMPTY_VIEWSET
+
+    def render_dict(self):
+        """ render_dict of all render presets in document order """
+        render_dict = dict()
+        reset_commands = self.reset_commands()
+
+        for idx, render_preset in enumerate(self.render_presets):
+            render_dict[idx] = dict(render_preset_name=render_preset.get('name'), viewsets=list(), preset=dict())
+            preset_count = 0
+
+            for child in render_preset:
+                if child.tag == 'reference' and child.get('type') == 'viewset':
+                    render_dict[idx]['viewsets'].append(self.viewset_command(child))
+                elif child.tag == 'reference':
+                    preset_count += 1
+                    render_dict[idx]['preset'][preset_count] = dict(
+                        name=child.get('name'), variants=reset_commands + self.resolve_reference(child))
+                elif child.tag == 'render_setting':
+                    setting, value = child.get('type'), child.get('value', '')
+
+                    if setting == 'sampling':
+                        try:
+                            render_dict[idx]['sampling'] = sampling_exponent(value)
+                        except ValueError:
+                            self.errors.append('Invalid sampling {} in {}'.format(value, render_preset.get('name')))
+                    elif setting == 'file_extension':
+                        render_dict[idx]['file_extension'] = value
+                    elif setting == 'resolution':
+                        res = value.split(' ', 2)
+                        if len(res) == 2 and res[0].isdigit() and res[1].isdigit():
+                            render_dict[idx]['resolution'] = res[0] + ' ' + res[1]
+
+            for k in ('resolution', 'sampling', 'file_extension'):
+                if k not in render_dict[idx]:
+                    self.errors.append('Render preset {} has no setting: {}'.format(render_preset.get('name'), k))
+
+        return render_dict
@@ -22,6 +22,8 @@ Copyright (C) 2017 Stefan Tapper, All rights reserved.
 import os
 import lxml.etree as Et
 
+from modules.knecht_xml_writer import write_element_tree
+
 _APPDATA_PATH = os.getenv('APPDATA')
 
 _KNECHT_SETTINGS_PATH = os.path.join(_APPDATA_PATH, 'RenderKnecht')
@@ -43,7 +45,13 @@ class knechtSettings:
         log_window=True,
         version='0.0.0',
         app_style='windowsvista',
-        introduction_shown=False)
+        introduction_shown=False,
+        vplus_workers=1,
+        vplus_reader='openpyxl',
+        vplus_modified_copy=False,
+        vplus_cache=True,
+        vplus_cache_size_mb=500,
+        vplus_incremental=True)
 
     dg = dict(
         viewer_size='1280 720',
@@ -55,7 +63,20 @@ class knechtSettings:
         tree_state_check=False,
         convert_to_png=True,
         render_timeout=False,
-        create_render_preset_dir=False)
+        create_render_preset_dir=False,
+        pipeline_variants=False,
+        preflight_variants=True,
+        delta_variants=True,
+        full_resend_interval=10,
+        optimize_render_order=False,
+        render_hosts='',
+        verify_full_decode=False,
+        png_workers=1,
+        png_queue_size=2,
+        render_cache=False,
+        render_cache_scene='',
+        render_cache_size_gb=20,
+        pacing_max_backoff=5.0)
 
     recent_files_set = set()
 
@@ -114,7 +135,8 @@ class knechtSettings:
         knechtSettings.save_tree(_KNECHT_SETTINGS_FILE, root)
 
     @staticmethod
-    def load_settings():
+    def load_settings(create_default=True):
+        """ Load the settings file, create_default: write default settings if no settings file exists """
 
         def set_settings(set_dict, k, v):
             if k in set_dict.keys():
@@ -135,7 +157,8 @@ class knechtSettings:
 
         if not os.path.exists(_KNECHT_SETTINGS_FILE):
             # Create default settings if no settings found
-            knechtSettings.save_settings()
+            if create_default:
+                knechtSettings.save_settings()
         else:
             # Parse settings and update class dictonarys
             try:
@@ -187,34 +210,8 @@ class knechtSettings:
             except Exception as e:
                 print('Error creating bak file: ' + e)
 
-        # Pretty print for save file
-        knechtSettings.pretty_print_xml(xml_element)
-
-        # Replace current ElementTree with pretty printed tree
-        pretty_xmlTree = Et.ElementTree(xml_element)
-
+        # Pretty print while streaming to the save file
         try:
-            with open(file, 'wb') as f:
-                pretty_xmlTree.write(f, encoding='UTF-8', xml_declaration=True)
+            write_element_tree(file, xml_element)
         except Exception as e:
             print('Error writing settings file: ' + e)
-
-    @staticmethod
-    def pretty_print_xml(elem, level=0):
-        """ Pretty XML print for better human readabilty """
-        NEW_LINE = '\n'
-        NEW_LEVEL = '\t'
-        i = NEW_LINE + level * NEW_LEVEL
-
-        if len(elem):
-            if not elem.text or not elem.text.strip():
-                elem.text = i + NEW_LEVEL
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
-            for elem in elem:
-                knechtSettings.pretty_print_xml(elem, level + 1)
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
-        else:
-            if level and (not elem.tail or not elem.tail.strip()):
-                elem.tail = i
@@ -22,8 +22,11 @@ The class name 'Ncat' is a tribute to the windows version of unix nc that provid
 the main funcionality for the original RenderKnecht batch application.
 
 """
+import re
+import selectors
 import socket
 import time
+from collections import deque, namedtuple
 from PyQt5 import QtCore
 
 from modules.knecht_log import init_logging
@@ -37,15 +40,41 @@ _TCP_IP = 'localhost'
 _TCP_PORT = 3333
 _BUFFER_SIZE = 4096
 # Send and connect will abort after this TIMEOUT
-# Recv will always wait for this TIMEOUT !
 _SOCKET_TIMEOUT = 0.1
 # Receive Timeout is not a socket parameter but a method condition
-# Receive method will try to fetch data from socket until TIMEOUT * MULTIPLIER is reached
-# or will return data if it received something and TIMEOUT*1 has passed.
+# Receive method will wait for a complete message until TIMEOUT * MULTIPLIER is reached
 _RECEIVE_TIMEOUT = 0.3
 _RECEIVE_TIMEOUT_MULTIPLIER = 1.5
 _ENCODING = 'utf-8'
 
+# DeltaGen messages end with a line break or null byte, consecutive EVENT's may also arrive without any delimiter
+_MSG_BOUNDARY = re.compile(b'\r?\n|\x00|(?=EVENT )')
+# Pending message fragment without delimiter is considered complete if nothing arrives for this long
+_FRAME_FLUSH_TIMEOUT = 0.05
+
+# Parsed DeltaGen event message eg. EVENT variant_state scene "variant_set" "variant_value"
+# name: 'variant_state', args: ('variant_set', 'variant_value'), message: complete message string
+DeltaGenEvent = namedtuple('DeltaGenEvent', 'name args message')
+
+
+def parse_event(message):
+    """ Parse a DeltaGen message into a DeltaGenEvent or return None if it is not an EVENT message """
+    if not message.startswith('EVENT '):
+        return
+
+    name_split = message.split(' ', 2)
+    name = name_split[1]
+    rest = ''
+    if len(name_split) == 3:
+        rest = name_split[2]
+
+    # Prefer quoted arguments, variant sets and values may contain spaces
+    args = re.findall(r'"([^"]*)"', rest)
+    if not args:
+        args = rest.split()
+
+    return DeltaGenEvent(name, tuple(args), message)
+
 
 class SocketSignals(QtCore.QObject):
     send_start = QtCore.pyqtSignal()
@@ -60,7 +89,8 @@ class Ncat:
     """
     Connects to TCP_IP, TCP_PORT and receives BUFFER_SIZE of data.
     Default to timeout mode with timeout _SOCKET_TIMEOUT.
-    (Module wont continue to execute until data is send or received)
+    Received data is buffered and split into messages at DeltaGen message boundaries,
+    receive methods will return as soon as a complete message arrived.
 
     """
 
@@ -78,6 +108,13 @@ class Ncat:
         self.sock = None
         self.signals = SocketSignals()
 
+        # Received but not yet returned data
+        self._recv_buffer = bytearray()
+        # Parsed messages not yet taken by the caller of receive_events
+        self._pending_messages = deque()
+        self._selector = None
+        self._selector_sock = None
+
     def connect(self):
         # Create and connect the socket
         self.signals.connect_start.emit()
@@ -93,6 +130,9 @@ class Ncat:
                 self.server_address,
                 str(self.timeout)[0:4],
                 e)
+        # Data of a previous connection does not belong to this one
+        self._recv_buffer.clear()
+        self._pending_messages.clear()
         self.signals.connect_end.emit()
 
     def check_connection(self):
@@ -127,79 +167,160 @@ class Ncat:
 
         # Format the message
         msg = msg.encode(self.enc)
-
-        # Send data
-        # LOGGER.info('sending %s', msg)
-        total_sent = 0
-        sent = 0
         msg_len = len(msg)
 
-        # Send loop
-        while total_sent < msg_len:
+        # Send loop, memoryview slices do not copy the remaining message
+        view = memoryview(msg)
+
+        while view:
             try:
-                sent = self.sock.send(msg[total_sent:])
+                sent = self.sock.send(view)
+            except socket.timeout:
+                # Send buffer full, retry until the host accepts data
+                if time.time() - send_start_time > self.timeout * 50:
+                    LOGGER.error('Sending timed out after %s of %s bytes.', msg_len - len(view), msg_len)
+                    break
+                continue
             except Exception as e:
                 LOGGER.error('Sending failed! - %s', e)
+                break
 
             if sent == 0:
-                LOGGER.error('Socket communication error. Could not send: %s',
-                             msg)
+                LOGGER.error('Socket communication error. Could not send: %s', msg)
+                break
+
+            view = view[sent:]
 
-            total_sent = total_sent + sent
-            send_time = time.time() - send_start_time
-            LOGGER.debug('Sent: %s Msglen: %s - Message: %s - Duration: %s',
-                         total_sent, msg_len, msg,
-                         str(send_time)[0:6])
+        send_time = time.time() - send_start_time
+        LOGGER.debug('Sent: %s Msglen: %s - Message: %s - Duration: %s',
+                     msg_len - len(view), msg_len, msg,
+                     str(send_time)[0:6])
 
         self.signals.send_end.emit()
 
-    def receive(self, timeout=_RECEIVE_TIMEOUT, log_empty=True):
+    def _wait_readable(self, timeout):
+        """ Block until the socket has data to read or timeout expired """
+        if self._selector_sock is not self.sock:
+            if self._selector:
+                self._selector.close()
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self.sock, selectors.EVENT_READ)
+            self._selector_sock = self.sock
+
+        return bool(self._selector.select(max(0.0, timeout)))
+
+    def _fill_buffer(self, timeout, buffer_size=None):
+        """ Read available data into the receive buffer, returns True if data was read """
+        try:
+            if not self._wait_readable(timeout):
+                return False
+
+            data = self.sock.recv(buffer_size or self.buf)
+        except Exception as e:
+            LOGGER.debug('Receive - %s', e)
+            return False
+
+        if not data:
+            # Readable but no data, host closed the connection. Do not spin on the closed socket.
+            LOGGER.debug('Connection closed by host %s', self.server_address)
+            time.sleep(min(timeout, _FRAME_FLUSH_TIMEOUT))
+            return False
+
+        self._recv_buffer += data
+        return True
+
+    def _pop_messages(self, flush=False):
         """
-            Used for socket connection to unreliable DeltaGen host which can only
-            handle one connection at a time.
+            Split complete messages from the receive buffer
+            flush: treat a pending fragment without delimiter as complete message
+        """
+        # Messages left over by a receive_events caller come first
+        messages = list(self._pending_messages)
+        self._pending_messages.clear()
+
+        while self._recv_buffer:
+            boundary = _MSG_BOUNDARY.search(self._recv_buffer, 1)
+
+            if boundary:
+                end, skip = boundary.start(), boundary.end()
+            elif flush:
+                end = skip = len(self._recv_buffer)
+            else:
+                break
 
-            Return if data received AND timeout expired
+            msg = bytes(self._recv_buffer[:end]).decode(self.enc, errors='replace').strip()
+            del self._recv_buffer[:skip]
+
+            if msg:
+                messages.append(msg)
+
+        return messages
+
+    def receive_messages(self, timeout=_RECEIVE_TIMEOUT):
+        """
+            Return a list of complete messages as soon as at least one message arrived
+            or an empty list after timeout.
         """
         if not self.check_connection():
-            return
+            return list()
 
         self.signals.recv_start.emit()
-        # total data partwise in an array
-        total_data = []
-        data = ''
+        messages = self._pop_messages()
+        begin = time.time()
+
+        while not messages:
+            remaining = timeout - (time.time() - begin)
+            if remaining <= 0:
+                messages = self._pop_messages(flush=True)
+                break
+
+            if self._fill_buffer(min(remaining, _FRAME_FLUSH_TIMEOUT)):
+                messages = self._pop_messages()
+            elif self._recv_buffer:
+                # Line went quiet, pending fragment is a complete message
+                messages = self._pop_messages(flush=True)
+
+        self.signals.recv_end.emit()
+        return messages
+
+    def receive_events(self, timeout=_RECEIVE_TIMEOUT):
+        """ Iterate parsed DeltaGenEvent's as they arrive until timeout expired """
+        if not self.check_connection():
+            return
 
         begin = time.time()
+
         while 1:
-            # if you got some data, then break after timeout
-            if total_data and time.time() - begin > timeout:
-                recv_duration = str(time.time() - begin)[0:4]
-                LOGGER.info('received %s in: %s', data.decode(self.enc),
-                            recv_duration)
+            remaining = timeout - (time.time() - begin)
+            if remaining <= 0:
                 break
 
-            # if you got no data at all, wait a little longer, twice the timeout
-            elif time.time() - begin > timeout * _RECEIVE_TIMEOUT_MULTIPLIER:
-                if log_empty:
-                    LOGGER.debug(
-                        'nothing received after %s seconds. returning empty string',
-                        str(timeout * _RECEIVE_TIMEOUT_MULTIPLIER)[0:4])
-                break
+            if not self._pending_messages:
+                self._pending_messages.extend(self.receive_messages(remaining))
 
-            # recv something
-            try:
-                data = self.sock.recv(self.buf)
-                if data:
-                    total_data.append(data.decode(self.enc))
-                    begin = time.time()
-                else:
-                    # sleep for sometime to indicate a gap
-                    time.sleep(0.01)
-            except Exception as e:
-                LOGGER.debug('Receive - %s', e)
+            # Remove messages one by one, a caller leaving the loop early keeps the rest for later reads
+            while self._pending_messages:
+                event = parse_event(self._pending_messages.popleft())
+                if event:
+                    yield event
 
-        self.signals.recv_end.emit()
-        # join all parts to make final string
-        return ''.join(total_data)
+    def receive(self, timeout=_RECEIVE_TIMEOUT, log_empty=True):
+        """
+            Used for socket connection to unreliable DeltaGen host which can only
+            handle one connection at a time.
+
+            Return complete messages as soon as received or an empty string after timeout * multiplier
+        """
+        begin = time.time()
+        messages = self.receive_messages(timeout * _RECEIVE_TIMEOUT_MULTIPLIER)
+
+        if messages:
+            LOGGER.info('received %s in: %s', messages, str(time.time() - begin)[0:4])
+        elif log_empty:
+            LOGGER.debug('nothing received after %s seconds. returning empty string',
+                         str(timeout * _RECEIVE_TIMEOUT_MULTIPLIER)[0:4])
+
+        return ''.join(messages)
 
     def receive_short_timeout(self, timeout=_RECEIVE_TIMEOUT):
         """
@@ -211,31 +332,16 @@ class Ncat:
             return
 
         self.signals.recv_start.emit()
-        # total data partwise in an array
-        total_data = list()
 
-        begin = time.time()
-        while 1:
-            # if you got some data, then break after timeout
-            if total_data or time.time() - begin > timeout:
-                break
-
-            # recv something
-            try:
-                data = self.sock.recv(self.buf)
+        if not self._recv_buffer:
+            self._fill_buffer(timeout)
 
-                if data:
-                    total_data.append(data.decode(self.enc))
-                    begin = time.time()
-                else:
-                    # sleep for sometime to indicate a gap
-                    time.sleep(0.01)
-            except Exception as e:
-                LOGGER.debug('Short Receive - %s', e)
+        # Return unframed data
+        data = bytes(self._recv_buffer).decode(self.enc, errors='replace')
+        self._recv_buffer.clear()
 
         self.signals.recv_end.emit()
-        # join all parts to make final string
-        return ''.join(total_data)
+        return data
 
     def receive_job_data(self, timeout=_RECEIVE_TIMEOUT, end=b'End-Of-Job-Data'):
         """ Method to receive pickled binary data from Render Service Job Manager """
@@ -243,47 +349,46 @@ class Ncat:
             return None
 
         self.signals.recv_start.emit()
-        total_data = list()
         begin = time.time()
 
-        while True:
-            if time.time() - begin > timeout:
+        while end not in self._recv_buffer:
+            remaining = timeout - (time.time() - begin)
+            if remaining <= 0:
                 # Return nothing as we can not pickle incomplete data
-                return None
-
-            try:
-                data = self.sock.recv(8192)
-            except Exception as e:
-                LOGGER.error(e)
                 self.signals.recv_end.emit()
                 return None
 
-            if data is None:
-                time.sleep(0.05)
-                continue
+            self._fill_buffer(remaining, 8192)
 
-            if end in data:
-                total_data.append(data[:data.find(end)])
-                break
+        end_idx = self._recv_buffer.find(end)
+        data = bytes(self._recv_buffer[:end_idx])
+        del self._recv_buffer[:end_idx + len(end)]
 
-            total_data.append(data)
+        self.signals.recv_end.emit()
+        return data
 
-            if len(total_data) > 1:
-                # check if end_of_data was split
-                last_pair = total_data[-2] + total_data[-1]
+    def connection_lost(self):
+        """ Returns True if the host closed the connection, does not re-connect """
+        if self.sock is None:
+            return True
 
-                if end in last_pair:
-                    total_data[-2] = last_pair[:last_pair.find(end)]
-                    total_data.pop()
-                    break
+        try:
+            # Unread events would hide the end of the connection, move them to the receive buffer
+            while self._wait_readable(0):
+                data = self.sock.recv(self.buf)
 
-        # Create one byte object from data fragments
-        data = b''
-        for d in total_data:
-            data += d
+                if not data:
+                    # Readable without data means the host closed the connection
+                    return True
 
-        self.signals.recv_end.emit()
-        return data
+                self._recv_buffer += data
+
+            return False
+        except socket.timeout:
+            return False
+        except OSError as e:
+            LOGGER.debug('Connection check - %s', e)
+            return True
 
     def close(self):
         if not self.check_connection():
@@ -291,13 +396,20 @@ class Ncat:
         LOGGER.info('closing socket.')
         self.sock.close()
 
-    def deltagen_is_alive(self, timeout=3):
+        if self._selector:
+            self._selector.close()
+            self._selector = None
+            self._selector_sock = None
+
+    def deltagen_is_alive(self, timeout=3, on_event=None):
         """
         Verifies that a DeltaGen host is active and alive.
         Subscribes to object 'Headlight' which should be present in any scene and modifies it's color
         to receive an event message which verfies that the host is responding.
 
         Will also return False if the host is active and responding but has no scene opened(therefore no Headlight).
+
+        on_event: optional callable receiving every other event read while waiting, eg. late variant_state events
         """
         if not self.check_connection():
             return False
@@ -309,30 +421,16 @@ class Ncat:
             LOGGER.debug('Error sending to DeltaGen: %s', e)
         self.signals.send_end.emit()
 
-        # Recv loop until timeout
-        self.signals.recv_start.emit()
-        begin = time.time()
-        while 1:
-            try:
-                recv_str = self.receive(0.2, False)
-            except Exception as e:
-                LOGGER.debug('Nothing received from DeltaGen: %s', e)
-
-            if 'EVENT Headlight' in recv_str:
+        # Recv loop until timeout, returns as soon as the Headlight event arrived
+        for event in self.receive_events(timeout):
+            if event.name == 'Headlight':
                 LOGGER.info(
                     'Verified an active and responding DeltaGen socket connection.'
                 )
-                self.signals.recv_end.emit()
                 return True
 
-            if time.time() - begin > timeout:
-                LOGGER.info('DeltaGen has not responded after %s', timeout)
-                break
-
-            time.sleep(0.2)
-
-        self.signals.recv_end.emit()
-        if recv_str == None:
-            return False
+            if on_event is not None:
+                on_event(event)
 
+        LOGGER.info('DeltaGen has not responded after %s', timeout)
         return False
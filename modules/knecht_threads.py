@@ -43,6 +43,7 @@ class ExcelConversionThread(QObject):
         self.widget = tree_widget
         self.file = file
         self.xmlFile = False
+        self.import_report = None
         self.abort = False
         self.window = None
         self.obj = None
@@ -78,6 +79,7 @@ class ExcelConversionThread(QObject):
         self.obj.moveToThread(self.thread)
         LOGGER.debug('Excel conv moved to thread.')
         self.obj.strReady.connect(self.conversion_xml_file)
+        self.obj.import_report.connect(self.conversion_import_report)
 
         # Status messages
         self.obj.xls_msg.connect(self.display_status)
@@ -134,6 +136,9 @@ class ExcelConversionThread(QObject):
     def conversion_xml_file(self, file):
         self.xmlFile = file
 
+    def conversion_import_report(self, import_report):
+        self.import_report = import_report
+
     def conversion_finished(self):
         # Enable Open menu
         self.open_dialog.ui.enable_load_actions(True)
@@ -146,7 +151,12 @@ class ExcelConversionThread(QObject):
         if not self.abort:
             if self.xmlFile:
                 LOGGER.info('XML file created: %s', self.xmlFile)
-                self.open_dialog.parse_xml(self.xmlFile)
+
+                if self.import_report and not self.fakom_reader and not self.wizard:
+                    # Patch the source tree with the models changed since the previous import
+                    self.open_dialog.update_xml(self.xmlFile, self.import_report)
+                else:
+                    self.open_dialog.parse_xml(self.xmlFile)
                 return True
             else:
                 LOGGER.error(
@@ -174,6 +184,7 @@ class ExcelConversionThread(QObject):
 class ExcelConversionWorker(QObject):
     finished = pyqtSignal()
     strReady = pyqtSignal(object)
+    import_report = pyqtSignal(object)
     prFam_model = pyqtSignal(set, list)
     xls_msg = pyqtSignal(str)
     xls_err_msg = pyqtSignal(str)
@@ -222,6 +233,8 @@ class ExcelConversionWorker(QObject):
         xml_file = self._xls.create_document(self._wb)
         self._wb.close()
 
+        if self._xls.import_report:
+            self.import_report.emit(self._xls.import_report)
         self.strReady.emit(xml_file)
         self.finished.emit()
 
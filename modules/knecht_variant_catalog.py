@@ -0,0 +1,216 @@
+"""
+knecht_variant_catalog records the variant sets and values of DeltaGen scenes for preflight checks.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+DeltaGen can not list the variant sets of a scene over the socket. The catalog is built
+from the variant_state events of previous sends: a reported set and value exists in the
+scene. A value is invalid if DeltaGen reported its set with another value, a command
+without any feedback only counts as a miss, feedback may have been lost or late.
+After _MAX_MISSES consecutive misses the set or value is considered invalid. Commands
+unknown to the catalog stay unknown and have to be verified by the regular variant state check.
+"""
+import json
+import threading
+
+from modules.app_globals import HELPER_DIR
+from modules.knecht_log import init_logging
+from modules.knecht_render_plan import split_variant
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+VARIANT_CATALOG_FILE = HELPER_DIR / 'variant_catalog.json'
+
+# Preflight results per variant
+VARIANT_VALID = 'valid'
+VARIANT_UNKNOWN = 'unknown'
+VARIANT_INVALID_SET = 'invalid_set'
+VARIANT_INVALID_VALUE = 'invalid_value'
+
+# Consecutive commands without feedback before a variant set or value is considered invalid
+_MAX_MISSES = 3
+
+
+def event_scene_name(event):
+    """ Scene name of a 'EVENT variant_state scene "variant_set" "variant_value"' event or empty string """
+    msg_split = event.message.split(' ', 3)
+
+    if len(msg_split) < 4 or msg_split[2].startswith('"'):
+        return ''
+
+    return msg_split[2]
+
+
+def _load_catalog_file(catalog_file):
+    if not catalog_file.exists():
+        return dict(last_scene='', scenes=dict())
+
+    try:
+        with open(catalog_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        LOGGER.error('Could not read variant catalog %s: %s', catalog_file, e)
+        return dict(last_scene='', scenes=dict())
+
+
+class VariantCatalog:
+    """ Known valid and invalid variant sets and values of one DeltaGen scene """
+    # Catalog file is shared by all DeltaGen workers of this application
+    lock = threading.Lock()
+
+    def __init__(self, scene, catalog_file=VARIANT_CATALOG_FILE):
+        self.scene = scene
+        self.catalog_file = catalog_file
+
+        self.sets = dict()
+        self.invalid_sets = set()
+        self.invalid_values = dict()
+        # Variant set: {variant value: consecutive commands without feedback}
+        self.misses = dict()
+        self.modified = False
+
+    @classmethod
+    def _from_data(cls, scene, data, catalog_file):
+        catalog = cls(scene, catalog_file)
+        scene_data = data['scenes'].get(scene, dict())
+
+        catalog.sets = {s: set(values) for s, values in scene_data.get('sets', dict()).items()}
+        catalog.invalid_sets = set(scene_data.get('invalid_sets', list()))
+        catalog.invalid_values = {s: set(values) for s, values in scene_data.get('invalid_values', dict()).items()}
+        catalog.misses = {s: dict(values) for s, values in scene_data.get('misses', dict()).items()}
+        return catalog
+
+    @classmethod
+    def load(cls, scene, catalog_file=VARIANT_CATALOG_FILE):
+        with cls.lock:
+            data = _load_catalog_file(catalog_file)
+
+        return cls._from_data(scene, data, catalog_file)
+
+    @classmethod
+    def load_last_scene(cls, catalog_file=VARIANT_CATALOG_FILE):
+        """ Catalog of the scene that was last connected or None """
+        with cls.lock:
+            data = _load_catalog_file(catalog_file)
+
+        if data.get('last_scene'):
+            return cls._from_data(data['last_scene'], data, catalog_file)
+
+    def __len__(self):
+        return len(self.sets)
+
+    def record(self, variant_set, variant_value):
+        """ DeltaGen reported variant_set switched to variant_value """
+        if variant_value in self.sets.get(variant_set, set()):
+            return
+
+        self.sets.setdefault(variant_set, set()).add(variant_value)
+        self.invalid_sets.discard(variant_set)
+        self.invalid_values.get(variant_set, set()).discard(variant_value)
+        self.misses.get(variant_set, dict()).pop(variant_value, None)
+        self.modified = True
+
+    def record_failed(self, variant_set, variant_value, set_reported=False):
+        """ Command got no matching feedback, set_reported: the variant set was reported with another value """
+        if variant_value in self.sets.get(variant_set, set()):
+            # Known to exist, feedback was probably just late
+            return
+
+        self.modified = True
+
+        if set_reported:
+            self.invalid_values.setdefault(variant_set, set()).add(variant_value)
+            return
+
+        # No feedback at all, only invalid once it keeps missing
+        values = self.misses.setdefault(variant_set, dict())
+        values[variant_value] = values.get(variant_value, 0) + 1
+
+        if values[variant_value] < _MAX_MISSES:
+            return
+
+        if variant_set in self.sets:
+            self.invalid_values.setdefault(variant_set, set()).add(variant_value)
+        else:
+            self.invalid_sets.add(variant_set)
+
+    def check(self, variant_set, variant_value):
+        if variant_value in self.sets.get(variant_set, set()):
+            return VARIANT_VALID
+        if variant_set in self.invalid_sets:
+            return VARIANT_INVALID_SET
+        if variant_value in self.invalid_values.get(variant_set, set()):
+            return VARIANT_INVALID_VALUE
+        return VARIANT_UNKNOWN
+
+    def check_variant_str(self, variant):
+        """ Check a 'VARIANT SET STATE;' command string """
+        variant_split = split_variant(variant)
+        if not variant_split:
+            return VARIANT_INVALID_SET
+
+        return self.check(*variant_split)
+
+    def validate(self, variant_list):
+        """ Returns a list of results, one per 'VARIANT SET STATE;' string of variant_list """
+        return [self.check_variant_str(variant) for variant in variant_list]
+
+    def save(self):
+        """ Merge this scene into the catalog file and remember it as last connected scene """
+        with self.lock:
+            data = _load_catalog_file(self.catalog_file)
+            scene_data = data['scenes'].setdefault(self.scene, dict())
+
+            # Other workers may have recorded the same scene in the meantime
+            sets = {s: set(values) for s, values in scene_data.get('sets', dict()).items()}
+            for variant_set, values in self.sets.items():
+                sets.setdefault(variant_set, set()).update(values)
+
+            invalid_values = {s: set(v) for s, v in scene_data.get('invalid_values', dict()).items()}
+            for variant_set, values in self.invalid_values.items():
+                invalid_values.setdefault(variant_set, set()).update(values)
+
+            misses = {s: dict(v) for s, v in scene_data.get('misses', dict()).items()}
+            for variant_set, values in self.misses.items():
+                misses.setdefault(variant_set, dict()).update(values)
+
+            scene_data['sets'] = {s: sorted(values) for s, values in sets.items()}
+            scene_data['invalid_sets'] = sorted(
+                (set(scene_data.get('invalid_sets', list())) | self.invalid_sets) - set(sets))
+            scene_data['invalid_values'] = {s: sorted(values - sets.get(s, set()))
+                                            for s, values in invalid_values.items() if values - sets.get(s, set())}
+            scene_data['misses'] = dict()
+            for variant_set, values in misses.items():
+                # Reported values are no misses
+                values = {v: n for v, n in values.items() if v not in sets.get(variant_set, set())}
+                if values:
+                    scene_data['misses'][variant_set] = values
+            data['last_scene'] = self.scene
+
+            tmp_file = self.catalog_file.with_suffix('.tmp')
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                tmp_file.replace(self.catalog_file)
+            except OSError as e:
+                LOGGER.error('Could not write variant catalog %s: %s', self.catalog_file, e)
+                return
+
+        self.modified = False
+        LOGGER.debug('Variant catalog of scene %s saved with %s variant sets.', self.scene, len(self.sets))
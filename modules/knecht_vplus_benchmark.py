@@ -0,0 +1,256 @@
+"""
+knecht_vplus_benchmark compares the V Plus worksheet reader backends.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+Run from the application directory:
+    python -m modules.knecht_vplus_benchmark export.xlsx
+    python -m modules.knecht_vplus_benchmark --synthetic-models 150
+    python -m modules.knecht_vplus_benchmark --synthetic-models 500 --convert
+
+Every backend reads all worksheets in a fresh process, so wall time and peak
+memory are not influenced by previous runs. The snapshots of the lxml backend
+are validated cell by cell against openpyxl. With --convert every file is also
+converted to a RenderKnecht document with all models and PR-Families selected.
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from openpyxl import Workbook, load_workbook
+
+from modules.knecht_excel_sheet import SheetSnapshot
+from modules.knecht_log import init_logging
+from modules.knecht_xlsx_reader import XlsxStreamReader, snapshot_differences
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+BACKENDS = ('openpyxl', 'openpyxl_read_only', 'lxml')
+
+
+def peak_memory_mb():
+    """ Peak resident memory of this process in MB """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return round(peak / 1024 ** (2 if sys.platform == 'darwin' else 1), 1)
+    except ImportError:
+        pass
+
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                             ctypes.byref(counters), counters.cb)
+    return round(counters.PeakWorkingSetSize / 1024 ** 2, 1)
+
+
+def read_snapshots(file, backend):
+    """ SheetSnapshots of all worksheets of file read with backend """
+    if backend == 'lxml':
+        with XlsxStreamReader(file) as reader:
+            return [reader.read_sheet(sheet_name) for sheet_name in reader.sheetnames]
+
+    with open(file, 'rb') as f:
+        book = load_workbook(filename=f, read_only=backend == 'openpyxl_read_only')
+        snapshots = [SheetSnapshot.from_worksheet(book[sheet_name]) for sheet_name in book.sheetnames]
+
+    book.close()
+    return snapshots
+
+
+def _benchmark_process(file, backend):
+    """ Runs in a fresh process """
+    baseline_mb = peak_memory_mb()
+    begin = time.time()
+    snapshots = read_snapshots(file, backend)
+    duration = time.time() - begin
+
+    return dict(backend=backend, wall_s=round(duration, 3), peak_rss_mb=peak_memory_mb(),
+                baseline_rss_mb=baseline_mb, rows=sum(s.max_row for s in snapshots))
+
+
+def benchmark_backend(file, backend):
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(_benchmark_process, str(file), backend).result()
+
+
+def _conversion_process(file, read_packages):
+    """ Runs in a fresh process """
+    from modules.knecht_parse_excel import LoadVplus
+
+    LoadVplus.use_cache = False
+    LoadVplus.read_packages = read_packages
+    LoadVplus.package_pr_fam_filter = read_packages
+    vplus = LoadVplus(file)
+
+    begin = time.time()
+    wb = vplus.read_workbook()
+    read_duration = time.time() - begin
+
+    LoadVplus.pr_fam_filter = {pr_family for pr_family, __ in vplus.read_pr_familys(wb)}
+    LoadVplus.model_filter = [model_code for model_code, __ in vplus.read_and_return_models(wb)]
+
+    begin = time.time()
+    vplus.create_document(wb)
+    duration = time.time() - begin
+
+    return dict(read_packages=read_packages, read_s=round(read_duration, 3), document_s=round(duration, 3),
+                models=len(vplus.document.models), peak_rss_mb=peak_memory_mb())
+
+
+def benchmark_conversion(file, read_packages):
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(_conversion_process, str(file), read_packages).result()
+
+
+def validate_backend(file, backend, reference='openpyxl'):
+    """ Returns a list of (sheet name, row, column, expected, actual) differences to the reference backend """
+    differences = list()
+
+    for expected, actual in zip(read_snapshots(file, reference), read_snapshots(file, backend)):
+        differences += [(expected.title,) + d for d in snapshot_differences(expected, actual)]
+
+    return differences
+
+
+def create_synthetic_vplus(file, num_models=150, num_pr_familys=60, pr_per_family=8, num_packages=60, seed=1):
+    """ Creates a V Plus export like workbook with Modelle, PR-Nummern and Pakete worksheets """
+    rnd = random.Random(seed)
+    wb = Workbook()
+    models = ['{}{:04d}'.format('8W2', idx) for idx in range(num_models)]
+    pr_familys = ['SIB', 'VOS', 'KMS', 'LRA'] + ['F{:02d}'.format(idx) for idx in range(num_pr_familys)]
+
+    mod_sheet = wb.active
+    mod_sheet.title = 'Modelle'
+    mod_sheet.append(['Modell', 'Modelltext', 'Modelljahr', 'Markt'])
+    for idx, model in enumerate(models):
+        mod_sheet.append([model, 'A4 Limousine S line {} 2.0 TFSI quattro S tronic'.format(idx), '2019', 'DE'])
+
+    def model_header(sheet):
+        for col, model in enumerate(models, 6):
+            sheet.cell(row=3, column=col, value=model[:3])
+            sheet.cell(row=4, column=col, value=model[3:])
+
+    pr_sheet = wb.create_sheet('PR-Nummern')
+    model_header(pr_sheet)
+    row = 6
+    for pr_family in pr_familys:
+        pr_sheet.cell(row=row, column=1, value=pr_family)
+        pr_sheet.cell(row=row, column=2, value=pr_family + ' Beschreibung')
+        for pr_idx in range(pr_per_family):
+            row += 1
+            pr_code = '{}{}'.format(pr_family[:2], pr_idx)
+            pr_sheet.cell(row=row, column=3, value=pr_code)
+            pr_sheet.cell(row=row, column=4, value='PR ' + pr_code)
+            for col in range(6, 6 + num_models):
+                pr_sheet.cell(row=row, column=col, value=rnd.choice(('L', 'I', 'E', 'P', '-')))
+        row += 2
+
+    pkg_sheet = wb.create_sheet('Pakete')
+    model_header(pkg_sheet)
+    row = 6
+    for pkg_idx in range(num_packages):
+        pkg_sheet.cell(row=row, column=1, value='P{:02d}'.format(pkg_idx))
+        pkg_sheet.cell(row=row, column=2, value='Paket {} Navigation plus'.format(pkg_idx))
+        for col in range(6, 6 + num_models):
+            pkg_sheet.cell(row=row, column=col, value=rnd.choice(('E', '-')))
+        for __ in range(4):
+            row += 1
+            pr_family = rnd.choice(pr_familys)
+            pr_code = '{}{}'.format(pr_family[:2], rnd.randrange(pr_per_family))
+            pkg_sheet.cell(row=row, column=3, value=pr_code)
+            pkg_sheet.cell(row=row, column=4, value='PR ' + pr_code)
+            for col in range(6, 6 + num_models):
+                pkg_sheet.cell(row=row, column=col, value=rnd.choice(('E', '-', 'F')))
+        row += 2
+
+    wb.save(str(file))
+    return Path(file)
+
+
+def print_results(title, results):
+    print('\n' + title)
+
+    if not results:
+        return
+
+    keys = list(results[0].keys())
+    print(' | '.join('{:>16}'.format(k) for k in keys))
+    for result in results:
+        print(' | '.join('{:>16}'.format(str(result[k])) for k in keys))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='V Plus worksheet reader benchmark')
+    parser.add_argument('files', nargs='*', type=Path, help='V Plus xlsx exports')
+    parser.add_argument('--synthetic-models', type=int, default=0,
+                        help='Benchmark a synthetic export with this number of model columns')
+    parser.add_argument('--convert', action='store_true',
+                        help='Also benchmark the document creation with and without packages')
+    parser.add_argument('--json', type=Path, help='Write results to this json file')
+    args = parser.parse_args()
+
+    files = list(args.files)
+    tmp_dir = tempfile.TemporaryDirectory()
+
+    if args.synthetic_models:
+        files.append(create_synthetic_vplus(Path(tmp_dir.name) / 'synthetic_vplus.xlsx', args.synthetic_models))
+
+    results = dict()
+
+    for file in files:
+        results[str(file)] = [benchmark_backend(file, backend) for backend in BACKENDS]
+        print_results('{} - {:.1f} MB'.format(file.name, file.stat().st_size / 1024 ** 2), results[str(file)])
+
+        differences = validate_backend(file, 'lxml')
+        if differences:
+            print('lxml backend differs from openpyxl: {}'.format(differences[:5]))
+        else:
+            print('lxml backend values identical to openpyxl.')
+
+        if args.convert:
+            conversion = [benchmark_conversion(file, read_packages) for read_packages in (False, True)]
+            results[str(file) + ' conversion'] = conversion
+            print_results('{} - document creation'.format(file.name), conversion)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
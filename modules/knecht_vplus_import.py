@@ -0,0 +1,166 @@
+"""
+knecht_vplus_import incremental V Plus imports.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+Every model column of an import is fingerprinted from its model attributes and its
+PR-Nummern and Pakete column values. The PR-Code, description and PR-Family columns
+shared by all models together with the import options form the import fingerprint.
+Both are stored per vehicle line in HELPER_DIR next to the output Xml.
+
+The next import of the same vehicle line with an equal import fingerprint only
+creates the presets of added and changed models, the presets of all other models
+are copied from the previous output Xml.
+"""
+import hashlib
+import json
+import re
+from pathlib import Path
+
+import lxml.etree as ET
+
+from modules.app_globals import HELPER_DIR
+from modules.knecht_log import init_logging
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+# Increase if the preset creation changes
+FINGERPRINT_VERSION = 1
+
+
+def fingerprint(*values):
+    return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
+
+
+class VplusImportReport:
+    """ Models of an import compared to the previous import of the same vehicle line """
+    def __init__(self, vehicle_line):
+        self.vehicle_line = vehicle_line
+
+        # Previous output Xml if presets of unchanged models were copied from it
+        self.previous_xml_file = None
+        self.xml_file = None
+
+        # Model codes
+        self.added, self.changed, self.removed, self.unchanged = list(), list(), list(), list()
+
+        # Model code: preset ids of the previous import
+        self.previous_preset_ids = dict()
+        # Model code: (id, order) of the presets of this import
+        self.presets = dict()
+
+    @property
+    def incremental(self):
+        return self.previous_xml_file is not None
+
+
+class VplusIncrementalImport:
+    """ Compares model fingerprints with the previous import of a vehicle line """
+    def __init__(self, vehicle_line, import_fingerprint, model_fingerprints: dict, state_dir=HELPER_DIR):
+        self.import_fingerprint = import_fingerprint
+        # Model code: fingerprint or None if the model can not be copied
+        self.model_fingerprints = model_fingerprints
+        self.state_file = Path(state_dir) / 'vplus_import_{}.json'.format(re.sub(r'\W', '_', vehicle_line))
+
+        # Model code: (preset id offset, preset count) of this import, purged packages
+        # are counted, so preset ids of a model are not contiguous
+        self.model_presets = dict()
+
+        # Model code: (model element, preset id offset, preset count) of the previous import
+        # for every unchanged model
+        self.previous_models = dict()
+        self.report = VplusImportReport(vehicle_line)
+
+        self._compare_previous_import()
+
+    def _load_state(self):
+        if not self.state_file.exists():
+            return
+
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            LOGGER.error('Could not read V Plus import state %s: %s', self.state_file.name, e)
+            return
+
+        if state.get('version') != FINGERPRINT_VERSION:
+            return
+
+        return state
+
+    def _load_previous_xml(self, xml_file):
+        try:
+            return ET.parse(str(xml_file)).getroot()
+        except (OSError, ET.XMLSyntaxError) as e:
+            LOGGER.warning('Could not read previous V Plus import %s, converting all models: %s', xml_file, e)
+
+    def _compare_previous_import(self):
+        report = self.report
+        state = self._load_state()
+
+        if not state or state['import_fingerprint'] != self.import_fingerprint:
+            report.added = list(self.model_fingerprints)
+            return
+
+        previous_root = self._load_previous_xml(state['xml_file'])
+        if previous_root is None:
+            report.added = list(self.model_fingerprints)
+            return
+
+        report.previous_xml_file = Path(state['xml_file'])
+        previous_models = dict()
+
+        for model in previous_root.iterfind('model'):
+            model_code = model.get('value')
+            previous_models.setdefault(model_code, model)
+            report.previous_preset_ids.setdefault(model_code, list()).extend(
+                preset.get('id') for preset in model.iterfind('preset'))
+
+        previous_fingerprints, previous_presets = state['models'], state['presets']
+
+        for model_code, model_fingerprint in self.model_fingerprints.items():
+            if model_code not in previous_fingerprints:
+                report.added.append(model_code)
+            elif (model_fingerprint is None or model_fingerprint != previous_fingerprints[model_code]
+                  or model_code not in previous_models or model_code not in previous_presets):
+                report.changed.append(model_code)
+            else:
+                report.unchanged.append(model_code)
+                offset, preset_count = previous_presets[model_code]
+                self.previous_models[model_code] = previous_models[model_code], offset, preset_count
+
+        report.removed = [m for m in previous_fingerprints if m not in self.model_fingerprints]
+
+        LOGGER.info('Incremental V Plus import of %s. Added: %s Changed: %s Removed: %s Unchanged: %s',
+                    report.vehicle_line, report.added, report.changed, report.removed, len(report.unchanged))
+
+    def save(self, xml_file):
+        """ Store the fingerprints of this import with its output Xml """
+        self.report.xml_file = Path(xml_file)
+        state = dict(version=FINGERPRINT_VERSION, xml_file=str(xml_file),
+                     import_fingerprint=self.import_fingerprint, models=self.model_fingerprints,
+                     presets=self.model_presets)
+
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.state_file, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+        except OSError as e:
+            LOGGER.error('Could not write V Plus import state %s: %s', self.state_file.name, e)
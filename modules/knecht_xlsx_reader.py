@@ -0,0 +1,281 @@
+"""
+knecht_xlsx_reader streaming xlsx worksheet reader for V Plus imports.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+Reads worksheet values straight from the xlsx zip archive with lxml iterparse
+instead of the openpyxl object model. Only the requested worksheets are parsed,
+only cell values are kept and every parsed row element is discarded right away.
+
+Values match openpyxl with data_only=False: shared, inline and formula result
+strings, int/float numbers, booleans, error strings and dates for date formatted
+numbers of the 1900 date system. Formula cells return '=' + formula, shared
+formulas without own formula text return their cached value.
+"""
+import posixpath
+import re
+import zipfile
+
+import lxml.etree as ET
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.datetime import from_excel, from_ISO8601
+
+from modules.knecht_excel_sheet import SheetSnapshot
+from modules.knecht_log import init_logging
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_CELL_REF = re.compile(r'([A-Z]+)(\d+)')
+
+
+def _column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index
+
+
+def _local_name(element):
+    return ET.QName(element).localname
+
+
+def _text_content(element):
+    """ Text of a shared or inline string element, phonetic runs excluded """
+    text = ''
+    for child in element:
+        name = _local_name(child)
+        if name == 't':
+            text += child.text or ''
+        elif name == 'r':
+            for t in child:
+                if _local_name(t) == 't':
+                    text += t.text or ''
+    return text
+
+
+def _cast_number(value):
+    if '.' in value or 'E' in value or 'e' in value:
+        return float(value)
+    return int(value)
+
+
+class XlsxStreamReader:
+    """ Worksheet values of a xlsx file as SheetSnapshots """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.archive = zipfile.ZipFile(str(file_path), 'r')
+
+        self._sheet_paths = dict()
+        self._shared_strings = None
+        self._date_styles = None
+        self.date1904 = False
+
+        self._read_workbook()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.archive.close()
+
+    @property
+    def sheetnames(self):
+        return list(self._sheet_paths)
+
+    def _parse(self, path):
+        with self.archive.open(path) as f:
+            return ET.parse(f).getroot()
+
+    def _rels(self, path):
+        """ Relationship Id: archive path of the relationships of the part at path """
+        directory, name = posixpath.split(path)
+        rels_path = posixpath.join(directory, '_rels', name + '.rels')
+        targets = dict()
+
+        if rels_path not in self.archive.namelist():
+            return targets
+
+        for rel in self._parse(rels_path):
+            target = rel.get('Target', '')
+            if target.startswith('/'):
+                target = target[1:]
+            else:
+                target = posixpath.normpath(posixpath.join(directory, target))
+            targets[rel.get('Id')] = (rel.get('Type', ''), target)
+
+        return targets
+
+    def _read_workbook(self):
+        workbook_path = 'xl/workbook.xml'
+        for rel_type, target in self._rels('').values():
+            if rel_type.endswith('/officeDocument'):
+                workbook_path = target
+
+        workbook_rels = self._rels(workbook_path)
+        self._workbook_rels = workbook_rels
+
+        for element in self._parse(workbook_path).iter():
+            name = _local_name(element)
+            if name == 'workbookPr':
+                self.date1904 = element.get('date1904', '').lower() in ('1', 'true')
+            elif name == 'sheet':
+                rel = workbook_rels.get(element.get(_REL_NS + 'id'))
+                if rel:
+                    self._sheet_paths[element.get('name')] = rel[1]
+
+        if self.date1904:
+            LOGGER.warning('%s uses the 1904 date system, dates are read as 1900 dates.', self.file_path)
+
+    def _rel_target(self, rel_type_suffix):
+        for rel_type, target in self._workbook_rels.values():
+            if rel_type.endswith(rel_type_suffix):
+                return target
+
+    def _read_shared_strings(self):
+        shared_strings = list()
+        path = self._rel_target('/sharedStrings')
+
+        if path is None or path not in self.archive.namelist():
+            return shared_strings
+
+        with self.archive.open(path) as f:
+            for __, element in ET.iterparse(f, events=('end',), tag='{*}si'):
+                shared_strings.append(_text_content(element))
+                element.clear()
+
+        return shared_strings
+
+    def _read_date_styles(self):
+        """ Set of cell style indices with a date number format """
+        date_styles = set()
+        path = self._rel_target('/styles')
+
+        if path is None or path not in self.archive.namelist():
+            return date_styles
+
+        root = self._parse(path)
+        formats = dict(BUILTIN_FORMATS)
+
+        for element in root.iter('{*}numFmt'):
+            formats[int(element.get('numFmtId'))] = element.get('formatCode', '')
+
+        for cell_xfs in root.iter('{*}cellXfs'):
+            for idx, xf in enumerate(cell_xfs.iter('{*}xf')):
+                fmt = formats.get(int(xf.get('numFmtId', 0)), '')
+                if fmt and is_date_format(fmt):
+                    date_styles.add(idx)
+
+        return date_styles
+
+    def read_sheet(self, sheet_name):
+        """ SheetSnapshot of the worksheet sheet_name """
+        if self._shared_strings is None:
+            self._shared_strings = self._read_shared_strings()
+            self._date_styles = self._read_date_styles()
+
+        rows = list()
+
+        with self.archive.open(self._sheet_paths[sheet_name]) as f:
+            for __, row in ET.iterparse(f, events=('end',), tag='{*}row'):
+                row_idx = int(row.get('r', len(rows) + 1))
+
+                # Rows without any cell are not part of the file
+                while len(rows) < row_idx - 1:
+                    rows.append(tuple())
+
+                rows.append(self._read_row(row))
+
+                # Discard the row and everything parsed before it
+                row.clear()
+                while row.getprevious() is not None:
+                    del row.getparent()[0]
+
+        return SheetSnapshot(sheet_name, rows)
+
+    def _read_row(self, row):
+        values = list()
+
+        for cell in row:
+            ref = cell.get('r')
+            if ref:
+                column = _column_index(_CELL_REF.match(ref).group(1))
+            else:
+                column = len(values) + 1
+
+            if len(values) < column - 1:
+                values.extend([None] * (column - 1 - len(values)))
+
+            values.append(self._cell_value(cell))
+
+        return tuple(values)
+
+    def _cell_value(self, cell):
+        data_type = cell.get('t', 'n')
+        value = None
+        formula = None
+
+        for child in cell:
+            name = _local_name(child)
+            if name == 'v':
+                value = child.text
+            elif name == 'f':
+                formula = child.text
+            elif name == 'is':
+                value = _text_content(child)
+
+        if formula:
+            return '=' + formula
+
+        if value is None:
+            return None
+
+        if data_type == 's':
+            return self._shared_strings[int(value)]
+        if data_type == 'n':
+            value = _cast_number(value)
+            if int(cell.get('s', 0)) in self._date_styles:
+                return from_excel(value)
+            return value
+        if data_type == 'b':
+            return bool(int(value))
+        if data_type == 'd':
+            return from_ISO8601(value)
+
+        # str, inlineStr, e
+        return value
+
+
+def snapshot_differences(expected: SheetSnapshot, actual: SheetSnapshot, max_differences=20):
+    """ List of (row, column, expected value, actual value) of cells that differ """
+    differences = list()
+
+    for row in range(1, max(expected.max_row, actual.max_row) + 1):
+        for column in range(1, max(expected.max_column, actual.max_column) + 1):
+            expected_value, actual_value = expected.value(row, column), actual.value(row, column)
+
+            if expected_value != actual_value:
+                differences.append((row, column, expected_value, actual_value))
+                if len(differences) >= max_differences:
+                    return differences
+
+    return differences
@@ -28,6 +28,7 @@ from PyQt5.QtWidgets import QTreeWidgetItem
 
 from modules.app_globals import Msg, ItemColumn
 from modules.knecht_log import init_logging
+from modules.knecht_xml_writer import LXML_PRETTY_PRINT_INDENT, is_streamable, write_element_tree
 from modules.tree_methods import iterate_tree_widget_items_flat, lead_zeros
 
 # Initialize logging for this module
@@ -342,6 +343,28 @@ class XML:
 
         self.__orphan_preset = Et.SubElement(self.__variant_presets, self.xmlTypeDict[1000], attributes)
 
+    def update_xml_tree_from_model(self, model):
+        """ Update xmlTree from the nodes of a PresetTreeModel like update_xml_tree_from_widget """
+        self.root = self.dom_tags['root']
+        self.__variant_presets = Et.SubElement(self.root, self.dom_tags['sub_lvl_1'])
+        self.__p_count = 0
+        self.__orphan_preset = None
+
+        top_level_nodes = set(model.child_nodes())
+        columns = range(len(ItemColumn.COLUMN_KEYS))
+
+        for node in model.iterate_nodes():
+            values = [model.text(node, column) for column in columns]
+            self.read_values(model.user_type(node), values, node not in top_level_nodes)
+
+        if self.__p_count == 0 and self.__orphan_preset is None:
+            # No presets found
+            return False
+
+        # Overwrite current ElementTree
+        self.xml_tree = self.root
+        return self.xml_tree
+
     def read_all_from_widget(self):
         """ Read all widget items and store in ET.SubElement """
         self.__p_count = 0
@@ -356,38 +379,33 @@ class XML:
         return True
 
     def read_item(self, item):
+        values = [item.text(column) for column in range(len(ItemColumn.COLUMN_KEYS))]
+        self.read_values(item.UserType, values, item.parent() is not None)
 
-        def read_item_attributes():
-            # Attributes storage
-            attrib_dict = dict()
-
-            # Read attributes from QTreeWidgetItem columns
-            for column, key in enumerate(ItemColumn.COLUMN_KEYS):
-                # Skip empty fields
-                if item.text(column):
-                    attrib_dict[key] = item.text(column)
-
-            return attrib_dict
+    def read_values(self, user_type, values, has_parent):
+        """ Store the column values of a tree item or model node as ET.SubElement """
+        # Read attributes from columns, skip empty fields
+        attrib_dict = {key: value for key, value in zip(ItemColumn.COLUMN_KEYS, values) if value}
 
-        if item.UserType in [1000, 1003, 1005]:
+        if user_type in [1000, 1003, 1005]:
             # Create Preset Element: parent, tag, attributes
             self.__current_preset = Et.SubElement(
                 self.__variant_presets,             # Parent Element
-                self.xmlTypeDict[item.UserType],    # Tag from UserType
-                read_item_attributes(),             # Attributes to store
+                self.xmlTypeDict[user_type],        # Tag from UserType
+                attrib_dict,                        # Attributes to store
                 )
             self.__p_count += 1
         else:
             # Make sure variant | reference item has a preset parent
-            if item.parent():
+            if has_parent:
                 # Create Child Element variant or reference
-                Et.SubElement(self.__current_preset, self.xmlTypeDict[item.UserType], read_item_attributes())
+                Et.SubElement(self.__current_preset, self.xmlTypeDict[user_type], attrib_dict)
             else:
                 # Save orphan in orphan_preset
                 if self.__orphan_preset is None:
                     self.create_orphan_preset()
 
-                Et.SubElement(self.__orphan_preset, self.xmlTypeDict[item.UserType], read_item_attributes())
+                Et.SubElement(self.__orphan_preset, self.xmlTypeDict[user_type], attrib_dict)
 
     @staticmethod
     def pretty_print_xml(elem, level=0):
@@ -424,11 +442,15 @@ class XML:
             except Exception as e:
                 LOGGER.exception('Exception while saving Xml bak file.\n%s', e)
 
-        with open(self.variants_xml_path, 'wb') as f:
-            try:
-                self.xml_tree.write(f, encoding='UTF-8', xml_declaration=True, pretty_print=True)
-            except Exception as e:
-                LOGGER.fatal('Could not save file! %s', e)
+        try:
+            if is_streamable(self.root):
+                # Stream presets to the file, the tree is not changed
+                write_element_tree(self.variants_xml_path, self.root, LXML_PRETTY_PRINT_INDENT, in_place=False)
+            else:
+                with open(self.variants_xml_path, 'wb') as f:
+                    self.xml_tree.write(f, encoding='UTF-8', xml_declaration=True, pretty_print=True)
+        except Exception as e:
+            LOGGER.fatal('Could not save file! %s', e)
 
     def save_tree_as_string(self, xml_element, file=None):
         """ Save an malformed Xml Tree as string data which can not be serialized """
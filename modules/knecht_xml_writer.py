@@ -0,0 +1,207 @@
+"""
+knecht_xml_writer streams RenderKnecht Xml documents to disk.
+
+Copyright (C) 2017 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+The children of a document root are written one by one with lxml xmlfile while
+they are created, instead of pretty printing and serializing a complete element
+tree. Indentation is emitted on the fly. With a tab indent the output is byte
+identical to pretty_print_xml followed by ElementTree.write, with an indent of
+two spaces it is byte identical to lxml pretty_print for trees accepted by
+is_streamable.
+
+Elements are indented in place like pretty_print_xml did before. Pass
+in_place=False to leave the written elements untouched, elements with children
+may then only contain indentation whitespace. Leaf elements keep their text, tails
+of root children are not written.
+"""
+import os
+from pathlib import Path
+
+import lxml.etree as Et
+
+from modules.knecht_log import init_logging
+
+# Initialize logging for this module
+LOGGER = init_logging(__name__)
+
+LXML_PRETTY_PRINT_INDENT = '  '
+
+
+def indent_element(elem, level=0, indent='\t'):
+    """ Pretty XML print for better human readabilty, sets indentation text and tails in place """
+    i = '\n' + level * indent
+
+    if len(elem):
+        if not elem.text or not elem.text.strip():
+            elem.text = i + indent
+        if not elem.tail or not elem.tail.strip():
+            elem.tail = i
+        for elem in elem:
+            indent_element(elem, level + 1, indent)
+        if not elem.tail or not elem.tail.strip():
+            elem.tail = i
+    else:
+        if level and (not elem.tail or not elem.tail.strip()):
+            elem.tail = i
+
+
+def is_streamable(root):
+    """ True if XmlStreamWriter writes root exactly like lxml pretty_print """
+    if not len(root) or root.tail is not None:
+        return False
+
+    # Doctype, comments and processing instructions around the root
+    if root.getprevious() is not None or root.getnext() is not None or root.getroottree().docinfo.doctype:
+        return False
+
+    for element in root.iter():
+        # Comments, processing instructions and namespaces are left to lxml
+        if not isinstance(element.tag, str) or element.nsmap:
+            return False
+
+        # lxml does not indent elements with text content
+        if element is not root and element.tail is not None:
+            return False
+        if len(element) and element.text is not None:
+            return False
+
+    return True
+
+
+class XmlStreamWriter:
+    """
+        Writes a document root and the elements passed to write as its children. The
+        document is written to a temporary file that replaces file once the root is closed,
+        an exception inside the with block keeps the existing file.
+
+        with XmlStreamWriter(xml_file, 'renderknecht_varianten') as writer:
+            for element in elements:
+                writer.write(element)
+    """
+    def __init__(self, file, root_tag, attrib=None, indent='\t'):
+        self.file = Path(file)
+        self.root_tag = root_tag
+        self.attrib = dict(attrib or dict())
+        self.indent = indent
+
+        # Number of root children written
+        self.elements_written = 0
+        self.discarded = False
+
+        self._tmp_file = self.file.with_name(self.file.name + '.tmp')
+        self._file_obj = None
+        self._xml_file = None
+        self._xf = None
+        self._root = None
+
+    def __enter__(self):
+        self._file_obj = open(str(self._tmp_file), 'wb')
+
+        try:
+            self._xml_file = Et.xmlfile(self._file_obj, encoding='UTF-8')
+            self._xf = self._xml_file.__enter__()
+            self._xf.write_declaration()
+        except Exception:
+            self._file_obj.close()
+            self._remove_tmp_file()
+            raise
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self._close_root()
+            self._xml_file.__exit__(exc_type, exc_val, exc_tb)
+
+            if exc_type is None and self._root is not None:
+                # Tail of the root element
+                self._file_obj.write(b'\n')
+        finally:
+            self._file_obj.close()
+
+        if exc_type is None and not self.discarded:
+            os.replace(str(self._tmp_file), str(self.file))
+        elif self.discarded:
+            self._remove_tmp_file()
+        else:
+            LOGGER.error('Writing Xml file %s failed, keeping the previous file.', self.file.name)
+            self._remove_tmp_file()
+
+    def _remove_tmp_file(self):
+        try:
+            self._tmp_file.unlink()
+        except OSError as e:
+            LOGGER.error('Could not remove temporary Xml file %s: %s', self._tmp_file, e)
+
+    def _close_root(self):
+        if self._root is None:
+            # Empty root element
+            self._xf.write(Et.Element(self.root_tag, self.attrib))
+            return
+
+        self._xf.write('\n')
+        self._root.__exit__(None, None, None)
+
+    def discard(self):
+        """ Keep the previous file, the written document is removed on exit """
+        self.discarded = True
+
+    def write(self, element, in_place: bool = True):
+        """
+            Write element and its sub elements as the next child of the root. Indentation is
+            set on the elements if in_place, which is faster than writing them one by one.
+        """
+        if self._root is None:
+            self._root = self._xf.element(self.root_tag, self.attrib)
+            self._root.__enter__()
+
+        self._xf.write('\n' + self.indent)
+
+        if in_place:
+            indent_element(element, 1, self.indent)
+            self._xf.write(element, with_tail=False)
+        else:
+            self._write_element(element, 1)
+
+        self.elements_written += 1
+
+    def _write_element(self, element, level):
+        if not len(element):
+            self._xf.write(element, with_tail=False)
+            return
+
+        if element.text and element.text.strip():
+            raise ValueError('Can not indent element {} with text content.'.format(element.tag))
+
+        child_indent = '\n' + self.indent * (level + 1)
+
+        with self._xf.element(element.tag, dict(element.attrib)):
+            for child in element:
+                self._xf.write(child_indent)
+                self._write_element(child, level + 1)
+
+            self._xf.write('\n' + self.indent * level)
+
+
+def write_element_tree(file, root, indent='\t', in_place: bool = True):
+    """ Stream the children of an existing root element to file """
+    with XmlStreamWriter(file, root.tag, root.attrib, indent) as writer:
+        for element in root:
+            writer.write(element, in_place)
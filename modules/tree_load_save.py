@@ -65,9 +65,9 @@ from PyQt5.QtWidgets import QTreeWidget
 from PyQt5 import QtCore
 
 from modules.knecht_threads import ConvertLegacyVariants, ExcelConversionThread
-from modules.app_globals import Msg, HELPER_DIR
+from modules.app_globals import Msg, HELPER_DIR, ItemColumn
 from modules.knecht_log import init_logging
-from modules.tree_methods import SortTree
+from modules.tree_methods import SortTree, delete_tree_item_without_undo, lead_zeros
 from modules.knecht_settings import knechtSettings
 
 LOGGER = init_logging(__name__)
@@ -381,19 +381,79 @@ class OpenPresetFile:
 
         # Xml had valid content
         if current_file:
-            self.ui.set_window_title(Path(xmlFile).name)
+            self.xml_loaded(xmlFile, Msg.XML_FILE_LOADED + Path(xmlFile).name)
+        else:
+            self.ui.warning_box(Msg.ERROR_BOX_TITLE, Msg.XML_ERROR_MSG,
+                                Path(xmlFile).name)
 
-            xml_message = Msg.XML_FILE_LOADED + Path(xmlFile).name
-            self.tree_widget_source.info_overlay.display(xml_message, 4000)
+    def xml_loaded(self, xmlFile, xml_message):
+        self.ui.set_window_title(Path(xmlFile).name)
+        self.tree_widget_source.info_overlay.display(xml_message, 4000)
 
-            # Add to recent files
-            knechtSettings.add_recent_file('variants_xml', Path(xmlFile).as_posix())
+        # Add to recent files
+        knechtSettings.add_recent_file('variants_xml', Path(xmlFile).as_posix())
 
-            # Sort tree widget
-            self.ui.sort_tree_widget.sort_all(self.tree_widget_source)
+        # Sort tree widget
+        self.ui.sort_tree_widget.sort_all(self.tree_widget_source)
 
-            # Clear Undo stack
-            self.tree_widget_source.undo_stack.clear()
-        else:
-            self.ui.warning_box(Msg.ERROR_BOX_TITLE, Msg.XML_ERROR_MSG,
-                                Path(xmlFile).name)
+        # Clear Undo stack
+        self.tree_widget_source.undo_stack.clear()
+
+    def update_xml(self, xmlFile, import_report):
+        """ Patch the source tree with the models rebuilt by an incremental V Plus import """
+        if not self.patch_tree(xmlFile, import_report):
+            self.parse_xml(xmlFile)
+            return
+
+        rebuilt = len(import_report.added) + len(import_report.changed)
+        LOGGER.info('Source tree updated with %s rebuilt and %s removed models from %s', rebuilt,
+                    len(import_report.removed), xmlFile)
+        self.xml_loaded(xmlFile, Msg.XML_FILE_UPDATED.format(rebuilt, len(import_report.removed),
+                                                             Path(xmlFile).name))
+
+    def patch_tree(self, xmlFile, import_report):
+        """ Returns False if the source tree does not contain the presets of the previous import """
+        if not import_report.incremental or not self.XML_src.variants_xml_path:
+            return False
+
+        if Path(self.XML_src.variants_xml_path) != import_report.previous_xml_file:
+            return False
+
+        # Preset id: top level item
+        items = dict()
+        for idx in range(self.tree_widget_source.topLevelItemCount()):
+            item = self.tree_widget_source.topLevelItem(idx)
+            items[item.text(ItemColumn.ID)] = item
+
+        previous_ids = {i for ids in import_report.previous_preset_ids.values() for i in ids}
+        if previous_ids != set(items):
+            LOGGER.info('Source tree differs from the previous V Plus import, reloading all presets.')
+            return False
+
+        old_file = self.XML_src.variants_xml_path
+        self.XML_src.variants_xml_path = xmlFile
+
+        if not self.XML_src.parse_xml_as_element_tree():
+            self.XML_src.variants_xml_path = old_file
+            return False
+
+        # Remove presets of changed and removed models
+        for model_code in import_report.changed + import_report.removed:
+            for preset_id in import_report.previous_preset_ids.get(model_code, list()):
+                delete_tree_item_without_undo(items[preset_id])
+
+        # Unchanged presets continue the preset id and order of the models before them
+        for model_code in import_report.unchanged:
+            for preset_id, (new_id, new_order) in zip(import_report.previous_preset_ids[model_code],
+                                                      import_report.presets.get(model_code, list())):
+                items[preset_id].setText(ItemColumn.ID, new_id)
+                items[preset_id].setText(ItemColumn.ORDER, lead_zeros(new_order))
+
+        # Create presets of added and changed models
+        rebuilt = set(import_report.added + import_report.changed)
+        for model in self.XML_src.xml_tree.iterfind('model'):
+            if model.get('value') in rebuilt:
+                for node in model.iterfind('.//'):
+                    self.XML_src.read_node(node)
+
+        return True
@@ -59,6 +59,33 @@ class FindReferenceItems:
         # Skip collection of variants
         self.only_report_preset_ids = True
 
+        # Resolved references of standard searches, (reference id, name): ordered reference items
+        # Cleared on every content change of the User Presets tree
+        self.resolved_cache = dict()
+        self.cache_generation = 0
+        self.connect_cache_invalidation(self.ui.treeWidget_DestPreset)
+
+    def connect_cache_invalidation(self, tree_widget):
+        model = tree_widget.model()
+        model.dataChanged.connect(self.tree_data_changed)
+        model.rowsInserted.connect(self.clear_resolved_cache)
+        model.rowsRemoved.connect(self.clear_resolved_cache)
+        model.rowsMoved.connect(self.clear_resolved_cache)
+        model.layoutChanged.connect(self.clear_resolved_cache)
+        model.modelReset.connect(self.clear_resolved_cache)
+
+    def tree_data_changed(self, top_left=None, bottom_right=None, roles=None):
+        # Highlighting sent variants or references only changes colors and fonts
+        if roles and Qt.DisplayRole not in roles and Qt.EditRole not in roles:
+            return
+
+        self.clear_resolved_cache()
+
+    def clear_resolved_cache(self, *args):
+        if self.resolved_cache:
+            self.resolved_cache = dict()
+        self.cache_generation += 1
+
     def set_ref_style(self, item, indicate_ref=True, column=ItemColumn.NAME):
         """ Visual indication of a reference preset item """
         font = item.font(column)
@@ -202,11 +229,18 @@ class FindReferenceItems:
 
     def search(self, ref_item):
         """ Perform standard search in User presets for Sending and Rendering """
+        cache_key = (ref_item.text(ItemColumn.REF), ref_item.text(ItemColumn.NAME))
+
+        # Presets referenced by several render presets are resolved only once
+        if cache_key in self.resolved_cache:
+            return list(self.resolved_cache[cache_key]), False
+
         # Reset recursion list
         self.preset_recursion_list = []
         self.reference_items = []
         self.only_report_preset_ids = False
         self.ref_msg = False
+        cache_generation = self.cache_generation
 
         # Standard search will look in -User Presets-
         self.search_destination = self.ui.treeWidget_DestPreset
@@ -214,6 +248,10 @@ class FindReferenceItems:
         # Perform recursive search, updates self.reference_items
         self.recursive_search(ref_item)
 
+        # Do not cache recursion errors or results of a search that changed the tree eg. by name clashes
+        if not self.ref_msg and cache_generation == self.cache_generation:
+            self.resolved_cache[cache_key] = list(self.reference_items)
+
         return self.reference_items, self.ref_msg
 
     def search_preset_for_references(self, src_preset, dest, only_report_exisiting=False):
@@ -0,0 +1,239 @@
+"""
+py_knecht_cli headless RenderKnecht renderer for preset Xml files.
+
+Copyright (C) 2017-2018 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+Usage:
+    py_knecht_cli.py presets.xml --out-dir D:/renderings [--host 127.0.0.1] [--port 3333]
+    py_knecht_cli.py presets.xml --dry-run
+    py_knecht_cli.py --resume D:/renderings/out_1520000000.0
+
+Every line on stdout is one json object with an "event" key, eg. status, progress,
+image_sent, image_verified, image_converted, summary. Log messages go to stderr.
+
+Exit codes:
+    0   all images rendered and verified
+    1   one or more images failed or were not rendered
+    2   invalid input or no DeltaGen connection
+    3   aborted
+"""
+import argparse
+import json
+import logging
+import re
+import signal
+import sys
+import time
+from multiprocessing import freeze_support
+from pathlib import Path
+
+# Modules print to stdout on import, keep stdout for json lines only
+_JSON_OUT = sys.stdout
+sys.stdout = sys.stderr
+
+from PyQt5.QtCore import QCoreApplication
+
+from modules.app_globals import TCP_IP, TCP_PORT
+from modules.knecht_deltagen import SendToDeltaGen, send_to_dg_worker
+from modules.knecht_log import init_logging
+from modules.knecht_render_journal import RenderJournal
+from modules.knecht_render_plan import create_image_list, optimize_render_order
+from modules.knecht_render_presets import XmlRenderPresets
+from modules.knecht_settings import knechtSettings
+from modules.knecht_xml import XML
+
+LOGGER = init_logging('knechtCli')
+
+EXIT_OK = 0
+EXIT_FAILED_IMAGES = 1
+EXIT_INVALID = 2
+EXIT_ABORTED = 3
+
+_HTML_TAGS = re.compile(r'<[^>]+>')
+
+
+def emit(event, **data):
+    """ Write one json line to stdout """
+    record = dict(event=event, time=round(time.time(), 3))
+    record.update(data)
+    _JSON_OUT.write(json.dumps(record) + '\n')
+    _JSON_OUT.flush()
+
+
+def emit_record(record):
+    """ Forward a render journal record """
+    _JSON_OUT.write(json.dumps(record) + '\n')
+    _JSON_OUT.flush()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Render RenderKnecht preset Xml files without user interface.')
+    parser.add_argument('xml_file', nargs='?', help='RenderKnecht preset Xml containing render presets')
+    parser.add_argument('--host', default=TCP_IP, help='DeltaGen host, default %(default)s')
+    parser.add_argument('--port', type=int, default=TCP_PORT, help='DeltaGen port, default %(default)s')
+    parser.add_argument('--out-dir', help='Render path, images are created in a new out_* sub directory')
+    parser.add_argument('--png', dest='convert_to_png', action='store_true', default=None,
+                        help='Convert rendered images to png')
+    parser.add_argument('--no-png', dest='convert_to_png', action='store_false', help='Do not convert to png')
+    parser.add_argument('--render-preset-dir', action='store_true', default=None,
+                        help='Create a sub directory per render preset')
+    parser.add_argument('--no-reset', action='store_true', help='Do not send reset presets')
+    parser.add_argument('--resume', metavar='OUT_DIR',
+                        help='Continue the render job of an out_* directory, xml_file is not required')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Expand render presets and list the planned images without connecting')
+    parser.add_argument('--verbose', action='store_true', help='Log to stderr')
+
+    return parser.parse_args(argv)
+
+
+def load_render_dict(args):
+    """ Returns (render_dict, create_render_preset_dir, resume_journal) or None """
+    create_render_preset_dir = args.render_preset_dir
+    if create_render_preset_dir is None:
+        create_render_preset_dir = knechtSettings.dg['create_render_preset_dir']
+
+    if args.resume:
+        journal = RenderJournal(Path(args.resume))
+        job = journal.job()
+
+        if not job:
+            emit('error', message='No render journal found in {}'.format(args.resume))
+            return
+
+        return job['render_dict'], job['create_render_preset_dir'], journal
+
+    if not args.xml_file:
+        emit('error', message='No preset Xml file provided.')
+        return
+
+    xml = XML(args.xml_file, None)
+    if not xml.parse_xml_as_element_tree():
+        emit('error', message='Could not parse Xml file {}'.format(args.xml_file))
+        return
+
+    render_presets = XmlRenderPresets(xml.xml_tree, send_reset=not args.no_reset)
+    render_dict = render_presets.render_dict()
+
+    for msg in render_presets.errors:
+        emit('error', message=msg)
+
+    if not render_dict:
+        emit('error', message='No render presets found in {}'.format(args.xml_file))
+        return
+
+    if render_presets.errors:
+        return
+
+    return render_dict, create_render_preset_dir, None
+
+
+def dry_run(render_dict):
+    image_list = create_image_list(render_dict)
+    if SendToDeltaGen.optimize_render_order:
+        image_list = optimize_render_order(image_list)
+
+    for image in image_list:
+        emit('image_planned', img_count=image.img_count, img_name=image.img_name,
+             render_preset=image.render_preset_name, sampling=image.sampling, resolution=image.resolution,
+             variants=image.variant_list)
+
+    emit('summary', images=len(image_list), dry_run=True)
+    return EXIT_OK
+
+
+def render(args, render_dict, create_render_preset_dir, resume_journal):
+    app = QCoreApplication(sys.argv)
+
+    convert_to_png = args.convert_to_png
+    if convert_to_png is None:
+        convert_to_png = knechtSettings.dg['convert_to_png']
+
+    worker = send_to_dg_worker([], knechtSettings.dg['viewer_freeze'], knechtSettings.dg['check_variant'],
+                               render_dict, Path(args.out_dir or '.').absolute(), convert_to_png,
+                               knechtSettings.dg['render_timeout'], create_render_preset_dir,
+                               SendToDeltaGen.pipeline_variants, args.host, args.port)
+    worker.journal_listener = emit_record
+
+    if resume_journal:
+        worker.resume_dir = resume_journal.out_dir
+
+    no_connection, aborted = list(), list()
+    worker.no_connection.connect(lambda: no_connection.append(True))
+    worker.status.connect(lambda msg: emit('status', message=msg))
+    worker.render_progress.connect(lambda progress: emit('progress', percent=progress))
+    worker.display_msg.connect(lambda msg, btns: emit('message', message=_HTML_TAGS.sub(' ', msg).strip()))
+
+    # Ctrl+C aborts after the current step like the abort button
+    def abort(*__):
+        aborted.append(True)
+        worker.abort_signal()
+
+    signal.signal(signal.SIGINT, abort)
+
+    # Runs the whole render job in this thread
+    worker.send_variants()
+    app.quit()
+
+    if no_connection or worker.journal is None:
+        emit('summary', images=0, failed=0, error='No DeltaGen connection {}:{}'.format(args.host, args.port))
+        return EXIT_INVALID
+
+    done, remaining = worker.journal.remaining_images()
+    emit('summary', out_dir=str(worker.journal.out_dir), images=len(done) + len(remaining), done=len(done),
+         failed=len(remaining), failed_images=[image.img_name for image in remaining])
+
+    if aborted and remaining:
+        return EXIT_ABORTED
+    if remaining:
+        return EXIT_FAILED_IMAGES
+    return EXIT_OK
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.verbose:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s: %(message)s'))
+        logging.getLogger().addHandler(handler)
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    knechtSettings.load_settings()
+    SendToDeltaGen.load_settings(knechtSettings.dg)
+
+    result = load_render_dict(args)
+    if not result:
+        return EXIT_INVALID
+
+    render_dict, create_render_preset_dir, resume_journal = result
+
+    if args.dry_run:
+        return dry_run(render_dict)
+
+    if not args.out_dir and not resume_journal:
+        emit('error', message='No render path provided, use --out-dir')
+        return EXIT_INVALID
+
+    return render(args, render_dict, create_render_preset_dir, resume_journal)
+
+
+if __name__ == '__main__':
+    # Png conversion process pool in frozen executables
+    freeze_support()
+    sys.exit(main())
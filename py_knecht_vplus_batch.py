@@ -0,0 +1,339 @@
+"""
+py_knecht_vplus_batch headless batch conversion of V Plus Excel exports.
+
+Copyright (C) 2017-2018 Stefan Tapper, All rights reserved.
+
+    This file is part of RenderKnecht Strink Kerker.
+
+    RenderKnecht Strink Kerker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    RenderKnecht Strink Kerker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with RenderKnecht Strink Kerker.  If not, see <http://www.gnu.org/licenses/>.
+
+Usage:
+    py_knecht_vplus_batch.py D:/exports --out-dir D:/xml [--profile profile.json] [--workers 4]
+    py_knecht_vplus_batch.py "D:/exports/A4_*.xlsx" --out-dir D:/xml
+
+Converts every V Plus export in a process pool with the options of a filter profile
+and writes <export name>.xml and vplus_batch_summary.json to the output directory.
+
+Filter profile json, every key is optional, defaults match the V Plus import window:
+    {
+        "pr_familys": ["int", "ext"],     all, int, ext or PR-Families, default all
+        "models": ["8W2*"],               model codes or fnmatch patterns, default all
+        "read_trim": true,
+        "read_options": true,
+        "read_packages": false,
+        "package_pr_fam_filter": true,
+        "shorten_names": false,
+        "shorten_pkg_name": false
+    }
+
+Every line on stdout is one json object with an "event" key: converted, failed, summary.
+Log messages go to stderr.
+
+Exit codes:
+    0   all exports converted
+    1   one or more exports failed
+    2   invalid input
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from fnmatch import fnmatchcase
+from multiprocessing import freeze_support
+from pathlib import Path
+
+import lxml.etree as Et
+
+# Modules print to stdout on import, keep stdout for json lines only
+_JSON_OUT = sys.stdout
+sys.stdout = sys.stderr
+
+from modules.app_globals import PR_FAM_INT, PR_FAM_EXT
+from modules.knecht_log import init_logging
+from modules.knecht_parse_excel import LoadVplus
+from modules.knecht_settings import knechtSettings
+
+LOGGER = init_logging('knechtVplusBatch')
+
+EXIT_OK = 0
+EXIT_FAILED_FILES = 1
+EXIT_INVALID = 2
+
+SUMMARY_FILE_NAME = 'vplus_batch_summary.json'
+
+DEFAULT_PROFILE = dict(pr_familys=['all'], models=['all'], read_trim=True, read_options=True, read_packages=False,
+                       package_pr_fam_filter=True, shorten_names=False, shorten_pkg_name=False)
+
+
+def emit(event, **data):
+    """ Write one json line to stdout """
+    record = dict(event=event, time=round(time.time(), 3))
+    record.update(data)
+    _JSON_OUT.write(json.dumps(record) + '\n')
+    _JSON_OUT.flush()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Convert V Plus Excel exports to RenderKnecht Xml files.')
+    parser.add_argument('inputs', nargs='+', help='V Plus xlsx files, directories or glob patterns')
+    parser.add_argument('--out-dir', required=True, help='Directory for the created Xml files and the summary')
+    parser.add_argument('--profile', help='Filter profile json file')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Exports converted in parallel, default %(default)s')
+    parser.add_argument('--verbose', action='store_true', help='Log to stderr')
+
+    return parser.parse_args(argv)
+
+
+def load_profile(profile_file):
+    """ Returns the filter profile dict or None """
+    profile = dict(DEFAULT_PROFILE)
+
+    if not profile_file:
+        return profile
+
+    try:
+        with open(profile_file, 'r', encoding='utf-8') as f:
+            user_profile = json.load(f)
+    except (OSError, ValueError) as e:
+        emit('error', message='Could not read filter profile {}: {}'.format(profile_file, e))
+        return
+
+    unknown_keys = set(user_profile) - set(DEFAULT_PROFILE)
+    if unknown_keys:
+        emit('error', message='Unknown filter profile keys: {}'.format(', '.join(sorted(unknown_keys))))
+        return
+
+    for key in ('pr_familys', 'models'):
+        if isinstance(user_profile.get(key), str):
+            user_profile[key] = [user_profile[key]]
+
+    profile.update(user_profile)
+    return profile
+
+
+def collect_files(inputs):
+    """ xlsx files of files, directories and glob patterns, Excel lock files are skipped """
+    files = list()
+
+    for pattern in inputs:
+        path = Path(pattern)
+
+        if path.is_dir():
+            matches = sorted(path.glob('*.xlsx'))
+        elif path.is_file():
+            matches = [path]
+        else:
+            matches = sorted(Path(p) for p in glob.glob(pattern))
+
+        for file in matches:
+            if file.suffix.lower() == '.xlsx' and not file.name.startswith('~$') and file not in files:
+                files.append(file)
+
+    return files
+
+
+def pr_family_filter(profile_familys, workbook_familys):
+    """ PR-Family filter like the filter buttons of the V Plus import window """
+    pr_familys = set()
+
+    for name in profile_familys:
+        if name == 'all':
+            pr_familys.update(workbook_familys)
+        elif name == 'int':
+            pr_familys.update(PR_FAM_INT)
+        elif name == 'ext':
+            pr_familys.update(PR_FAM_EXT)
+        else:
+            pr_familys.add(name)
+
+    # Only PR-Families listed in the workbook can be checked in the window
+    return pr_familys.intersection(workbook_familys)
+
+
+def model_filter(profile_models, workbook_models):
+    return [model for model in workbook_models
+            if any(pattern == 'all' or fnmatchcase(model, pattern) for pattern in profile_models)]
+
+
+def document_summary(xml_file):
+    """ Number of models with presets, presets, variants and packages of a V Plus Xml document """
+    summary = dict(models=0, presets=0, trim_variants=0, option_variants=0, packages=0)
+
+    # Presets of written models are released during the conversion, count them in the file
+    for __, model in Et.iterparse(str(xml_file), tag='model'):
+        presets = model.findall('preset')
+        summary['models'] += bool(presets)
+        summary['presets'] += len(presets)
+
+        for preset in presets:
+            if preset.get('type') == 'trim_setup':
+                # Model code variant is not counted
+                summary['trim_variants'] += max(0, len(preset) - 1)
+            elif preset.get('type') == 'options':
+                summary['option_variants'] += len(preset)
+            elif preset.get('type') == 'package':
+                summary['packages'] += 1
+
+        model.clear()
+
+    return summary
+
+
+def convert_file(file, out_dir, profile):
+    """ Converts one export, runs in a worker process """
+    result = dict(file=str(file), xml_file=None, errors=list())
+    begin = time.time()
+
+    vplus = LoadVplus(str(file))
+    vplus.xml_dir = Path(out_dir)
+    vplus.error_msg.connect(result['errors'].append)
+
+    wb = vplus.read_workbook()
+    result['read_s'] = round(time.time() - begin, 3)
+
+    workbook_familys = vplus.read_pr_familys(wb) if wb else None
+    if not workbook_familys:
+        result['errors'].append('Could not read PR-Families.')
+        return result
+
+    LoadVplus.pr_fam_filter = pr_family_filter(profile['pr_familys'], {f for f, __ in workbook_familys})
+    LoadVplus.model_filter = model_filter(profile['models'], [m for m, __ in vplus.read_and_return_models(wb)])
+    if not LoadVplus.model_filter:
+        result['errors'].append('No model matches the model filter {}.'.format(profile['models']))
+        return result
+
+    for option in ('read_trim', 'read_options', 'read_packages', 'package_pr_fam_filter', 'shorten_names',
+                   'shorten_pkg_name'):
+        setattr(LoadVplus, option, bool(profile[option]))
+
+    convert_begin = time.time()
+    xml_file = vplus.create_document(wb)
+    wb.close()
+    result['convert_s'] = round(time.time() - convert_begin, 3)
+    result['total_s'] = round(time.time() - begin, 3)
+
+    if xml_file:
+        result['xml_file'] = str(xml_file)
+        result.update(document_summary(xml_file))
+
+    return result
+
+
+def vplus_settings():
+    """ V Plus import settings of the application, read once by the main process """
+    # The converter only reads the settings, a missing settings file is not created
+    knechtSettings.load_settings(create_default=False)
+    return {k: v for k, v in knechtSettings.app.items() if k.startswith('vplus_')}
+
+
+def init_worker(app):
+    """ Settings of every conversion process, app: V Plus import settings of the main process """
+    LoadVplus.load_settings(app)
+
+    # Exports are converted in parallel already, parallel imports would race
+    # on the shared workbook cache and the incremental import state
+    LoadVplus.workers = 1
+    LoadVplus.use_cache = False
+    LoadVplus.incremental_import = False
+
+
+def _convert_process(file, out_dir, profile, app):
+    init_worker(app)
+    return convert_file(file, out_dir, profile)
+
+
+def convert_files(files, out_dir, profile, workers):
+    """ Yields the conversion result of every file as it finishes """
+    # Exports with equal names would overwrite each others Xml
+    names = set()
+    app = vplus_settings()
+
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(files)))) as executor:
+        futures = dict()
+
+        for file in files:
+            if file.stem.casefold() in names:
+                yield dict(file=str(file), xml_file=None, errors=['Duplicate export name {}'.format(file.stem)])
+                continue
+
+            names.add(file.stem.casefold())
+            futures[executor.submit(_convert_process, file, out_dir, profile, app)] = file
+
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                LOGGER.exception('Conversion of %s failed', futures[future])
+                yield dict(file=str(futures[future]), xml_file=None, errors=[str(e)])
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.verbose:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s: %(message)s'))
+        logging.getLogger().addHandler(handler)
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    profile = load_profile(args.profile)
+    if not profile:
+        return EXIT_INVALID
+
+    files = collect_files(args.inputs)
+    if not files:
+        emit('error', message='No V Plus xlsx files found in {}'.format(', '.join(args.inputs)))
+        return EXIT_INVALID
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    begin = time.time()
+    results = list()
+
+    for result in convert_files(files, out_dir, profile, args.workers):
+        results.append(result)
+
+        if result['xml_file']:
+            emit('converted', **result)
+        else:
+            emit('failed', **result)
+
+    # Summary in input order
+    order = {str(file): idx for idx, file in enumerate(files)}
+    results.sort(key=lambda r: order[r['file']])
+    failed = [r['file'] for r in results if not r['xml_file']]
+
+    summary = dict(files=len(files), converted=len(files) - len(failed), failed=len(failed), failed_files=failed,
+                   total_s=round(time.time() - begin, 3), profile=profile, results=results)
+
+    with open(out_dir / SUMMARY_FILE_NAME, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+
+    emit('summary', **{k: v for k, v in summary.items() if k != 'results'})
+
+    if failed:
+        return EXIT_FAILED_FILES
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    # Conversion process pool in frozen executables
+    freeze_support()
+    sys.exit(main())